@@ -9,6 +9,7 @@ try:
     from config.settings import config
 except ImportError:
     from backend.config.settings import config
+from .utils.delivery import send_frontend_file
 
 def create_app(config_name='default'):
     app = Flask(__name__)
@@ -96,25 +97,25 @@ def create_app(config_name='default'):
             'timestamp': datetime.utcnow().isoformat()
         }
     
-    # Serve frontend static files
+    # Serve frontend static files (handed to nginx when FILE_DELIVERY_MODE=accel)
+    def frontend_dir():
+        return app.config.get('FRONTEND_FOLDER') or \
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend')
+    
     @app.route('/<path:filename>')
     def serve_frontend(filename):
-        frontend_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend')
-        return send_from_directory(frontend_dir, filename)
+        return send_frontend_file(frontend_dir(), '', filename)
     
     @app.route('/pages/<path:filename>')
     def serve_pages(filename):
-        frontend_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'pages')
-        return send_from_directory(frontend_dir, filename)
+        return send_frontend_file(frontend_dir(), 'pages', filename)
     
     @app.route('/assets/<path:filename>')
     def serve_assets(filename):
-        frontend_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'assets')
-        return send_from_directory(frontend_dir, filename)
+        return send_frontend_file(frontend_dir(), 'assets', filename)
     
     @app.route('/js/<path:filename>')
     def serve_js(filename):
-        frontend_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'js')
-        return send_from_directory(frontend_dir, filename)
+        return send_frontend_file(frontend_dir(), 'js', filename)
     
     return app
\ No newline at end of file
@@ -1,15 +1,56 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from app.models.database import db_manager
-from app.models.schemas import AccessGrantSchema, AccessLevel, UserRole
+from app.models.schemas import (
+    AccessGrantSchema, AccessLevel, DocumentType, GrantScope, UserRole, public_grant_expiry
+)
 from app.utils.auth import require_auth, require_role, get_current_user
 from app.utils.audit import AuditLogger
+from app.utils.idempotency import idempotent
+from app.utils.access_cache import AccessCache
+from app.utils.care_team import CareRelationships
+from app.utils.grant_scopes import is_scoped, scoped_grant_covers
+from app.utils.policy import AccessPolicy, ACTION_MANAGE
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
 import uuid
 
 access_bp = Blueprint('access', __name__)
 
+# Fields a repeated grant overwrites on the existing active row
+GRANT_UPDATE_FIELDS = ('access_level', 'granted_by', 'reason', 'expires_at',
+                       'patient_id', 'document_type', 'updated_at')
+DUPLICATE_KEY_ERROR = 11000
+
+def _grant_upsert(grant: dict) -> tuple:
+    """Split a new grant into the (filter, update) of an upsert
+    
+    The filter is the active (grantee_id, document_id) row, or for a
+    patient-scoped grant the active (grantee_id, patient_id, scope_key)
+    row; unique partial indexes keep each to at most one.
+    """
+    if is_scoped(grant):
+        key = {'grantee_id': grant['grantee_id'], 'patient_id': grant['patient_id'],
+               'scope': grant['scope'], 'scope_key': grant['scope_key'], 'is_active': True}
+    else:
+        key = {'grantee_id': grant['grantee_id'], 'document_id': grant['document_id'], 'is_active': True}
+    changes = {field: grant[field] for field in GRANT_UPDATE_FIELDS if field not in key}
+    return key, {
+        '$set': changes,
+        '$setOnInsert': {field: value for field, value in grant.items()
+                         if field not in changes and field not in key}
+    }
+
+def _can_revoke(current_user: dict, grant: dict) -> bool:
+    """Check whether a user may revoke a grant: its grantor, its grantee or an admin"""
+    user_id = str(current_user['_id'])
+    return (user_id in (grant['grantor_id'], grant['grantee_id']) or
+            current_user['role'] == UserRole.ADMIN.value)
+
 @access_bp.route('/grant', methods=['POST'])
+@idempotent('access.grant')
 @require_auth
 def grant_access():
     """Grant access to a medical document"""
@@ -70,23 +111,7 @@ def grant_access():
             }), 404
 
         # Check if current user can grant access
-        can_grant = False
-        
-        # Patient can grant access to their own records
-        if (current_user['role'] == UserRole.PATIENT.value and 
-            str(current_user['_id']) == document['patient_id']):
-            can_grant = True
-        
-        # Doctor can grant access to records they created
-        elif (current_user['role'] == UserRole.DOCTOR.value and 
-              str(current_user['_id']) == document['doctor_id']):
-            can_grant = True
-        
-        # Admin can grant access to any record
-        elif current_user['role'] == UserRole.ADMIN.value:
-            can_grant = True
-
-        if not can_grant:
+        if not AccessPolicy.check(current_user, ACTION_MANAGE, document):
             return jsonify({
                 'error': {
                     'code': 'FORBIDDEN',
@@ -112,47 +137,39 @@ def grant_access():
                 }
             }), 404
 
-        # Check if access grant already exists
-        existing_grant = db_manager.find_one('access_grants', {
-            'grantee_id': data['grantee_id'],
-            'document_id': data['document_id'],
-            'is_active': True
-        })
+        access_grant = AccessGrantSchema(
+            grantor_id=str(current_user['_id']),
+            grantee_id=data['grantee_id'],
+            document_id=data['document_id'],
+            access_level=access_level,
+            patient_id=document['patient_id'],
+            document_type=document['document_type'],
+            expires_at=datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None,
+            granted_by=str(current_user['_id']),
+            reason=data.get('reason', '')
+        ).__dict__
+        access_grant['_id'] = ObjectId()
 
-        if existing_grant:
-            # Update existing grant
-            update_data = {
-                'access_level': access_level.value,
-                'granted_by': str(current_user['_id']),
-                'reason': data.get('reason', ''),
-                'expires_at': datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None
-            }
-            
-            success = db_manager.update_one(
-                'access_grants',
-                {'_id': existing_grant['_id']},
-                update_data
-            )
-            
-            grant_id = str(existing_grant['_id'])
-            action = 'ACCESS_GRANT_UPDATED'
-        else:
-            # Create new access grant
-            access_grant = AccessGrantSchema(
-                grantor_id=str(current_user['_id']),
-                grantee_id=data['grantee_id'],
-                document_id=data['document_id'],
-                access_level=access_level,
-                expires_at=datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None,
-                granted_by=str(current_user['_id']),
-                reason=data.get('reason', '')
-            )
-            
-            grant_id = db_manager.insert_one('access_grants', access_grant.__dict__)
-            success = bool(grant_id)
-            action = 'ACCESS_GRANTED'
+        # Create the grant or update the active one in a single atomic upsert
+        key, update = _grant_upsert(access_grant)
+        try:
+            stored = db_manager.db.access_grants.find_one_and_update(
+                key, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # A concurrent grant inserted the row first; this now updates it
+            stored = db_manager.db.access_grants.find_one_and_update(
+                key, update, upsert=True, return_document=ReturnDocument.AFTER)
+
+        success = stored is not None
+        created = success and stored['_id'] == access_grant['_id']
+        grant_id = str(stored['_id']) if success else None
+        action = 'ACCESS_GRANTED' if created else 'ACCESS_GRANT_UPDATED'
 
         if success:
+            AccessCache.invalidate(data['grantee_id'], data['document_id'])
+            if created:
+                CareRelationships.grants_added([access_grant])
+            
             # Log access grant
             AuditLogger.log_access_grant(
                 grantor_id=str(current_user['_id']),
@@ -161,6 +178,168 @@ def grant_access():
                 action=action
             )
 
+            return jsonify({
+                'message': 'Access granted successfully',
+                'grant_id': grant_id,
+                'created': created,
+                'timestamp': datetime.utcnow().isoformat()
+            }), 201 if created else 200
+        else:
+            return jsonify({
+                'error': {
+                    'code': 'GRANT_FAILED',
+                    'message': 'Failed to grant access',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 500
+
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'ACCESS_GRANT_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@access_bp.route('/grant/patient', methods=['POST'])
+@idempotent('access.grant_patient')
+@require_auth
+def grant_patient_access():
+    """Grant access to all of a patient's records, optionally by category and time window"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+
+        data = request.get_json() or {}
+        
+        # Patients grant access to their own records
+        if current_user['role'] == UserRole.PATIENT.value:
+            data.setdefault('patient_id', str(current_user['_id']))
+        
+        # Validate required fields
+        required_fields = ['patient_id', 'grantee_id', 'access_level']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({
+                    'error': {
+                        'code': 'VALIDATION_ERROR',
+                        'message': f'Missing required field: {field}',
+                        'timestamp': datetime.utcnow().isoformat(),
+                        'requestId': str(uuid.uuid4())
+                    }
+                }), 400
+
+        try:
+            access_level = AccessLevel(data['access_level'])
+            document_types = data.get('document_types') or None
+            if document_types is not None:
+                if not isinstance(document_types, list):
+                    raise ValueError('document_types must be a list')
+                document_types = sorted({DocumentType(value).value for value in document_types})
+            records_from = datetime.fromisoformat(data['records_from']) if data.get('records_from') else None
+            records_to = datetime.fromisoformat(data['records_to']) if data.get('records_to') else None
+            expires_at = datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None
+            if records_from and records_to and records_from >= records_to:
+                raise ValueError('records_from must be before records_to')
+        except (ValueError, TypeError) as e:
+            return jsonify({
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': f'Invalid grant scope: {e}',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+
+        # Only the patient or an admin can share a patient's whole history
+        if not AccessPolicy.check_patient(current_user, ACTION_MANAGE, data['patient_id']):
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': "You do not have permission to grant access to this patient's records",
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+
+        # Verify grantee exists
+        grantee = db_manager.find_one('users', {
+            '_id': ObjectId(data['grantee_id']),
+            'is_active': True
+        })
+        
+        if not grantee:
+            return jsonify({
+                'error': {
+                    'code': 'GRANTEE_NOT_FOUND',
+                    'message': 'Grantee user not found or inactive',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+
+        access_grant = AccessGrantSchema(
+            grantor_id=str(current_user['_id']),
+            grantee_id=data['grantee_id'],
+            document_id=None,
+            access_level=access_level,
+            patient_id=data['patient_id'],
+            scope=GrantScope.PATIENT,
+            document_types=document_types,
+            records_from=records_from,
+            records_to=records_to,
+            expires_at=expires_at,
+            granted_by=str(current_user['_id']),
+            reason=data.get('reason', '')
+        ).__dict__
+        access_grant['_id'] = ObjectId()
+
+        # A grant with the same scope is updated rather than duplicated, in one atomic upsert
+        key, update = _grant_upsert(access_grant)
+        try:
+            stored = db_manager.db.access_grants.find_one_and_update(
+                key, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # A concurrent grant inserted the row first; this now updates it
+            stored = db_manager.db.access_grants.find_one_and_update(
+                key, update, upsert=True, return_document=ReturnDocument.AFTER)
+
+        success = stored is not None
+        grant_id = str(stored['_id']) if success else None
+        action = 'ACCESS_GRANTED' if success and stored['_id'] == access_grant['_id'] else 'ACCESS_GRANT_UPDATED'
+
+        if success:
+            # The grant may cover any document cached for the grantee
+            AccessCache.invalidate(data['grantee_id'])
+            if action == 'ACCESS_GRANTED':
+                CareRelationships.grants_added([{'grantee_id': data['grantee_id'],
+                                                 'patient_id': data['patient_id']}])
+            
+            AuditLogger.log_action(
+                user_id=str(current_user['_id']),
+                action=action,
+                resource_type='ACCESS_GRANT',
+                resource_id=data['patient_id'],
+                details={
+                    'grantee_id': data['grantee_id'],
+                    'scope': GrantScope.PATIENT.value,
+                    'document_types': document_types,
+                    'records_from': records_from.isoformat() if records_from else None,
+                    'records_to': records_to.isoformat() if records_to else None
+                }
+            )
+
             return jsonify({
                 'message': 'Access granted successfully',
                 'grant_id': grant_id,
@@ -219,21 +398,7 @@ def revoke_access(grant_id):
             }), 404
 
         # Check if current user can revoke access
-        can_revoke = False
-        
-        # Grantor can revoke access they granted
-        if str(current_user['_id']) == access_grant['grantor_id']:
-            can_revoke = True
-        
-        # Admin can revoke any access
-        elif current_user['role'] == UserRole.ADMIN.value:
-            can_revoke = True
-        
-        # Grantee can revoke their own access
-        elif str(current_user['_id']) == access_grant['grantee_id']:
-            can_revoke = True
-
-        if not can_revoke:
+        if not _can_revoke(current_user, access_grant):
             return jsonify({
                 'error': {
                     'code': 'FORBIDDEN',
@@ -243,19 +408,26 @@ def revoke_access(grant_id):
                 }
             }), 403
 
-        # Revoke access (soft delete)
+        # Revoke access (soft delete); only the request that flips the grant counts it
         success = db_manager.update_one(
             'access_grants',
-            {'_id': ObjectId(grant_id)},
+            {'_id': ObjectId(grant_id), 'is_active': True},
             {'is_active': False}
         )
 
         if success:
+            # Patient-scoped grants may cover any cached document of the grantee
+            AccessCache.invalidate(
+                access_grant['grantee_id'],
+                None if is_scoped(access_grant) else access_grant['document_id']
+            )
+            CareRelationships.grants_removed([access_grant])
+            
             # Log access revocation
             AuditLogger.log_access_grant(
                 grantor_id=str(current_user['_id']),
                 grantee_id=access_grant['grantee_id'],
-                document_id=access_grant['document_id'],
+                document_id=access_grant.get('document_id') or access_grant['patient_id'],
                 action='ACCESS_REVOKED'
             )
 
@@ -264,14 +436,15 @@ def revoke_access(grant_id):
                 'timestamp': datetime.utcnow().isoformat()
             }), 200
         else:
+            # Revoked or expired since it was read
             return jsonify({
                 'error': {
-                    'code': 'REVOKE_FAILED',
-                    'message': 'Failed to revoke access',
+                    'code': 'GRANT_NOT_FOUND',
+                    'message': 'Access grant not found',
                     'timestamp': datetime.utcnow().isoformat(),
                     'requestId': str(uuid.uuid4())
                 }
-            }), 500
+            }), 404
 
     except Exception as e:
         return jsonify({
@@ -315,24 +488,8 @@ def get_access_grants(document_id):
                 }
             }), 404
 
-        # Check if current user can view access grants
-        can_view = False
-        
-        # Patient can view grants for their own records
-        if (current_user['role'] == UserRole.PATIENT.value and 
-            str(current_user['_id']) == document['patient_id']):
-            can_view = True
-        
-        # Doctor can view grants for records they created
-        elif (current_user['role'] == UserRole.DOCTOR.value and 
-              str(current_user['_id']) == document['doctor_id']):
-            can_view = True
-        
-        # Admin can view all grants
-        elif current_user['role'] == UserRole.ADMIN.value:
-            can_view = True
-
-        if not can_view:
+        # Only those who may share a document see who it is shared with
+        if not AccessPolicy.check(current_user, ACTION_MANAGE, document):
             return jsonify({
                 'error': {
                     'code': 'FORBIDDEN',
@@ -342,17 +499,30 @@ def get_access_grants(document_id):
                 }
             }), 403
 
-        # Get access grants
-        grants = db_manager.find_many('access_grants', {
-            'document_id': document_id,
-            'is_active': True
-        })
+        # Get access grants, including patient-scoped grants covering the document
+        grants = [
+            grant for grant in db_manager.find_many('access_grants', {
+                'is_active': True,
+                '$or': [
+                    {'document_id': document_id},
+                    {'scope': GrantScope.PATIENT.value, 'patient_id': document['patient_id']}
+                ]
+            })
+            if not is_scoped(grant) or scoped_grant_covers(grant, document)
+        ]
+
+        # Fetch every grantee in one query
+        grantees = db_manager.resolve_references(
+            'users',
+            (grant['grantee_id'] for grant in grants),
+            projection={'first_name': 1, 'last_name': 1, 'email': 1, 'role': 1}
+        )
 
         # Format grants with user information
         formatted_grants = []
         for grant in grants:
-            # Get grantee information
-            grantee = db_manager.find_one('users', {'_id': ObjectId(grant['grantee_id'])})
+            grantee = grantees.get(grant['grantee_id'])
+            expires_at = public_grant_expiry(grant.get('expires_at'))
             
             grant_data = {
                 'id': str(grant['_id']),
@@ -363,8 +533,9 @@ def get_access_grants(document_id):
                     'role': grantee['role'] if grantee else 'Unknown'
                 },
                 'access_level': grant['access_level'],
+                'scope': grant.get('scope', GrantScope.DOCUMENT.value),
                 'granted_at': grant['created_at'].isoformat(),
-                'expires_at': grant['expires_at'].isoformat() if grant.get('expires_at') else None,
+                'expires_at': expires_at.isoformat() if expires_at else None,
                 'reason': grant.get('reason', ''),
                 'granted_by': grant.get('granted_by')
             }
@@ -385,4 +556,466 @@ def get_access_grants(document_id):
                 'timestamp': datetime.utcnow().isoformat(),
                 'requestId': str(uuid.uuid4())
             }
-        }), 500
\ No newline at end of file
+        }), 500
+def _bulk_ids(data: dict, field: str) -> list:
+    """Return the de-duplicated ids listed under field, or None if it is not a non-empty list of ids"""
+    values = data.get(field)
+    if (not isinstance(values, list) or not values or
+            not all(isinstance(value, str) and ObjectId.is_valid(value) for value in values)):
+        return None
+    return list(dict.fromkeys(values))
+
+def _bulk_pairs(data: dict):
+    """Parse document_ids x grantee_ids; returns (document_ids, grantee_ids, error response)"""
+    document_ids = _bulk_ids(data, 'document_ids')
+    grantee_ids = _bulk_ids(data, 'grantee_ids')
+    if document_ids is None or grantee_ids is None:
+        return None, None, (jsonify({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'document_ids and grantee_ids must be non-empty lists of valid ids',
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 400)
+    max_pairs = current_app.config['ACCESS_BULK_MAX_PAIRS']
+    if len(document_ids) * len(grantee_ids) > max_pairs:
+        return None, None, (jsonify({
+            'error': {
+                'code': 'BATCH_TOO_LARGE',
+                'message': f'At most {max_pairs} document and grantee pairs can be changed at once',
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 400)
+    return document_ids, grantee_ids, None
+
+@access_bp.route('/grant/bulk', methods=['POST'])
+@idempotent('access.grant_bulk')
+@require_auth
+def grant_access_bulk():
+    """Grant every listed grantee access to every listed document
+    
+    Everything is validated up front with one query per collection, then
+    all pairs are upserted with a single unordered bulk_write.
+    """
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+
+        data = request.get_json() or {}
+        document_ids, grantee_ids, error = _bulk_pairs(data)
+        if error:
+            return error
+
+        try:
+            access_level = AccessLevel(data.get('access_level'))
+            expires_at = datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None
+        except (ValueError, TypeError):
+            return jsonify({
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': 'Invalid access_level or expires_at',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+
+        # One query for all documents and one for all grantees
+        documents = db_manager.resolve_references(
+            'medical_documents', document_ids,
+            projection={'patient_id': 1, 'doctor_id': 1, 'document_type': 1},
+            filter_dict={'is_deleted': False}
+        )
+        missing = [document_id for document_id in document_ids if document_id not in documents]
+        if missing:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Medical documents not found',
+                    'details': {'document_ids': missing},
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+
+        allowed = AccessPolicy.check_many(current_user, ACTION_MANAGE, list(documents.values()))
+        forbidden = [document_id for document_id in document_ids if not allowed[document_id]]
+        if forbidden:
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'You do not have permission to grant access to these documents',
+                    'details': {'document_ids': forbidden},
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+
+        grantees = db_manager.resolve_references(
+            'users', grantee_ids, projection={'_id': 1}, filter_dict={'is_active': True}
+        )
+        missing = [grantee_id for grantee_id in grantee_ids if grantee_id not in grantees]
+        if missing:
+            return jsonify({
+                'error': {
+                    'code': 'GRANTEE_NOT_FOUND',
+                    'message': 'Grantee users not found or inactive',
+                    'details': {'grantee_ids': missing},
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+
+        # An active grant for a pair is updated in place, otherwise inserted
+        pairs = [(document_id, grantee_id) for document_id in document_ids for grantee_id in grantee_ids]
+        operations = []
+        for document_id, grantee_id in pairs:
+            document = documents[document_id]
+            grant = AccessGrantSchema(
+                grantor_id=str(current_user['_id']),
+                grantee_id=grantee_id,
+                document_id=document_id,
+                access_level=access_level,
+                patient_id=document['patient_id'],
+                document_type=document['document_type'],
+                expires_at=expires_at,
+                granted_by=str(current_user['_id']),
+                reason=data.get('reason', '')
+            ).__dict__
+            operations.append(UpdateOne(*_grant_upsert(grant), upsert=True))
+
+        failed = set()
+        try:
+            result = db_manager.db.access_grants.bulk_write(operations, ordered=False)
+            created = set(result.upserted_ids)
+        except BulkWriteError as e:
+            created = {upsert['index'] for upsert in e.details.get('upserted', [])}
+            failed = {write_error['index'] for write_error in e.details.get('writeErrors', [])
+                      if write_error.get('code') != DUPLICATE_KEY_ERROR}
+            # Pairs a concurrent grant inserted first are retried as updates
+            lost_races = [write_error['index'] for write_error in e.details.get('writeErrors', [])
+                          if write_error.get('code') == DUPLICATE_KEY_ERROR]
+            if lost_races:
+                try:
+                    db_manager.db.access_grants.bulk_write(
+                        [operations[index] for index in lost_races], ordered=False)
+                except BulkWriteError:
+                    failed.update(lost_races)
+
+        results = []
+        audit_entries = []
+        for index, (document_id, grantee_id) in enumerate(pairs):
+            if index in failed:
+                results.append({'document_id': document_id, 'grantee_id': grantee_id, 'status': 'error'})
+                continue
+            status = 'created' if index in created else 'updated'
+            results.append({'document_id': document_id, 'grantee_id': grantee_id, 'status': status})
+            audit_entries.append({
+                'user_id': str(current_user['_id']),
+                'action': 'ACCESS_GRANTED' if status == 'created' else 'ACCESS_GRANT_UPDATED',
+                'resource_type': 'ACCESS_GRANT',
+                'resource_id': document_id,
+                'details': {'grantee_id': grantee_id, 'bulk': True}
+            })
+
+        AccessCache.invalidate_many((grantee_id, document_id) for document_id, grantee_id in pairs)
+        CareRelationships.grants_added([
+            {'grantee_id': grantee_id, 'patient_id': documents[document_id]['patient_id']}
+            for index, (document_id, grantee_id) in enumerate(pairs)
+            if index in created and index not in failed
+        ])
+        AuditLogger.log_actions_bulk(audit_entries)
+
+        return jsonify({
+            'message': 'Access granted successfully',
+            'grants': results,
+            'created': sum(1 for item in results if item['status'] == 'created'),
+            'updated': sum(1 for item in results if item['status'] == 'updated'),
+            'failed': len(failed),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'ACCESS_GRANT_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@access_bp.route('/revoke/bulk', methods=['POST'])
+@require_auth
+def revoke_access_bulk():
+    """Revoke the active grants of every listed grantee on every listed document"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+
+        document_ids, grantee_ids, error = _bulk_pairs(request.get_json() or {})
+        if error:
+            return error
+
+        # One query finds every active grant in the cross product
+        grants = db_manager.find_many('access_grants', {
+            'document_id': {'$in': document_ids},
+            'grantee_id': {'$in': grantee_ids},
+            'is_active': True
+        }, projection={'grantor_id': 1, 'grantee_id': 1, 'document_id': 1, 'patient_id': 1})
+
+        forbidden = [str(grant['_id']) for grant in grants if not _can_revoke(current_user, grant)]
+        if forbidden:
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'You do not have permission to revoke these access grants',
+                    'details': {'grant_ids': forbidden},
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+
+        if grants:
+            # The stamp tells this request's revocations apart from concurrent ones
+            ids = [grant['_id'] for grant in grants]
+            revocation_id = ObjectId()
+            db_manager.db.access_grants.update_many(
+                {'_id': {'$in': ids}, 'is_active': True},
+                {'$set': {'is_active': False, 'revocation_id': revocation_id, 'updated_at': datetime.utcnow()}}
+            )
+            # Side effects only for the grants this request deactivated
+            revoked_ids = {grant['_id'] for grant in db_manager.find_many(
+                'access_grants', {'_id': {'$in': ids}, 'revocation_id': revocation_id},
+                projection={'_id': 1}
+            )}
+            grants = [grant for grant in grants if grant['_id'] in revoked_ids]
+
+        if grants:
+            AccessCache.invalidate_many((grant['grantee_id'], grant['document_id']) for grant in grants)
+            CareRelationships.grants_removed(grants)
+            AuditLogger.log_actions_bulk([{
+                'user_id': str(current_user['_id']),
+                'action': 'ACCESS_REVOKED',
+                'resource_type': 'ACCESS_GRANT',
+                'resource_id': grant['document_id'],
+                'details': {'grantee_id': grant['grantee_id'], 'bulk': True}
+            } for grant in grants])
+
+        return jsonify({
+            'message': 'Access revoked successfully',
+            'revoked': len(grants),
+            'grants': [{
+                'id': str(grant['_id']),
+                'document_id': grant['document_id'],
+                'grantee_id': grant['grantee_id']
+            } for grant in grants],
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'ACCESS_REVOKE_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+# Metadata shown for shared documents; content fields are never loaded
+SHARED_DOCUMENT_PROJECTION = {'title': 1, 'document_type': 1, 'patient_id': 1, 'doctor_id': 1,
+                              'file_name': 1, 'file_size': 1, 'mime_type': 1, 'created_at': 1}
+
+def _shared_with_filter(user_id: str) -> dict:
+    return {
+        'grantee_id': user_id,
+        'is_active': True,
+        'expires_at': {'$gt': datetime.utcnow()}
+    }
+
+def _shared_with_count(user_id: str) -> int:
+    """Count what get_shared_with_me lists: scoped grants and grants on documents not deleted"""
+    grants = db_manager.find_many('access_grants', _shared_with_filter(user_id),
+                                  projection={'document_id': 1, 'scope': 1})
+    document_ids = [grant['document_id'] for grant in grants if not is_scoped(grant)]
+    shared_documents = db_manager.count_documents('medical_documents', {
+        '_id': {'$in': [ObjectId(document_id) for document_id in document_ids if ObjectId.is_valid(document_id)]},
+        'is_deleted': False
+    }) if document_ids else 0
+    return len(grants) - len(document_ids) + shared_documents
+
+@access_bp.route('/shared-with-me', methods=['GET'])
+@require_auth
+def get_shared_with_me():
+    """List the grants shared with the current user, newest first, with document metadata"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+
+        user_id = str(current_user['_id'])
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        query = _shared_with_filter(user_id)
+
+        # Keyset pagination on (created_at, _id), both descending
+        cursor = request.args.get('cursor')
+        if cursor:
+            position = decode_cursor(cursor, 'created_at', 'id')
+            if not ObjectId.is_valid(str(position['id'])):
+                raise InvalidCursorError('Invalid pagination cursor')
+            created_at = datetime.fromisoformat(position['created_at'])
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': ObjectId(position['id'])}}
+            ]
+
+        grants = db_manager.find_many(
+            'access_grants',
+            query,
+            limit=limit + 1,
+            sort=[('created_at', -1), ('_id', -1)]
+        )
+        has_more = len(grants) > limit
+        grants = grants[:limit]
+
+        # One metadata-only query for the documents and one for the grantors
+        documents = db_manager.resolve_references(
+            'medical_documents',
+            (grant['document_id'] for grant in grants if not is_scoped(grant)),
+            projection=SHARED_DOCUMENT_PROJECTION,
+            filter_dict={'is_deleted': False}
+        )
+        grantors = db_manager.resolve_references(
+            'users',
+            (grant['grantor_id'] for grant in grants),
+            projection={'first_name': 1, 'last_name': 1, 'role': 1}
+        )
+
+        shared = []
+        for grant in grants:
+            grantor = grantors.get(grant['grantor_id'])
+            expires_at = public_grant_expiry(grant.get('expires_at'))
+            item = {
+                'grant_id': str(grant['_id']),
+                'scope': grant.get('scope', GrantScope.DOCUMENT.value),
+                'access_level': grant['access_level'],
+                'granted_at': grant['created_at'].isoformat(),
+                'expires_at': expires_at.isoformat() if expires_at else None,
+                'granted_by': {
+                    'id': grant['grantor_id'],
+                    'name': f"{grantor['first_name']} {grantor['last_name']}" if grantor else 'Unknown User',
+                    'role': grantor['role'] if grantor else 'Unknown'
+                },
+                'patient_id': grant.get('patient_id'),
+                'document': None
+            }
+            if is_scoped(grant):
+                item['document_types'] = grant.get('document_types')
+                item['records_from'] = grant['records_from'].isoformat() if grant.get('records_from') else None
+                item['records_to'] = grant['records_to'].isoformat() if grant.get('records_to') else None
+            else:
+                document = documents.get(grant['document_id'])
+                if document is None:
+                    continue  # deleted since it was shared
+                item['document'] = {
+                    'id': str(document['_id']),
+                    'title': document['title'],
+                    'document_type': document['document_type'],
+                    'patient_id': document['patient_id'],
+                    'doctor_id': document['doctor_id'],
+                    'file_name': document.get('file_name'),
+                    'file_size': document.get('file_size'),
+                    'mime_type': document.get('mime_type'),
+                    'created_at': document['created_at'].isoformat()
+                }
+            shared.append(item)
+
+        next_cursor = None
+        if has_more:
+            last = grants[-1]
+            next_cursor = encode_cursor({'created_at': last['created_at'].isoformat(), 'id': str(last['_id'])})
+
+        return jsonify({
+            'shared': shared,
+            'count': len(shared),
+            'next_cursor': next_cursor,
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+
+    except (InvalidCursorError, ValueError) as e:
+        return jsonify({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'SHARED_LIST_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@access_bp.route('/shared-with-me/count', methods=['GET'])
+@require_auth
+def get_shared_with_me_count():
+    """Number of active grants shared with the current user, for the inbox badge"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+
+        user_id = str(current_user['_id'])
+        count = AccessCache.shared_count(user_id, lambda: _shared_with_count(user_id))
+
+        return jsonify({
+            'count': count,
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'SHARED_COUNT_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
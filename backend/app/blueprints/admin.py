@@ -5,6 +5,12 @@ from app.models.database import db_manager
 from app.models.schemas import UserRole
 from app.utils.auth import require_role
 from app.utils.audit import AuditLogger
+from app.utils.encryption import data_key_cache
+from app.utils.autocomplete import patient_directory
+from app.utils.metrics import metrics
+from app.utils.jobs import get_queue
+from app.utils.archive import ArchiveManager, ArchiveError
+from app.utils.access_cache import AccessCache
 import uuid
 
 admin_bp = Blueprint('admin', __name__)
@@ -34,10 +40,7 @@ def get_statistics(current_user):
         # Count active access grants
         access_grants_count = db_manager.count_documents('access_grants', {
             'is_active': True,
-            '$or': [
-                {'expires_at': {'$gt': datetime.utcnow()}},
-                {'expires_at': None}
-            ]
+            'expires_at': {'$gt': datetime.utcnow()}
         })
         
         # Count total users
@@ -81,6 +84,79 @@ def get_statistics(current_user):
             }
         }), 500
 
+@admin_bp.route('/metrics', methods=['GET'])
+@require_role(UserRole.ADMIN)
+def get_metrics(current_user):
+    """Get in-process performance metrics for this worker"""
+    try:
+        return jsonify({
+            'metrics': metrics.snapshot(),
+            'key_cache': data_key_cache.stats(),
+            'patient_directory': patient_directory.stats(),
+            'job_queue': get_queue().stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'METRICS_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@admin_bp.route('/archive/<document_id>/rehydrate', methods=['POST'])
+@require_role(UserRole.ADMIN)
+def rehydrate_record(document_id, current_user):
+    """Restore an archived medical record to hot storage"""
+    try:
+        document = ArchiveManager.rehydrate(document_id)
+        if document is None:
+            return jsonify({
+                'error': {
+                    'code': 'ARCHIVE_NOT_FOUND',
+                    'message': 'No archived record with this id',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        AuditLogger.log_admin_action(
+            admin_id=str(current_user['_id']),
+            action='RECORD_REHYDRATED',
+            target_user_id=document['patient_id'],
+            details={'document_id': document_id}
+        )
+        
+        return jsonify({
+            'message': 'Medical record restored from archive',
+            'document_id': document_id,
+            'is_deleted': document.get('is_deleted', False),
+            'archive_hold_until': document['archive_hold_until'].isoformat(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except ArchiveError as e:
+        return jsonify({
+            'error': {
+                'code': 'ARCHIVE_UNREADABLE',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'REHYDRATE_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
 @admin_bp.route('/users', methods=['GET'])
 @require_role(UserRole.ADMIN)
 def list_all_users(current_user):
@@ -286,6 +362,9 @@ def toggle_user_status(user_id, current_user):
         )
         
         if success:
+            # Cached read decisions must not outlive a status change
+            AccessCache.invalidate(user_id)
+            
             # Log action
             AuditLogger.log_action(
                 user_id=str(current_user['_id']),
@@ -6,6 +6,7 @@ from app.models.database import db_manager
 from app.models.schemas import UserSchema, PatientSchema, DoctorSchema, AdminSchema, UserRole
 from app.utils.auth import AuthManager, require_auth
 from app.utils.audit import AuditLogger
+from app.utils.search_terms import search_fields
 import uuid
 
 auth_bp = Blueprint('auth', __name__)
@@ -78,8 +79,10 @@ def register():
                 permissions=data.get('permissions', [])
             )
         
-        # Insert user into database
-        user_id = db_manager.insert_one('users', user_schema.__dict__)
+        # Insert user into database, with the terms patient search looks up
+        user_document = user_schema.__dict__
+        user_document.update(search_fields(user_document))
+        user_id = db_manager.insert_one('users', user_document)
         
         # Log registration
         AuditLogger.log_action(
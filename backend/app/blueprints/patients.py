@@ -1,10 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime
 from bson import ObjectId
 from app.models.database import db_manager
 from app.models.schemas import UserRole
 from app.utils.auth import require_auth, require_role, get_current_user
 from app.utils.audit import AuditLogger
+from app.utils.policy import AccessPolicy
+from app.utils.search_terms import (
+    SEARCH_PREFIX_MIN, query_terms, whole_name_terms, match_score, fuzzy_query, fuzzy_distance
+)
+from app.utils.autocomplete import patient_directory
+from app.utils.care_team import CareRelationships
 import uuid
 
 patients_bp = Blueprint('patients', __name__)
@@ -32,6 +38,14 @@ def list_patients(current_user):
         # Access control is handled at the record level, not patient level
         query = {'role': UserRole.PATIENT.value, 'is_active': True}
         
+        # mine=true narrows a doctor's list to the patients they treat or hold grants for
+        if (request.args.get('mine', '').lower() == 'true' and
+                current_user['role'] == UserRole.DOCTOR.value):
+            query['_id'] = {'$in': [
+                ObjectId(patient_id) for patient_id in CareRelationships.patient_ids(str(current_user['_id']))
+                if ObjectId.is_valid(patient_id)
+            ]}
+        
         # Find patients
         patients = db_manager.find_many(
             'users',
@@ -159,6 +173,11 @@ def get_patient(patient_id, current_user):
             }
         }), 500
 
+# Fields search results are ranked and displayed from
+PATIENT_SEARCH_PROJECTION = {'first_name': 1, 'last_name': 1, 'email': 1,
+                             'medical_record_number': 1, 'date_of_birth': 1}
+PATIENT_SEARCH_RESULTS = 20
+
 @patients_bp.route('/search', methods=['GET'])
 @require_role(UserRole.DOCTOR, UserRole.ADMIN)
 def search_patients(current_user):
@@ -176,14 +195,35 @@ def search_patients(current_user):
                 }
             }), 400
         
-        # Build search filter
+        # mode=fuzzy tolerates misspellings and sound-alike spellings of names
+        fuzzy = request.args.get('mode') == 'fuzzy'
+        exact_clauses = []
+        if fuzzy:
+            tokens, clauses = fuzzy_query(query)
+        else:
+            # Equality lookups on the search_terms index: every query token as a
+            # stored prefix, or the whole query as an exact email or MRN
+            tokens, lookup, exact = query_terms(query)
+            clauses = [{'search_terms': {'$all': lookup}}] if lookup else []
+            if any(len(term) >= SEARCH_PREFIX_MIN for term in exact):
+                clauses.append({'search_terms': {'$in': exact}})
+                exact_clauses.append({'exact_terms': {'$in': exact}})
+            whole = whole_name_terms(tokens)
+            if whole:
+                exact_clauses.append({'exact_terms': {'$all': whole}})
+        
+        if not clauses:
+            return jsonify({
+                'error': {
+                    'code': 'QUERY_TOO_SHORT',
+                    'message': f'Search query needs at least {SEARCH_PREFIX_MIN} characters',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
         search_filter = {
-            '$or': [
-                {'first_name': {'$regex': query, '$options': 'i'}},
-                {'last_name': {'$regex': query, '$options': 'i'}},
-                {'email': {'$regex': query, '$options': 'i'}},
-                {'medical_record_number': {'$regex': query, '$options': 'i'}}
-            ],
+            '$or': clauses,
             'role': UserRole.PATIENT.value,
             'is_active': True
         }
@@ -191,8 +231,31 @@ def search_patients(current_user):
         # Doctors can search all patients (access control is at record level)
         # This allows doctors to find patients and request access to their records
         
-        # Find patients
-        patients = db_manager.find_many('users', search_filter, limit=20)
+        # Rank a bounded candidate set, best matches first. Whole-name and
+        # identifier matches are fetched first so patients who merely share
+        # a prefix cannot crowd them out of the limit.
+        limit = current_app.config['PATIENT_SEARCH_CANDIDATES']
+        candidates = []
+        if exact_clauses:
+            candidates = db_manager.find_many(
+                'users', {**search_filter, '$or': exact_clauses},
+                limit=limit, projection=PATIENT_SEARCH_PROJECTION
+            )
+        if len(candidates) < limit:
+            candidates += db_manager.find_many(
+                'users', {**search_filter, '_id': {'$nin': [patient['_id'] for patient in candidates]}},
+                limit=limit - len(candidates), projection=PATIENT_SEARCH_PROJECTION
+            )
+        if fuzzy:
+            # Fewest edits first
+            ranked = [(fuzzy_distance(patient, tokens), patient) for patient in candidates]
+            ranked = [(distance, patient) for distance, patient in ranked if distance is not None]
+        else:
+            # Highest score first
+            ranked = [(-match_score(patient, tokens, exact), patient) for patient in candidates]
+            ranked = [(score, patient) for score, patient in ranked if score < 0]
+        ranked.sort(key=lambda pair: (pair[0], pair[1]['last_name'].casefold(), pair[1]['first_name'].casefold()))
+        patients = [patient for _, patient in ranked[:PATIENT_SEARCH_RESULTS]]
         
         # Format results
         results = []
@@ -213,7 +276,7 @@ def search_patients(current_user):
             action='PATIENTS_SEARCHED',
             resource_type='PATIENT',
             resource_id='multiple',
-            details={'query': query, 'results_count': len(results)}
+            details={'query': query, 'mode': 'fuzzy' if fuzzy else 'exact', 'results_count': len(results)}
         )
         
         return jsonify({
@@ -232,6 +295,70 @@ def search_patients(current_user):
             }
         }), 500
 
+AUTOCOMPLETE_MAX_RESULTS = 20
+
+@patients_bp.route('/autocomplete', methods=['GET'])
+@require_role(UserRole.DOCTOR, UserRole.ADMIN)
+def autocomplete_patients(current_user):
+    """As-you-type patient lookup by name or MRN prefix"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = max(1, min(int(request.args.get('limit', 10)), AUTOCOMPLETE_MAX_RESULTS))
+        
+        if not query:
+            return jsonify({
+                'error': {
+                    'code': 'MISSING_QUERY',
+                    'message': 'Search query is required',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
+        # Answered from this process's in-memory directory once it is built
+        patient_directory.start(current_app._get_current_object())
+        if patient_directory.ready:
+            results = patient_directory.complete(query, limit)
+        else:
+            # Until the first build finishes, fall back to the search_terms index
+            tokens, lookup, exact = query_terms(query)
+            patients = db_manager.find_many('users', {
+                'search_terms': {'$all': lookup},
+                'role': UserRole.PATIENT.value,
+                'is_active': True
+            }, limit=limit, projection=PATIENT_SEARCH_PROJECTION) if lookup else []
+            results = [{
+                'id': str(patient['_id']),
+                'first_name': patient['first_name'],
+                'last_name': patient['last_name'],
+                'medical_record_number': patient.get('medical_record_number')
+            } for patient in patients]
+        
+        # Queued rather than written, so a keystroke costs no database write
+        AuditLogger.defer_action(
+            user_id=str(current_user['_id']),
+            action='PATIENTS_AUTOCOMPLETED',
+            resource_type='PATIENT',
+            resource_id='multiple',
+            details={'query': query, 'results_count': len(results)}
+        )
+        
+        return jsonify({
+            'patients': results,
+            'count': len(results),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'AUTOCOMPLETE_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
 @patients_bp.route('/<patient_id>/records', methods=['GET'])
 @require_role(UserRole.DOCTOR, UserRole.ADMIN)
 def get_patient_records(patient_id, current_user):
@@ -262,66 +389,8 @@ def get_patient_records(patient_id, current_user):
         # Find all medical records for this patient
         records_query = {'patient_id': patient_id, 'is_deleted': False}
         
-        # For doctors, they can see records they created or have access to
-        if current_user['role'] == UserRole.DOCTOR.value:
-            doctor_id = str(current_user['_id'])
-            
-            # Find records the doctor created
-            doctor_records = db_manager.find_many(
-                'medical_documents',
-                {'patient_id': patient_id, 'doctor_id': doctor_id, 'is_deleted': False},
-                projection={'_id': 1}
-            )
-            
-            # Find records the doctor has access to via grants
-            access_grants = db_manager.find_many(
-                'access_grants',
-                {
-                    'grantee_id': doctor_id,
-                    'patient_id': patient_id,
-                    'is_active': True,
-                    '$or': [
-                        {'expires_at': {'$gt': datetime.utcnow()}},
-                        {'expires_at': None}
-                    ]
-                },
-                projection={'document_id': 1}
-            )
-            
-            # Collect accessible record IDs
-            accessible_record_ids = [str(record['_id']) for record in doctor_records]
-            for grant in access_grants:
-                if grant.get('document_id') and grant['document_id'] not in accessible_record_ids:
-                    accessible_record_ids.append(grant['document_id'])
-            
-            if accessible_record_ids:
-                # Convert to ObjectIds
-                object_ids = []
-                for rid in accessible_record_ids:
-                    try:
-                        object_ids.append(ObjectId(rid))
-                    except:
-                        continue
-                
-                records_query['_id'] = {'$in': object_ids}
-            else:
-                # Doctor has no access to any records for this patient
-                return jsonify({
-                    'records': [],
-                    'patient': {
-                        'id': str(patient['_id']),
-                        'first_name': patient['first_name'],
-                        'last_name': patient['last_name'],
-                        'medical_record_number': patient.get('medical_record_number')
-                    },
-                    'pagination': {
-                        'page': page,
-                        'limit': limit,
-                        'total': 0,
-                        'pages': 0
-                    },
-                    'timestamp': datetime.utcnow().isoformat()
-                }), 200
+        # Doctors see the records they created or hold grants for, admins all
+        records_query.update(AccessPolicy.readable_filter(current_user, patient_id))
         
         # Find records
         records = db_manager.find_many(
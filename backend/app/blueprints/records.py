@@ -1,17 +1,93 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from datetime import datetime
 from bson import ObjectId
 from app.models.database import db_manager
 from app.models.schemas import MedicalDocumentSchema, DocumentType, UserRole
 from app.utils.auth import require_auth, require_role, get_current_user
 from app.utils.audit import AuditLogger
-from app.utils.encryption import EncryptionManager, KeyManager
+from app.utils.encryption import UNMANAGED_KEY_ID
+from app.utils.compression import CODEC_IDENTITY
+from app.utils.storage import DocumentStorage, ContentUnavailableError, FORMAT_INLINE
+from app.utils.derivatives import queue_derivatives
+from app.utils.timeline import TimelineManager
+from app.utils.care_team import CareRelationships
+from app.utils.ingest import BulkIngestor, IngestFormatError, STATUS_CREATED, STATUS_DUPLICATE
+from app.utils.idempotency import idempotent
+from app.utils.delivery import sign_url, verify_signed_url, content_disposition
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
+from app.utils.policy import AccessPolicy, ACTION_READ, ACTION_MANAGE
+from app.utils.access_cache import AccessCache
 import uuid
 import base64
+import binascii
 
 records_bp = Blueprint('records', __name__)
 
+def _load_content(document: dict) -> str:
+    """Return record content as base64 for JSON responses"""
+    if DocumentStorage.content_format(document) == FORMAT_INLINE and \
+            document.get('compression', CODEC_IDENTITY) == CODEC_IDENTITY:
+        return document['encrypted_content']
+    return base64.b64encode(DocumentStorage.read_all(document)).decode()
+
+def _format_document(document: dict, include_content: bool = True) -> dict:
+    """Format a medical document for API responses"""
+    response_data = {
+        'id': str(document['_id']),
+        'patient_id': document['patient_id'],
+        'doctor_id': document['doctor_id'],
+        'document_type': document['document_type'],
+        'title': document['title'],
+        'description': document['description'],
+        'encryption_key_id': document['encryption_key_id'],
+        'file_size': document['file_size'],
+        'mime_type': document['mime_type'],
+        'checksum': document['checksum'],
+        'derivatives': sorted(document.get('derivatives', {}).keys()),
+        'created_at': document['created_at'].isoformat(),
+        'updated_at': document['updated_at'].isoformat()
+    }
+    if include_content:
+        response_data['encrypted_content'] = _load_content(document)
+    return response_data
+
+def _content_response(document: dict, user_id: str, headers: dict = None):
+    """Stream a document's decrypted content, honouring Range requests"""
+    size = DocumentStorage.content_length(document)
+    headers = dict(headers or {})
+    headers.update({
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': content_disposition(document.get('file_name'))
+    })
+    status = 200
+    start, end = 0, size - 1
+    
+    if request.range:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+        start, end = byte_range[0], byte_range[1] - 1
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        status = 206
+    
+    headers['Content-Length'] = str(max(0, end - start + 1))
+    body = DocumentStorage.open_range(document, start, end) if size else iter(())
+    
+    AuditLogger.log_document_access(
+        user_id=user_id,
+        document_id=str(document['_id']),
+        action='DOCUMENT_DOWNLOADED'
+    )
+    
+    return Response(
+        stream_with_context(body),
+        status=status,
+        mimetype=document.get('mime_type', 'application/octet-stream'),
+        headers=headers
+    )
+
 @records_bp.route('/upload', methods=['POST'])
+@idempotent('records.upload')
 @require_role(UserRole.DOCTOR, UserRole.PATIENT)
 def upload_record(current_user):
     """Upload a new medical record"""
@@ -82,26 +158,61 @@ def upload_record(current_user):
                 }
             }), 400
         
+        # Plaintext uploads are compressed, encrypted and streamed to content
+        # storage; client-side encrypted content is stored untouched
+        mime_type = data.get('mime_type', 'application/octet-stream')
+        if data.get('encrypted_content'):
+            content_fields = {
+                'encrypted_content': file_content,
+                'content_format': FORMAT_INLINE,
+                'compression': CODEC_IDENTITY,
+                'encryption_key_id': UNMANAGED_KEY_ID,
+                'file_size': data.get('file_size', 0),
+                'checksum': 'placeholder_checksum'
+            }
+        else:
+            try:
+                raw_content = base64.b64decode(file_content, validate=True)
+            except (binascii.Error, ValueError):
+                return jsonify({
+                    'error': {
+                        'code': 'VALIDATION_ERROR',
+                        'message': 'File content must be base64 encoded',
+                        'timestamp': datetime.utcnow().isoformat(),
+                        'requestId': str(uuid.uuid4())
+                    }
+                }), 400
+            content_fields = DocumentStorage.store(
+                [raw_content],
+                mime_type,
+                patient_id,
+                file_name=data.get('file_name', 'document'),
+                size_hint=len(raw_content)
+            )
+        
         # Create medical document
         document = {
             'patient_id': patient_id,
             'doctor_id': str(current_user['_id']),
             'document_type': data['document_type'],
-            'encrypted_content': file_content,
-            'encryption_key_id': 'simple_key',  # Placeholder for now
             'title': data['title'],
             'description': data.get('description', ''),
             'file_name': data.get('file_name', 'document'),
-            'file_size': data.get('file_size', 0),
-            'mime_type': data.get('mime_type', 'application/octet-stream'),
-            'checksum': 'placeholder_checksum',
+            'mime_type': mime_type,
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow(),
-            'is_deleted': False
+            'is_deleted': False,
+            **content_fields
         }
         
-        # Insert document
-        document_id = db_manager.insert_one('medical_documents', document)
+        # Insert document; content already written to GridFS must not outlive a failed insert
+        try:
+            document_id = db_manager.insert_one('medical_documents', document)
+        except Exception:
+            DocumentStorage.delete(content_fields)
+            raise
+        TimelineManager.record_added(document)
+        CareRelationships.record_added(document)
         
         # Log document upload
         AuditLogger.log_action(
@@ -112,6 +223,9 @@ def upload_record(current_user):
             details={'title': data['title'], 'type': data['document_type']}
         )
         
+        # Thumbnails/previews are rendered later by the job worker
+        queue_derivatives([document])
+        
         return jsonify({
             'message': 'Medical record uploaded successfully',
             'document_id': str(document_id),
@@ -129,6 +243,196 @@ def upload_record(current_user):
                 'requestId': str(uuid.uuid4())
             }
         }), 500
+@records_bp.route('/bulk', methods=['POST'])
+@require_role(UserRole.DOCTOR)
+def bulk_ingest_records(current_user):
+    """Ingest a batch of records for many patients (NDJSON or multipart)"""
+    ingestor = BulkIngestor(current_user, current_app.config['BULK_INGEST_MAX_ITEMS'])
+    try:
+        try:
+            if request.mimetype == 'multipart/form-data':
+                ingestor.parse_multipart(request.form, request.files)
+            elif request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+                ingestor.parse_ndjson(request.stream)
+            else:
+                raise IngestFormatError('Send application/x-ndjson or multipart/form-data')
+        except IngestFormatError as e:
+            return jsonify({
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': str(e),
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
+        if not ingestor.items:
+            return jsonify({
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': 'Batch contains no records',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
+        ingestor.validate()
+        documents = ingestor.store()
+        
+        TimelineManager.records_added(documents)
+        CareRelationships.records_added(documents)
+        queue_derivatives(documents)
+        
+        # One bulk insert for the whole batch's audit trail
+        user_id = str(current_user['_id'])
+        audit_entries = [{
+            'user_id': user_id,
+            'action': 'DOCUMENT_UPLOADED',
+            'resource_type': 'DOCUMENT',
+            'resource_id': str(document['_id']),
+            'details': {'title': document['title'], 'type': document['document_type'], 'bulk': True}
+        } for document in documents]
+        manifest = ingestor.manifest()
+        summary = {
+            status: sum(1 for item in manifest if item['status'] == status)
+            for status in {item['status'] for item in manifest}
+        }
+        audit_entries.append({
+            'user_id': user_id,
+            'action': 'BULK_INGEST',
+            'resource_type': 'DOCUMENT',
+            'resource_id': user_id,
+            'details': {'items': len(manifest), **summary}
+        })
+        AuditLogger.log_actions_bulk(audit_entries)
+        
+        return jsonify({
+            'results': manifest,
+            'count': len(manifest),
+            'created': summary.get(STATUS_CREATED, 0),
+            'duplicates': summary.get(STATUS_DUPLICATE, 0),
+            'failed': len(manifest) - summary.get(STATUS_CREATED, 0) - summary.get(STATUS_DUPLICATE, 0),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'BULK_INGEST_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+    finally:
+        ingestor.close()
+
+@records_bp.route('/search', methods=['GET'])
+@require_auth
+def search_records():
+    """Full-text search over the titles and descriptions of readable records"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        query = request.args.get('q', '').strip()
+        if len(query) < 2 or len(query) > 200:
+            return jsonify({
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': 'Search query must be between 2 and 200 characters',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
+        limit = max(1, min(int(request.args.get('limit', 20)), 50))
+        
+        # Authorization is part of the $match, so only readable records are ranked
+        match = {'$text': {'$search': query}, 'is_deleted': False}
+        readable = AccessPolicy.readable_filter(current_user)
+        if readable:
+            match = {'$and': [match, readable]}
+        
+        pipeline = [
+            {'$match': match},
+            {'$addFields': {'score': {'$meta': 'textScore'}}}
+        ]
+        
+        # Keyset pagination on (score, _id), both descending
+        cursor = request.args.get('cursor')
+        if cursor:
+            position = decode_cursor(cursor, 'score', 'id')
+            if not ObjectId.is_valid(str(position['id'])):
+                raise InvalidCursorError('Invalid pagination cursor')
+            last_id = ObjectId(position['id'])
+            pipeline.append({'$match': {'$or': [
+                {'score': {'$lt': position['score']}},
+                {'score': position['score'], '_id': {'$lt': last_id}}
+            ]}})
+        
+        pipeline += [
+            {'$sort': {'score': -1, '_id': -1}},
+            {'$limit': limit + 1},
+            {'$project': {'encrypted_content': 0}}
+        ]
+        documents = db_manager.aggregate('medical_documents', pipeline)
+        
+        has_more = len(documents) > limit
+        documents = documents[:limit]
+        results = []
+        for document in documents:
+            result = _format_document(document, include_content=False)
+            result['score'] = document['score']
+            results.append(result)
+        
+        next_cursor = None
+        if has_more:
+            last = documents[-1]
+            next_cursor = encode_cursor({'score': last['score'], 'id': str(last['_id'])})
+        
+        AuditLogger.log_action(
+            user_id=str(current_user['_id']),
+            action='RECORDS_SEARCHED',
+            resource_type='DOCUMENT',
+            resource_id=str(current_user['_id']),
+            details={'results': len(results), 'paged': bool(cursor)}
+        )
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'next_cursor': next_cursor,
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except (InvalidCursorError, ValueError) as e:
+        return jsonify({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'SEARCH_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
 @records_bp.route('/<document_id>', methods=['GET'])
 
 @require_auth
@@ -163,35 +467,7 @@ def get_record(document_id):
             }), 404
         
         # Check access permissions
-        has_access = False
-        
-        # Patient can access their own records
-        if (current_user['role'] == UserRole.PATIENT.value and 
-            str(current_user['_id']) == document['patient_id']):
-            has_access = True
-        
-        # Doctor can access records they created
-        elif (current_user['role'] == UserRole.DOCTOR.value and 
-              str(current_user['_id']) == document['doctor_id']):
-            has_access = True
-        
-        # Admin can access all records
-        elif current_user['role'] == UserRole.ADMIN.value:
-            has_access = True
-        
-        # Check for explicit access grants
-        else:
-            access_grant = db_manager.find_one('access_grants', {
-                'grantee_id': str(current_user['_id']),
-                'document_id': document_id,
-                'is_active': True,
-                '$or': [
-                    {'expires_at': {'$gt': datetime.utcnow()}},
-                    {'expires_at': None}
-                ]
-            })
-            if access_grant:
-                has_access = True
+        has_access = AccessPolicy.check(current_user, ACTION_READ, document)
         
         if not has_access:
             return jsonify({
@@ -211,21 +487,7 @@ def get_record(document_id):
         )
         
         # Return document (without decryption key for security)
-        response_data = {
-            'id': str(document['_id']),
-            'patient_id': document['patient_id'],
-            'doctor_id': document['doctor_id'],
-            'document_type': document['document_type'],
-            'title': document['title'],
-            'description': document['description'],
-            'encrypted_content': document['encrypted_content'],
-            'encryption_key_id': document['encryption_key_id'],
-            'file_size': document['file_size'],
-            'mime_type': document['mime_type'],
-            'checksum': document['checksum'],
-            'created_at': document['created_at'].isoformat(),
-            'updated_at': document['updated_at'].isoformat()
-        }
+        response_data = _format_document(document)
         
         return jsonify({
             'document': response_data,
@@ -242,6 +504,490 @@ def get_record(document_id):
             }
         }), 500
 
+@records_bp.route('/<document_id>', methods=['DELETE'])
+@require_auth
+def delete_record(document_id):
+    """Soft-delete a medical record"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        document = db_manager.find_one('medical_documents', {
+            '_id': ObjectId(document_id),
+            'is_deleted': False
+        }, projection={'encrypted_content': 0})
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Medical record not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        # Only the patient, the uploading doctor or an admin may delete a record
+        if not AccessPolicy.check(current_user, ACTION_MANAGE, document):
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'Access denied to this medical record',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        # is_deleted in the filter makes concurrent deletes count only once
+        deleted = db_manager.update_one(
+            'medical_documents',
+            {'_id': document['_id'], 'is_deleted': False},
+            {
+                'is_deleted': True,
+                'deleted_at': datetime.utcnow(),
+                'deleted_by': str(current_user['_id'])
+            }
+        )
+        if deleted:
+            TimelineManager.record_removed(document)
+            CareRelationships.record_removed(document)
+            # Grantees' shared-with-me counts no longer include this record
+            AccessCache.invalidate_many((grant['grantee_id'], document_id) for grant in db_manager.find_many(
+                'access_grants', {'document_id': document_id, 'is_active': True}, projection={'grantee_id': 1}
+            ))
+            AuditLogger.log_action(
+                user_id=str(current_user['_id']),
+                action='DOCUMENT_DELETED',
+                resource_type='DOCUMENT',
+                resource_id=document_id
+            )
+        
+        return jsonify({
+            'message': 'Medical record deleted successfully',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'DELETE_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@records_bp.route('/batch', methods=['POST'])
+@require_auth
+def get_records_batch():
+    """Get several medical records in one request"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        data = request.get_json() or {}
+        document_ids = data.get('document_ids')
+        metadata_only = bool(data.get('metadata_only', False))
+        max_ids = current_app.config['RECORDS_BATCH_MAX_IDS']
+        
+        if not isinstance(document_ids, list) or not document_ids:
+            return jsonify({
+                'error': {
+                    'code': 'VALIDATION_ERROR',
+                    'message': 'document_ids must be a non-empty list',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
+        if len(document_ids) > max_ids:
+            return jsonify({
+                'error': {
+                    'code': 'BATCH_TOO_LARGE',
+                    'message': f'At most {max_ids} document ids can be requested at once',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 400
+        
+        # Preserve request order, dropping duplicates
+        document_ids = list(dict.fromkeys(str(document_id) for document_id in document_ids))
+        object_ids = [ObjectId(document_id) for document_id in document_ids
+                      if ObjectId.is_valid(document_id)]
+        
+        # One query for all documents
+        projection = {'encrypted_content': 0} if metadata_only else None
+        documents = {
+            str(document['_id']): document
+            for document in db_manager.find_many(
+                'medical_documents',
+                {'_id': {'$in': object_ids}, 'is_deleted': False},
+                projection=projection
+            )
+        }
+        
+        # Ownership is decided in memory, grants for the rest with one query
+        user_id = str(current_user['_id'])
+        allowed = AccessPolicy.check_many(current_user, ACTION_READ, list(documents.values()))
+        
+        results = []
+        audit_entries = []
+        for document_id in document_ids:
+            document = documents.get(document_id)
+            if not ObjectId.is_valid(document_id):
+                results.append({'id': document_id, 'status': 'error', 'error': 'INVALID_ID'})
+            elif document is None:
+                results.append({'id': document_id, 'status': 'error', 'error': 'DOCUMENT_NOT_FOUND'})
+            elif not allowed[document_id]:
+                results.append({'id': document_id, 'status': 'error', 'error': 'FORBIDDEN'})
+            else:
+                try:
+                    results.append({
+                        'id': document_id,
+                        'status': 'ok',
+                        'document': _format_document(document, include_content=not metadata_only)
+                    })
+                    audit_entries.append({
+                        'user_id': user_id,
+                        'action': 'DOCUMENT_VIEWED',
+                        'resource_type': 'MEDICAL_DOCUMENT',
+                        'resource_id': document_id,
+                        'details': {'batch': True, 'metadata_only': metadata_only}
+                    })
+                except ContentUnavailableError:
+                    results.append({'id': document_id, 'status': 'error', 'error': 'CONTENT_UNAVAILABLE'})
+        
+        # One bulk insert for all audit entries
+        AuditLogger.log_actions_bulk(audit_entries)
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'succeeded': len(audit_entries),
+            'failed': len(results) - len(audit_entries),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'BATCH_RETRIEVAL_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@records_bp.route('/<document_id>/content', methods=['GET'])
+@require_auth
+def download_record_content(document_id):
+    """Stream the decrypted content of a medical record, honouring Range requests"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        document = db_manager.find_one('medical_documents', {
+            '_id': ObjectId(document_id),
+            'is_deleted': False
+        })
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Medical record not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        if not AccessPolicy.check(current_user, ACTION_READ, document):
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'Access denied to this medical record',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        return _content_response(document, str(current_user['_id']))
+        
+    except ContentUnavailableError as e:
+        return jsonify({
+            'error': {
+                'code': 'CONTENT_UNAVAILABLE',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 410
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'DOWNLOAD_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@records_bp.route('/<document_id>/download-url', methods=['POST'])
+@require_auth
+def create_download_url(document_id):
+    """Issue a short-lived signed URL for downloading a record's content"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        document = db_manager.find_one('medical_documents', {
+            '_id': ObjectId(document_id),
+            'is_deleted': False
+        }, projection={'encrypted_content': 0})
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Medical record not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        if not AccessPolicy.check(current_user, ACTION_READ, document):
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'Access denied to this medical record',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        url, expires = sign_url(
+            f'/api/records/{document_id}/signed-content',
+            str(current_user['_id'])
+        )
+        
+        return jsonify({
+            'url': url,
+            'expires_at': datetime.utcfromtimestamp(expires).isoformat(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'DOWNLOAD_URL_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@records_bp.route('/<document_id>/signed-content', methods=['GET'])
+def download_signed_content(document_id):
+    """Stream record content for a signed URL issued by create_download_url
+
+    The signature stands in for the JWT, so browsers can use the link
+    directly; the user's account and access are still checked. nginx buffers the response (X-Accel-Buffering) so a slow
+    client never holds a Flask worker.
+    """
+    try:
+        user_id = verify_signed_url(request.path, request.args)
+        if not user_id:
+            return jsonify({
+                'error': {
+                    'code': 'INVALID_SIGNATURE',
+                    'message': 'Download link is invalid or has expired',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        # The link outlives its issue: the user may have been deactivated or lost access since
+        user = db_manager.find_one('users', {'_id': ObjectId(user_id), 'is_active': True})
+        if not user:
+            return jsonify({
+                'error': {
+                    'code': 'INVALID_SIGNATURE',
+                    'message': 'Download link is invalid or has expired',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        document = db_manager.find_one('medical_documents', {
+            '_id': ObjectId(document_id),
+            'is_deleted': False
+        })
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Medical record not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        if not AccessPolicy.check(user, ACTION_READ, document):
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'Access denied to this medical record',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        return _content_response(document, user_id, headers={
+            'Cache-Control': 'private, no-store',
+            'X-Accel-Buffering': 'yes'
+        })
+        
+    except ContentUnavailableError as e:
+        return jsonify({
+            'error': {
+                'code': 'CONTENT_UNAVAILABLE',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 410
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'DOWNLOAD_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
+@records_bp.route('/<document_id>/derivatives/<kind>', methods=['GET'])
+@require_auth
+def get_record_derivative(document_id, kind):
+    """Serve a generated thumbnail or preview of a medical record"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        # Metadata only: the original content is never loaded here
+        document = db_manager.find_one(
+            'medical_documents',
+            {'_id': ObjectId(document_id), 'is_deleted': False},
+            projection={'encrypted_content': 0}
+        )
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Medical record not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        if not AccessPolicy.check(current_user, ACTION_READ, document):
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'Access denied to this medical record',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        derivative = document.get('derivatives', {}).get(kind)
+        if not derivative:
+            return jsonify({
+                'error': {
+                    'code': 'DERIVATIVE_NOT_FOUND',
+                    'message': f'No {kind} is available for this record',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 404
+        
+        AuditLogger.log_document_access(
+            user_id=str(current_user['_id']),
+            document_id=document_id,
+            action='DOCUMENT_PREVIEWED'
+        )
+        
+        body = DocumentStorage.open_content(derivative)
+        return Response(
+            stream_with_context(body),
+            mimetype=derivative['mime_type'],
+            headers={
+                'Content-Length': str(derivative['file_size']),
+                'Cache-Control': 'private, max-age=3600'
+            }
+        )
+        
+    except ContentUnavailableError as e:
+        return jsonify({
+            'error': {
+                'code': 'CONTENT_UNAVAILABLE',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 410
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'DERIVATIVE_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
+
 @records_bp.route('/patient/<patient_id>', methods=['GET'])
 @require_auth
 def list_patient_records(patient_id):
@@ -258,29 +1004,9 @@ def list_patient_records(patient_id):
                 }
             }), 401
         
-        # Check access permissions
-        has_access = False
-        
-        # Patient can access their own records
-        if (current_user['role'] == UserRole.PATIENT.value and 
-            str(current_user['_id']) == patient_id):
-            has_access = True
-        
-        # Admin can access all records
-        elif current_user['role'] == UserRole.ADMIN.value:
-            has_access = True
-        
-        # Doctor can access if they have treated the patient
-        elif current_user['role'] == UserRole.DOCTOR.value:
-            doctor_records = db_manager.find_one('medical_documents', {
-                'patient_id': patient_id,
-                'doctor_id': str(current_user['_id']),
-                'is_deleted': False
-            })
-            if doctor_records:
-                has_access = True
-        
-        if not has_access:
+        # Check access permissions; grantees see only the records their grants cover
+        readable = AccessPolicy.patient_records_filter(current_user, patient_id)
+        if readable is None:
             return jsonify({
                 'error': {
                     'code': 'FORBIDDEN',
@@ -296,19 +1022,17 @@ def list_patient_records(patient_id):
         skip = (page - 1) * limit
         
         # Find documents
+        records_query = {'patient_id': patient_id, 'is_deleted': False, **readable}
         documents = db_manager.find_many(
             'medical_documents',
-            {'patient_id': patient_id, 'is_deleted': False},
+            records_query,
             limit=limit,
             skip=skip,
             sort=[('created_at', -1)]
         )
         
         # Count total documents
-        total_count = db_manager.count_documents(
-            'medical_documents',
-            {'patient_id': patient_id, 'is_deleted': False}
-        )
+        total_count = db_manager.count_documents('medical_documents', records_query)
         
         # Format response
         records = []
@@ -351,4 +1075,54 @@ def list_patient_records(patient_id):
                 'timestamp': datetime.utcnow().isoformat(),
                 'requestId': str(uuid.uuid4())
             }
-        }), 500
\ No newline at end of file
+        }), 500
+
+@records_bp.route('/patient/<patient_id>/timeline', methods=['GET'])
+@require_auth
+def get_patient_timeline(patient_id):
+    """Get the clinical timeline summary for a patient"""
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'User not found',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 401
+        
+        # The summary covers every record, so only users who may list them all
+        # see it; grantees see just the records their grants cover
+        if AccessPolicy.patient_records_filter(current_user, patient_id) != {}:
+            return jsonify({
+                'error': {
+                    'code': 'FORBIDDEN',
+                    'message': 'Access denied to patient records',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'requestId': str(uuid.uuid4())
+                }
+            }), 403
+        
+        AuditLogger.log_action(
+            user_id=str(current_user['_id']),
+            action='PATIENT_TIMELINE_VIEWED',
+            resource_type='PATIENT',
+            resource_id=patient_id
+        )
+        
+        return jsonify({
+            'timeline': TimelineManager.format(TimelineManager.get(patient_id)),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'TIMELINE_ERROR',
+                'message': str(e),
+                'timestamp': datetime.utcnow().isoformat(),
+                'requestId': str(uuid.uuid4())
+            }
+        }), 500
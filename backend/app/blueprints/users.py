@@ -5,6 +5,7 @@ from app.models.database import db_manager
 from app.models.schemas import UserRole
 from app.utils.auth import require_auth, require_role, get_current_user
 from app.utils.audit import AuditLogger
+from app.utils.search_terms import SEARCH_SOURCE_FIELDS, search_fields
 import uuid
 
 users_bp = Blueprint('users', __name__)
@@ -115,6 +116,10 @@ def update_profile():
                 }
             }), 400
 
+        # Keep the search terms in step with the names they come from
+        if any(field in update_data for field in SEARCH_SOURCE_FIELDS):
+            update_data.update(search_fields({**current_user, **update_data}))
+        
         # Update user profile
         success = db_manager.update_one(
             'users',
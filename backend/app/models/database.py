@@ -1,17 +1,24 @@
 from flask import current_app
+from pymongo import UpdateOne
 from pymongo.errors import DuplicateKeyError, PyMongoError
 from bson import ObjectId
+from gridfs import GridFSBucket
 from datetime import datetime
 import logging
+from app.models.schemas import GRANT_NO_EXPIRY, GrantScope, grant_scope_key
+from app.utils.search_terms import SEARCH_SOURCE_PROJECTION, search_fields
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     def __init__(self):
         self.db = None
+        self.fs = None
     
     def init_app(self, app):
         self.db = app.db
+        # Encrypted record content is stored as raw bytes in GridFS
+        self.fs = GridFSBucket(self.db, bucket_name='document_content')
         self._create_indexes()
     
     def _create_indexes(self):
@@ -21,6 +28,10 @@ class DatabaseManager:
             self.db.users.create_index("email", unique=True)
             self.db.users.create_index("role")
             self.db.users.create_index("is_active")
+            self.db.users.create_index([("search_terms", 1), ("role", 1), ("is_active", 1)])
+            self.db.users.create_index([("exact_terms", 1), ("role", 1), ("is_active", 1)])
+            self.db.users.create_index([("phonetic_keys", 1), ("role", 1), ("is_active", 1)])
+            self.db.users.create_index([("name_trigrams", 1), ("role", 1), ("is_active", 1)])
             
             # Medical documents indexes
             self.db.medical_documents.create_index("patient_id")
@@ -28,12 +39,41 @@ class DatabaseManager:
             self.db.medical_documents.create_index("document_type")
             self.db.medical_documents.create_index("created_at")
             self.db.medical_documents.create_index("is_deleted")
+            self.db.medical_documents.create_index([("patient_id", 1), ("created_at", -1)])
+            self.db.medical_documents.create_index("retention_date", sparse=True)
+            self.db.medical_documents.create_index([("is_deleted", 1), ("deleted_at", 1)])
+            self.db.medical_documents.create_index(
+                [("title", "text"), ("description", "text")],
+                weights={"title": 3, "description": 1},
+                name="document_text"
+            )
+            self.db.medical_documents.create_index(
+                "ingest_key", unique=True,
+                partialFilterExpression={"ingest_key": {"$exists": True}}
+            )
             
             # Access grants indexes
             self.db.access_grants.create_index([("grantee_id", 1), ("document_id", 1)])
             self.db.access_grants.create_index("grantor_id")
             self.db.access_grants.create_index("expires_at")
             self.db.access_grants.create_index("is_active")
+            self.db.access_grants.create_index([("is_active", 1), ("expires_at", 1)])
+            self.db.access_grants.create_index([("grantee_id", 1), ("patient_id", 1), ("is_active", 1)])
+            self.db.access_grants.create_index([("grantee_id", 1), ("is_active", 1), ("created_at", -1)])
+            
+            # Encryption keys indexes
+            self.db.encryption_keys.create_index("key_id", unique=True)
+            
+            # Patient timeline summaries
+            self.db.patient_timelines.create_index("patient_id", unique=True)
+            
+            # Care relationships (member, patient) maintained on upload and grant changes
+            self.db.care_relationships.create_index([("member_id", 1), ("patient_id", 1)], unique=True)
+            self.db.care_relationships.create_index([("member_id", 1), ("updated_at", -1)])
+            
+            # Archive index (records moved to cold segment files)
+            self.db.archive_index.create_index("document_id", unique=True)
+            self.db.archive_index.create_index("patient_id")
             
             # Audit logs indexes
             self.db.audit_logs.create_index("user_id")
@@ -45,6 +85,187 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error creating database indexes: {e}")
 
+    # Data migrations in the order they run; each name is recorded in
+    # schema_migrations once applied so it never runs again
+    MIGRATIONS = (
+        ('grant_expiry_sentinel', '_backfill_grant_expiry'),
+        ('grant_documents', '_backfill_grant_documents'),
+        ('active_grant_unique', '_create_grant_unique_index'),
+        ('active_patient_grant_unique', '_create_patient_grant_unique_index'),
+        ('user_search_terms', '_backfill_search_terms'),
+        ('care_relationships', '_backfill_care_relationships'),
+    )
+
+    def migrate(self) -> list:
+        """Apply the data migrations not yet recorded; returns the names applied
+        
+        They scan whole collections, so migrate.py runs them once per deploy
+        instead of every process start. A failing migration raises and is
+        left unrecorded, so the next run retries it.
+        """
+        applied = {migration['_id'] for migration in self.db.schema_migrations.find({}, {'_id': 1})}
+        ran = []
+        for name, method in self.MIGRATIONS:
+            if name in applied:
+                continue
+            logger.info(f"Applying migration {name}")
+            getattr(self, method)()
+            self.db.schema_migrations.update_one(
+                {'_id': name}, {'$setOnInsert': {'applied_at': datetime.utcnow()}}, upsert=True
+            )
+            ran.append(name)
+        return ran
+
+    def _backfill_grant_expiry(self, batch_size: int = 1000):
+        """Give grants stored without an expiry the GRANT_NO_EXPIRY sentinel, in batches"""
+        converted = 0
+        while True:
+            ids = [grant['_id'] for grant in self.db.access_grants.find(
+                {'expires_at': None}, {'_id': 1}).limit(batch_size)]
+            if not ids:
+                break
+            result = self.db.access_grants.update_many(
+                {'_id': {'$in': ids}, 'expires_at': None},
+                {'$set': {'expires_at': GRANT_NO_EXPIRY}}
+            )
+            converted += result.modified_count
+        if converted:
+            logger.info(f"Set the no-expiry sentinel on {converted} access grants")
+
+    def _create_grant_unique_index(self):
+        """Allow at most one active grant per (grantee_id, document_id)
+        
+        Duplicate active rows left by earlier racing grants are deactivated
+        first, keeping the most recently updated one. Patient-scoped grants
+        have no document_id; _create_patient_grant_unique_index covers them.
+        """
+        duplicates = self.db.access_grants.aggregate([
+            {'$match': {'is_active': True, 'document_id': {'$type': 'string'}}},
+            {'$sort': {'updated_at': -1}},
+            {'$group': {'_id': {'grantee_id': '$grantee_id', 'document_id': '$document_id'},
+                        'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}}
+        ])
+        stale_ids = [grant_id for group in duplicates for grant_id in group['ids'][1:]]
+        if stale_ids:
+            self.db.access_grants.update_many(
+                {'_id': {'$in': stale_ids}},
+                {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}}
+            )
+            logger.info(f"Deactivated {len(stale_ids)} duplicate access grants")
+        # Keyed document-first so it differs from the (grantee_id, document_id)
+        # lookup index and also serves per-document grant listings
+        self.db.access_grants.create_index(
+            [("document_id", 1), ("grantee_id", 1)],
+            unique=True,
+            partialFilterExpression={'is_active': True, 'document_id': {'$type': 'string'}},
+            name="active_grant_unique"
+        )
+
+    def _create_patient_grant_unique_index(self, batch_size: int = 1000):
+        """Allow at most one active patient-scoped grant per (grantee_id, patient_id, scope_key)
+        
+        Scoped grants stored before scope_key existed get it first, then
+        duplicate active rows are deactivated as for document grants.
+        """
+        while True:
+            grants = list(self.db.access_grants.find(
+                {'scope': GrantScope.PATIENT.value, 'scope_key': {'$exists': False}},
+                {'document_types': 1, 'records_from': 1, 'records_to': 1}).limit(batch_size))
+            if not grants:
+                break
+            self.db.access_grants.bulk_write([
+                UpdateOne({'_id': grant['_id']}, {'$set': {'scope_key': grant_scope_key(
+                    grant.get('document_types'), grant.get('records_from'), grant.get('records_to'))}})
+                for grant in grants
+            ], ordered=False)
+        duplicates = self.db.access_grants.aggregate([
+            {'$match': {'is_active': True, 'scope': GrantScope.PATIENT.value}},
+            {'$sort': {'updated_at': -1}},
+            {'$group': {'_id': {'grantee_id': '$grantee_id', 'patient_id': '$patient_id',
+                                'scope_key': '$scope_key'},
+                        'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}}
+        ])
+        stale_ids = [grant_id for group in duplicates for grant_id in group['ids'][1:]]
+        if stale_ids:
+            self.db.access_grants.update_many(
+                {'_id': {'$in': stale_ids}},
+                {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}}
+            )
+            logger.info(f"Deactivated {len(stale_ids)} duplicate patient access grants")
+        self.db.access_grants.create_index(
+            [("grantee_id", 1), ("patient_id", 1), ("scope_key", 1)],
+            unique=True,
+            partialFilterExpression={'is_active': True, 'scope': GrantScope.PATIENT.value},
+            name="active_patient_grant_unique"
+        )
+
+    def _backfill_grant_documents(self, batch_size: int = 1000):
+        """Copy patient_id and document_type from documents onto older grants
+        
+        Each batch resolves its documents with one query and writes with one
+        unordered bulk_write. Grants whose document no longer exists get
+        null fields so they are not picked up again.
+        """
+        converted = 0
+        while True:
+            grants = list(self.db.access_grants.find(
+                {'patient_id': {'$exists': False}}, {'document_id': 1}).limit(batch_size))
+            if not grants:
+                break
+            documents = self.resolve_references(
+                'medical_documents',
+                (grant.get('document_id') for grant in grants),
+                projection={'patient_id': 1, 'document_type': 1}
+            )
+            updates = []
+            for grant in grants:
+                document = documents.get(str(grant.get('document_id'))) or {}
+                updates.append(UpdateOne({'_id': grant['_id']}, {'$set': {
+                    'patient_id': document.get('patient_id'),
+                    'document_type': document.get('document_type')
+                }}))
+            self.db.access_grants.bulk_write(updates, ordered=False)
+            converted += len(updates)
+        if converted:
+            logger.info(f"Backfilled patient_id on {converted} access grants")
+
+    def _backfill_search_terms(self, batch_size: int = 1000):
+        """Derive search fields for users stored before they, exact_terms or the fuzzy signatures existed"""
+        converted = 0
+        while True:
+            users = list(self.db.users.find(
+                {'$or': [{'search_terms': {'$exists': False}}, {'exact_terms': {'$exists': False}},
+                         {'phonetic_keys': {'$exists': False}}]},
+                SEARCH_SOURCE_PROJECTION).limit(batch_size))
+            if not users:
+                break
+            self.db.users.bulk_write(
+                [UpdateOne({'_id': user['_id']}, {'$set': search_fields(user)}) for user in users],
+                ordered=False
+            )
+            converted += len(users)
+        if converted:
+            logger.info(f"Backfilled search terms on {converted} users")
+
+    def _backfill_care_relationships(self):
+        """Build care_relationships from existing records and grants
+        
+        Patient-level authorization reads only this collection, so it must
+        exist before requests are served. A collection that already holds
+        pairs is left to the daily rebuild job.
+        """
+        if self.db.care_relationships.find_one({}, {'_id': 1}) is not None:
+            return
+        if self.db.medical_documents.find_one({}, {'_id': 1}) is None and \
+                self.db.access_grants.find_one({}, {'_id': 1}) is None:
+            return
+        # Imported here because care_team itself uses db_manager
+        from app.utils.care_team import CareRelationships
+        pairs = CareRelationships.rebuild()
+        logger.info(f"Built {pairs} care relationships")
+
     def insert_one(self, collection: str, document: dict) -> str:
         """Insert a single document and return its ID"""
         try:
@@ -57,10 +278,19 @@ class DatabaseManager:
             logger.error(f"Database error in {collection}: {e}")
             raise
 
-    def find_one(self, collection: str, filter_dict: dict) -> dict:
+    def insert_many(self, collection: str, documents: list, ordered: bool = True) -> list:
+        """Insert several documents in one round trip and return their IDs"""
+        try:
+            result = self.db[collection].insert_many(documents, ordered=ordered)
+            return [str(inserted_id) for inserted_id in result.inserted_ids]
+        except PyMongoError as e:
+            logger.error(f"Database error in {collection}: {e}")
+            raise
+
+    def find_one(self, collection: str, filter_dict: dict, projection: dict = None) -> dict:
         """Find a single document"""
         try:
-            return self.db[collection].find_one(filter_dict)
+            return self.db[collection].find_one(filter_dict, projection)
         except PyMongoError as e:
             logger.error(f"Database error in {collection}: {e}")
             raise
@@ -79,7 +309,34 @@ class DatabaseManager:
             return list(cursor)
         except PyMongoError as e:
             logger.error(f"Database error in {collection}: {e}")
-            raise 
+            raise
+
+    def resolve_references(self, collection: str, ids, projection: dict = None,
+                           field: str = '_id', filter_dict: dict = None) -> dict:
+        """Fetch the documents referenced by ids in one $in query
+        
+        Returns {str(id): document}; ids with no match are absent. For the
+        default '_id' field, string ids are converted to ObjectIds and
+        invalid ones are skipped. filter_dict adds conditions, e.g. to
+        exclude deleted or inactive documents.
+        """
+        keys = list(dict.fromkeys(str(ref) for ref in ids if ref is not None))
+        if not keys:
+            return {}
+        if field == '_id':
+            values = [ObjectId(key) for key in keys if ObjectId.is_valid(key)]
+        else:
+            values = keys
+        if not values:
+            return {}
+        if projection is not None and field not in projection:
+            projection = {**projection, field: 1}
+        return {
+            str(document[field]): document
+            for document in self.find_many(collection, {**(filter_dict or {}), field: {'$in': values}},
+                                           projection=projection)
+        }
+
     def update_one(self, collection: str, filter_dict: dict, update_dict: dict) -> bool:
         """Update a single document"""
         try:
@@ -14,11 +14,39 @@ class DocumentType(Enum):
     IMAGING = "imaging"
     CONSULTATION = "consultation"
 
+# Stored as expires_at on grants without an expiry, so "still valid" is the
+# single range predicate expires_at > now
+GRANT_NO_EXPIRY = datetime(9999, 12, 31)
+
+def grant_expiry(expires_at: Optional[datetime]) -> datetime:
+    """Value to store for a grant's expires_at"""
+    return expires_at or GRANT_NO_EXPIRY
+
+def public_grant_expiry(expires_at: Optional[datetime]) -> Optional[datetime]:
+    """expires_at as shown to API clients: None for grants that never expire"""
+    if expires_at is None or expires_at >= GRANT_NO_EXPIRY:
+        return None
+    return expires_at
+
+def grant_scope_key(document_types: Optional[list], records_from: Optional[datetime],
+                    records_to: Optional[datetime]) -> str:
+    """One string for a patient-scoped grant's categories and window
+
+    Grants are deduplicated on it; a unique index on the document_types
+    array itself would be multikey and reject overlapping categories.
+    """
+    bounds = [bound.isoformat() if bound else '' for bound in (records_from, records_to)]
+    return '|'.join([','.join(sorted(document_types or []))] + bounds)
+
 class AccessLevel(Enum):
     READ = "read"
     WRITE = "write"
     ADMIN = "admin"
 
+class GrantScope(Enum):
+    DOCUMENT = "document"  # one record, identified by document_id
+    PATIENT = "patient"    # every record of patient_id, optionally narrowed
+
 # MongoDB Schema Definitions (Mongoose-style)
 class BaseSchema:
     def __init__(self):
@@ -87,7 +115,17 @@ class AccessGrantSchema(BaseSchema):
         self.grantee_id = grantee_id
         self.document_id = document_id
         self.access_level = access_level.value
-        self.expires_at = kwargs.get('expires_at')
+        # Copied from the document so grants can be looked up per patient
+        self.patient_id = kwargs.get('patient_id')
+        self.document_type = kwargs.get('document_type')
+        self.scope = kwargs.get('scope', GrantScope.DOCUMENT).value
+        # Patient-scoped grants only: categories and created_at window covered
+        self.document_types = kwargs.get('document_types')
+        self.records_from = kwargs.get('records_from')
+        self.records_to = kwargs.get('records_to')
+        if self.scope == GrantScope.PATIENT.value:
+            self.scope_key = grant_scope_key(self.document_types, self.records_from, self.records_to)
+        self.expires_at = grant_expiry(kwargs.get('expires_at'))
         self.is_active = kwargs.get('is_active', True)
         self.granted_by = kwargs.get('granted_by')
         self.reason = kwargs.get('reason', '')
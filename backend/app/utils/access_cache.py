@@ -0,0 +1,212 @@
+from flask import current_app
+from datetime import datetime
+import logging
+import time
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# A user's cache version outlives any request that read it
+VERSION_TTL = 24 * 3600
+
+# KEYS: decisions hash, version   ARGV: version read with the grants, ttl, field, value, ...
+PUT_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+class AccessCache:
+    """Redis cache of grant-based read decisions, keyed by (user, document)
+
+    Each user has one hash, acl:<user_id>, mapping document ids to
+    "<allowed>:<valid_until>". valid_until is capped at the grant's
+    expires_at, so a cached allow never outlives the grant. Grant changes
+    drop the affected field and user status changes drop the whole hash.
+    The number of grants shared with a user is cached next to it under
+    acl:<user_id>:shared_count and dropped on every grant change.
+
+    Every invalidation also bumps acl:<user_id>:version. Callers read the
+    version with the decisions (lookup) before querying grants, and
+    put_many only writes if it is unchanged, so a decision computed from
+    grants read before a concurrent revocation is never cached after it.
+    Any Redis error is treated as a miss, so the database stays the
+    source of truth.
+    """
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f'acl:{user_id}'
+
+    @staticmethod
+    def _count_key(user_id: str) -> str:
+        return f'acl:{user_id}:shared_count'
+
+    @staticmethod
+    def _version_key(user_id: str) -> str:
+        return f'acl:{user_id}:version'
+
+    @staticmethod
+    def _decode(value) -> bool:
+        """Return the cached decision, or None when missing or past valid_until"""
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode()
+        allowed, valid_until = value.split(':', 1)
+        if float(valid_until) <= time.time():
+            return None
+        return allowed == '1'
+
+    @staticmethod
+    def lookup(user_id: str, document_ids: list) -> tuple:
+        """Return ({document_id: allowed} for the cached, unexpired decisions, cache version)
+
+        The version is None when Redis is unavailable; put_many then skips the write.
+        """
+        try:
+            pipe = current_app.redis_client.pipeline()
+            if document_ids:
+                pipe.hmget(AccessCache._key(user_id), document_ids)
+            pipe.get(AccessCache._version_key(user_id))
+            *values, version = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Access cache unavailable: {e}")
+            metrics.incr('access_cache.errors')
+            return {}, None
+        version = version.decode() if isinstance(version, bytes) else (version or '0')
+        if not document_ids:
+            return {}, version
+
+        decisions = {}
+        for document_id, value in zip(document_ids, values[0]):
+            decision = AccessCache._decode(value)
+            if decision is not None:
+                decisions[document_id] = decision
+        metrics.incr('access_cache.hits', len(decisions))
+        metrics.incr('access_cache.misses', len(document_ids) - len(decisions))
+        return decisions, version
+
+    @staticmethod
+    def get_many(user_id: str, document_ids: list) -> dict:
+        """Return {document_id: allowed} for the cached, unexpired decisions"""
+        return AccessCache.lookup(user_id, document_ids)[0]
+
+    @staticmethod
+    def version(user_id: str):
+        """Return the user's current cache version, or None when Redis is unavailable"""
+        return AccessCache.lookup(user_id, [])[1]
+
+    @staticmethod
+    def get(user_id: str, document_id: str):
+        """Return the cached decision for one document, or None"""
+        return AccessCache.get_many(user_id, [document_id]).get(document_id)
+
+    @staticmethod
+    def put_many(user_id: str, decisions: dict, version: str):
+        """Cache {document_id: (allowed, grant_expires_at or None)} unless the version changed
+
+        version is the one lookup returned before the grants behind the
+        decisions were read; returns whether the decisions were cached.
+        """
+        if not decisions or version is None:
+            return False
+        ttl = current_app.config['ACCESS_CACHE_TTL']
+        now = time.time()
+        mapping = {}
+        for document_id, (allowed, expires_at) in decisions.items():
+            valid_until = now + ttl
+            if allowed and isinstance(expires_at, datetime):
+                valid_until = min(valid_until, (expires_at - datetime.utcnow()).total_seconds() + now)
+            mapping[document_id] = f"{'1' if allowed else '0'}:{valid_until:.3f}"
+        args = [version, ttl]
+        for field, value in mapping.items():
+            args += [field, value]
+        try:
+            stored = current_app.redis_client.eval(
+                PUT_SCRIPT, 2, AccessCache._key(user_id), AccessCache._version_key(user_id), *args
+            )
+        except Exception as e:
+            logger.warning(f"Access cache unavailable: {e}")
+            metrics.incr('access_cache.errors')
+            return False
+        if not stored:
+            metrics.incr('access_cache.stale_writes')
+        return bool(stored)
+
+    @staticmethod
+    def put(user_id: str, document_id: str, allowed: bool, version: str, expires_at: datetime = None):
+        return AccessCache.put_many(user_id, {document_id: (allowed, expires_at)}, version)
+
+    @staticmethod
+    def invalidate(user_id: str, document_id: str = None):
+        """Drop one cached decision, or every decision for a user"""
+        try:
+            pipe = current_app.redis_client.pipeline()
+            if document_id is None:
+                pipe.delete(AccessCache._key(user_id))
+            else:
+                pipe.hdel(AccessCache._key(user_id), document_id)
+            pipe.delete(AccessCache._count_key(user_id))
+            pipe.incr(AccessCache._version_key(user_id))
+            pipe.expire(AccessCache._version_key(user_id), VERSION_TTL)
+            pipe.execute()
+            metrics.incr('access_cache.invalidations')
+        except Exception as e:
+            # A stale allow would outlive a revocation, so make it visible
+            logger.error(f"Failed to invalidate access cache for user {user_id}: {e}")
+            metrics.incr('access_cache.errors')
+
+    @staticmethod
+    def invalidate_many(pairs):
+        """Drop the cached decisions for many (user_id, document_id) pairs in one round trip
+
+        A document_id of None drops every decision for that user.
+        """
+        by_user = {}
+        for user_id, document_id in pairs:
+            by_user.setdefault(user_id, set()).add(document_id)
+        if not by_user:
+            return
+        try:
+            pipe = current_app.redis_client.pipeline()
+            for user_id, document_ids in by_user.items():
+                if None in document_ids:
+                    pipe.delete(AccessCache._key(user_id))
+                else:
+                    pipe.hdel(AccessCache._key(user_id), *document_ids)
+                pipe.delete(AccessCache._count_key(user_id))
+                pipe.incr(AccessCache._version_key(user_id))
+                pipe.expire(AccessCache._version_key(user_id), VERSION_TTL)
+            pipe.execute()
+            metrics.incr('access_cache.invalidations', sum(len(ids) for ids in by_user.values()))
+        except Exception as e:
+            logger.error(f"Failed to invalidate access cache for {len(by_user)} users: {e}")
+            metrics.incr('access_cache.errors')
+
+    @staticmethod
+    def shared_count(user_id: str, compute) -> int:
+        """Return the cached number of grants shared with a user, calling compute() on a miss"""
+        key = AccessCache._count_key(user_id)
+        try:
+            cached = current_app.redis_client.get(key)
+            if cached is not None:
+                metrics.incr('access_cache.count_hits')
+                return int(cached)
+        except Exception as e:
+            logger.warning(f"Access cache unavailable: {e}")
+            metrics.incr('access_cache.errors')
+            return compute()
+
+        metrics.incr('access_cache.count_misses')
+        count = compute()
+        try:
+            current_app.redis_client.set(key, count, ex=current_app.config['SHARED_COUNT_CACHE_TTL'])
+        except Exception as e:
+            logger.warning(f"Failed to cache shared count: {e}")
+        return count
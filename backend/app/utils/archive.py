@@ -0,0 +1,276 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+import bson
+import hashlib
+import logging
+import os
+import time
+import uuid
+from app.models.database import db_manager
+from app.utils.compression import CompressionManager
+from app.utils.idempotency import RELEASE_LOCK_SCRIPT
+from app.utils.jobs import job_handler
+from app.utils.storage import FORMAT_SEGMENTED
+from app.utils.timeline import TimelineManager
+from app.utils.care_team import CareRelationships
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_REASON_DELETED = 'deleted'
+ARCHIVE_REASON_RETENTION = 'retention'
+
+# Segment frames are BSON documents, so store them under a MIME type that compresses
+FRAME_MIME_TYPE = 'application/bson'
+LOCK_KEY = 'archive:lock'
+
+class ArchiveError(Exception):
+    """Raised when an archived record cannot be read back"""
+
+def in_archive_window(now: datetime = None) -> bool:
+    """Check whether archival may run now (off-peak hours, server local time)"""
+    config = current_app.config
+    start, end = config['ARCHIVE_WINDOW_START_HOUR'], config['ARCHIVE_WINDOW_END_HOUR']
+    hour = (now or datetime.now()).hour
+    if start == end:
+        return True
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+class ArchiveManager:
+    """Moves expired and deleted records to compressed local segment files
+
+    Each archival batch appends one frame per record to a new segment file
+    under ARCHIVE_FOLDER. A frame is the compressed BSON of the document plus
+    its raw content and derivative bytes, which stay encrypted under the
+    record's data key. archive_index maps a document id to its segment,
+    offset and length, so one record can be read back without scanning.
+    Hot copies are only deleted after the segment is fsynced and indexed;
+    a batch interrupted before that is simply archived again.
+    """
+
+    @staticmethod
+    def _folder() -> str:
+        return current_app.config['ARCHIVE_FOLDER']
+
+    @staticmethod
+    def candidate_filter(now: datetime = None) -> dict:
+        """Documents due for archival: past retention or deleted beyond the grace period"""
+        now = now or datetime.utcnow()
+        deleted_before = now - timedelta(days=current_app.config['ARCHIVE_DELETED_GRACE_DAYS'])
+        return {
+            '$and': [
+                {'$or': [
+                    {'is_deleted': True, 'deleted_at': {'$lte': deleted_before}},
+                    {'retention_date': {'$lte': now}}
+                ]},
+                # Records rehydrated on demand stay hot for a while
+                {'$or': [
+                    {'archive_hold_until': {'$exists': False}},
+                    {'archive_hold_until': {'$lte': now}}
+                ]}
+            ]
+        }
+
+    @staticmethod
+    def _read_file(file_id) -> bytes:
+        with db_manager.fs.open_download_stream(file_id) as stream:
+            return stream.read()
+
+    @staticmethod
+    def _frame(document: dict) -> dict:
+        """Collect a document and the bytes of everything it references"""
+        frame = {'document': document, 'content': None, 'derivatives': {}}
+        if document.get('content_format') == FORMAT_SEGMENTED:
+            frame['content'] = ArchiveManager._read_file(document['content_id'])
+        for kind, derivative in (document.get('derivatives') or {}).items():
+            frame['derivatives'][kind] = ArchiveManager._read_file(derivative['content_id'])
+        return frame
+
+    @staticmethod
+    def _file_ids(document: dict) -> list:
+        ids = []
+        if document.get('content_id') is not None:
+            ids.append(document['content_id'])
+        ids.extend(d['content_id'] for d in (document.get('derivatives') or {}).values())
+        return ids
+
+    @staticmethod
+    def _delete_hot(documents: list):
+        """Bulk-delete documents and their GridFS content from hot storage"""
+        if not documents:
+            return
+        document_ids = [doc['_id'] for doc in documents]
+        file_ids = [file_id for doc in documents for file_id in ArchiveManager._file_ids(doc)]
+
+        db_manager.db.medical_documents.delete_many({'_id': {'$in': document_ids}})
+        if file_ids:
+            db_manager.db['document_content.files'].delete_many({'_id': {'$in': file_ids}})
+            db_manager.db['document_content.chunks'].delete_many({'files_id': {'$in': file_ids}})
+        # Deleted records already left the timeline and care relationships when they were deleted
+        live = [doc for doc in documents if not doc.get('is_deleted')]
+        for doc in live:
+            TimelineManager.record_removed(doc)
+        CareRelationships.records_removed(live)
+
+    @staticmethod
+    def archive_batch(batch_size: int) -> int:
+        """Archive up to batch_size due documents; returns how many were processed"""
+        documents = db_manager.find_many(
+            'medical_documents',
+            ArchiveManager.candidate_filter(),
+            limit=batch_size,
+            sort=[('_id', 1)]
+        )
+        if not documents:
+            return 0
+
+        # Copies archived by an interrupted batch or rehydrated earlier only need deleting
+        already_archived = {
+            entry['document_id'] for entry in db_manager.find_many(
+                'archive_index',
+                {'document_id': {'$in': [str(doc['_id']) for doc in documents]}},
+                projection={'document_id': 1}
+            )
+        }
+        pending = [doc for doc in documents if str(doc['_id']) not in already_archived]
+
+        if pending:
+            now = datetime.utcnow()
+            relative_path = os.path.join(now.strftime('%Y-%m'), f'segment-{ObjectId()}.bin')
+            path = os.path.join(ArchiveManager._folder(), relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            index_entries = []
+            with open(path, 'wb') as segment:
+                for doc in pending:
+                    payload, codec = CompressionManager.compress(
+                        bson.encode(ArchiveManager._frame(doc)), FRAME_MIME_TYPE
+                    )
+                    index_entries.append({
+                        'document_id': str(doc['_id']),
+                        'patient_id': doc['patient_id'],
+                        'reason': ARCHIVE_REASON_DELETED if doc.get('is_deleted') else ARCHIVE_REASON_RETENTION,
+                        'segment': relative_path,
+                        'offset': segment.tell(),
+                        'length': len(payload),
+                        'compression': codec,
+                        'checksum': hashlib.sha256(payload).hexdigest(),
+                        'archived_at': now,
+                        'rehydrated_at': None
+                    })
+                    segment.write(payload)
+                segment.flush()
+                os.fsync(segment.fileno())
+
+            db_manager.db.archive_index.bulk_write([
+                ReplaceOne({'document_id': entry['document_id']}, entry, upsert=True)
+                for entry in index_entries
+            ], ordered=False)
+
+        ArchiveManager._delete_hot(documents)
+        logger.info(f"Archived {len(pending)} records ({len(documents) - len(pending)} already archived)")
+        return len(documents)
+
+    @staticmethod
+    def run(max_seconds: float = None, ignore_window: bool = False) -> int:
+        """Archive due documents in rate-limited batches until done or out of time"""
+        config = current_app.config
+        if not ignore_window and not in_archive_window():
+            return 0
+
+        max_seconds = max_seconds or config['ARCHIVE_MAX_RUN_SECONDS']
+        rate = config['ARCHIVE_MAX_DOCS_PER_SECOND']
+        started = time.monotonic()
+        total = 0
+        while time.monotonic() - started < max_seconds:
+            processed = ArchiveManager.archive_batch(config['ARCHIVE_BATCH_SIZE'])
+            if not processed:
+                break
+            total += processed
+            # Throttle to the configured rate so archival never saturates the database
+            wait = total / rate - (time.monotonic() - started)
+            if wait > 0:
+                time.sleep(min(wait, max(0.0, max_seconds - (time.monotonic() - started))))
+        return total
+
+    @staticmethod
+    def read(document_id: str) -> dict:
+        """Read an archived record's frame back from its segment file"""
+        entry = db_manager.find_one('archive_index', {'document_id': document_id})
+        if not entry:
+            return None
+        path = os.path.join(ArchiveManager._folder(), entry['segment'])
+        try:
+            with open(path, 'rb') as segment:
+                segment.seek(entry['offset'])
+                payload = segment.read(entry['length'])
+        except OSError as e:
+            raise ArchiveError(f'Archive segment unavailable: {e}')
+        if hashlib.sha256(payload).hexdigest() != entry['checksum']:
+            raise ArchiveError('Archived record failed checksum verification')
+        return bson.decode(CompressionManager.decompress(payload, entry['compression']))
+
+    @staticmethod
+    def rehydrate(document_id: str) -> dict:
+        """Restore an archived record to hot storage; returns the document or None"""
+        frame = ArchiveManager.read(document_id)
+        if frame is None:
+            return None
+        document = frame['document']
+        hold_days = current_app.config['ARCHIVE_REHYDRATE_HOLD_DAYS']
+
+        # Content keeps its original GridFS ids, so the document needs no rewrite
+        if frame.get('content') is not None:
+            ArchiveManager._restore_file(document['content_id'], frame['content'], document)
+        for kind, data in (frame.get('derivatives') or {}).items():
+            ArchiveManager._restore_file(document['derivatives'][kind]['content_id'], data, document)
+
+        document['archive_hold_until'] = datetime.utcnow() + timedelta(days=hold_days)
+        try:
+            db_manager.db.medical_documents.insert_one(document)
+            if not document.get('is_deleted'):
+                TimelineManager.record_added(document)
+                CareRelationships.record_added(document)
+        except DuplicateKeyError:
+            pass  # already rehydrated
+
+        db_manager.update_one('archive_index', {'document_id': document_id},
+                              {'rehydrated_at': datetime.utcnow()})
+        return document
+
+    @staticmethod
+    def _restore_file(file_id, data: bytes, document: dict):
+        if db_manager.db['document_content.files'].count_documents({'_id': file_id}, limit=1):
+            return
+        upload = db_manager.fs.open_upload_stream_with_id(
+            file_id,
+            f"{document['_id']}.restored",
+            metadata={'owner_id': document['patient_id'],
+                      'encryption_key_id': document['encryption_key_id']}
+        )
+        try:
+            upload.write(data)
+            upload.close()
+        except Exception:
+            upload.abort()
+            raise
+
+@job_handler('archive.run', every=60)
+def run_archival():
+    """Periodic archival job; a Redis lock keeps runs from overlapping"""
+    redis_client = current_app.redis_client
+    lock_seconds = current_app.config['ARCHIVE_MAX_RUN_SECONDS'] * 2
+    # A run that outlives its lock must not release the next run's
+    token = uuid.uuid4().hex
+    if not redis_client.set(LOCK_KEY, token, nx=True, ex=int(lock_seconds)):
+        return
+    try:
+        processed = ArchiveManager.run()
+        if processed:
+            logger.info(f"Archival run processed {processed} records")
+    finally:
+        redis_client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
@@ -1,7 +1,10 @@
 from datetime import datetime
-from flask import request
+from flask import request, has_request_context
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from app.models.database import db_manager
 from app.models.schemas import AuditLogSchema
+from app.utils.jobs import enqueue, job_handler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,6 +34,64 @@ class AuditLogger:
         except Exception as e:
             logger.error(f"Failed to create audit log: {e}")
     
+    @staticmethod
+    def log_actions_bulk(entries: list):
+        """Log several actions with a single insert
+
+        Each entry takes the same keyword arguments as log_action.
+        """
+        if not entries:
+            return
+        try:
+            audit_logs = [
+                AuditLogSchema(
+                    user_id=entry['user_id'],
+                    action=entry['action'],
+                    resource_type=entry['resource_type'],
+                    resource_id=entry['resource_id'],
+                    ip_address=request.remote_addr if request else None,
+                    user_agent=request.headers.get('User-Agent') if request else None,
+                    success=entry.get('success', True),
+                    error_message=entry.get('error_message'),
+                    details=entry.get('details') or {}
+                ).__dict__
+                for entry in entries
+            ]
+            
+            db_manager.insert_many('audit_logs', audit_logs, ordered=False)
+            logger.info(f"Audit logs created: {len(audit_logs)} entries")
+            
+        except Exception as e:
+            logger.error(f"Failed to create audit logs: {e}")
+    
+    @staticmethod
+    def defer_action(user_id: str, action: str, resource_type: str,
+                     resource_id: str, success: bool = True,
+                     error_message: str = None, details: dict = None):
+        """Queue an audit log write for the background worker
+
+        The log id is fixed at enqueue time, so a retried job cannot write
+        the entry twice. Falls back to a synchronous write if Redis is down.
+        """
+        entry = {
+            'log_id': str(ObjectId()),
+            'user_id': user_id,
+            'action': action,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'ip_address': request.remote_addr if has_request_context() else None,
+            'user_agent': request.headers.get('User-Agent') if has_request_context() else None,
+            'success': success,
+            'error_message': error_message,
+            'details': details or {},
+            'created_at': datetime.utcnow().isoformat()
+        }
+        try:
+            enqueue('audit.write', entry, job_id=f"audit:{entry['log_id']}")
+        except Exception as e:
+            logger.warning(f"Could not queue audit log, writing inline: {e}")
+            write_deferred_audit_log(entry)
+    
     @staticmethod
     def log_login_attempt(user_id: str, success: bool, error_message: str = None):
         """Log login attempt"""
@@ -45,8 +106,8 @@ class AuditLogger:
     
     @staticmethod
     def log_document_access(user_id: str, document_id: str, action: str):
-        """Log document access"""
-        AuditLogger.log_action(
+        """Log document access (written by the job worker)"""
+        AuditLogger.defer_action(
             user_id=user_id,
             action=action,
             resource_type='MEDICAL_DOCUMENT',
@@ -73,4 +134,29 @@ class AuditLogger:
             resource_type='ADMIN_ACTION',
             resource_id=target_user_id or admin_id,
             details=details
-        )
\ No newline at end of file
+        )
+
+@job_handler('audit.write')
+def write_deferred_audit_log(entry: dict):
+    """Insert an audit log queued by AuditLogger.defer_action"""
+    created_at = datetime.fromisoformat(entry['created_at'])
+    audit_log = AuditLogSchema(
+        user_id=entry['user_id'],
+        action=entry['action'],
+        resource_type=entry['resource_type'],
+        resource_id=entry['resource_id'],
+        ip_address=entry.get('ip_address'),
+        user_agent=entry.get('user_agent'),
+        success=entry.get('success', True),
+        error_message=entry.get('error_message'),
+        details=entry.get('details') or {}
+    ).__dict__
+    audit_log.update({
+        '_id': ObjectId(entry['log_id']),
+        'created_at': created_at,
+        'updated_at': created_at
+    })
+    try:
+        db_manager.db.audit_logs.insert_one(audit_log)
+    except DuplicateKeyError:
+        pass  # already written by an earlier delivery
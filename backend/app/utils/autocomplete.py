@@ -0,0 +1,165 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+import logging
+import threading
+import time
+from app.models.schemas import UserRole
+from app.utils.metrics import metrics
+from app.utils.search_terms import tokenize, compact
+
+logger = logging.getLogger(__name__)
+
+# Fields kept in memory per patient
+DIRECTORY_PROJECTION = {'first_name': 1, 'last_name': 1, 'medical_record_number': 1}
+
+class _Snapshot:
+    """One immutable build of the directory
+
+    keys is a sorted list of normalized strings and slots[i] is the
+    position in patients of the patient keys[i] belongs to. Each patient
+    contributes its name tokens, "first last", "last first" and its
+    compacted MRN, so any of them can be typed from the start.
+    """
+    __slots__ = ('keys', 'slots', 'patients', 'built_at', 'truncated')
+
+    def __init__(self, keys=(), slots=(), patients=(), built_at=None, truncated=False):
+        self.keys = list(keys)
+        self.slots = array('I', slots)
+        self.patients = list(patients)
+        self.built_at = built_at
+        self.truncated = truncated
+
+    @staticmethod
+    def entry_keys(patient: dict) -> set:
+        first, last = tokenize(patient.get('first_name')), tokenize(patient.get('last_name'))
+        keys = set(first + last)
+        keys.add(' '.join(first + last))
+        keys.add(' '.join(last + first))
+        if patient.get('medical_record_number'):
+            keys.add(compact(patient['medical_record_number']))
+        keys.discard('')
+        return keys
+
+class PatientDirectory:
+    """In-process typeahead index over active patients' names and MRNs
+
+    The index is a sorted array searched with bisect: a prefix lookup is
+    one binary search followed by a short forward scan, so top-k answers
+    take microseconds and no database round trip. It is built from a
+    streaming cursor by a background thread when the web process starts
+    and rebuilt every refresh_seconds, with the new snapshot swapped in
+    whole so readers never see a partial build. At most max_patients are
+    held; a directory that hit the cap is flagged as truncated in stats().
+    """
+
+    def __init__(self, max_patients: int = 200000, refresh_seconds: int = 60):
+        self.max_patients = max_patients
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = _Snapshot()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def configure(self, max_patients: int, refresh_seconds: int):
+        """Apply size and refresh settings; they take effect on the next build"""
+        self.max_patients = max_patients
+        self.refresh_seconds = refresh_seconds
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot.built_at is not None
+
+    def build(self, database) -> int:
+        """Stream active patients into a new snapshot and swap it in; returns the patient count"""
+        started = time.perf_counter()
+        entries = []
+        patients = []
+        truncated = False
+        cursor = database.users.find(
+            {'role': UserRole.PATIENT.value, 'is_active': True},
+            DIRECTORY_PROJECTION
+        ).batch_size(1000)
+        for patient in cursor:
+            if len(patients) >= self.max_patients:
+                truncated = True
+                break
+            slot = len(patients)
+            patients.append((str(patient['_id']), patient.get('first_name', ''),
+                             patient.get('last_name', ''), patient.get('medical_record_number')))
+            entries.extend((key, slot) for key in _Snapshot.entry_keys(patient))
+        cursor.close()
+
+        entries.sort()
+        self._snapshot = _Snapshot(
+            keys=(key for key, _ in entries),
+            slots=(slot for _, slot in entries),
+            patients=patients,
+            built_at=datetime.utcnow(),
+            truncated=truncated
+        )
+        metrics.observe('autocomplete.build_seconds', time.perf_counter() - started)
+        if truncated:
+            logger.warning(f"Patient directory capped at {self.max_patients} patients")
+        return len(patients)
+
+    def start(self, app):
+        """Build in the background now and every refresh_seconds; safe to call repeatedly"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.configure(app.config['AUTOCOMPLETE_MAX_PATIENTS'], app.config['AUTOCOMPLETE_REFRESH_SECONDS'])
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, args=(app,),
+                                            name='patient-directory', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self, app):
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    count = self.build(app.db)
+                logger.info(f"Patient directory rebuilt with {count} patients")
+            except Exception as e:
+                logger.error(f"Failed to rebuild patient directory: {e}")
+            self._stop.wait(self.refresh_seconds)
+
+    def complete(self, query: str, limit: int = 10) -> list:
+        """Return up to limit patients with a key starting with the query, in key order"""
+        snapshot = self._snapshot
+        prefixes = {' '.join(tokenize(query)), compact(query)}
+        prefixes.discard('')
+        found = {}
+        for prefix in sorted(prefixes):
+            index = bisect_left(snapshot.keys, prefix)
+            while (index < len(snapshot.keys) and len(found) < limit and
+                   snapshot.keys[index].startswith(prefix)):
+                slot = snapshot.slots[index]
+                found.setdefault(slot, snapshot.keys[index])
+                index += 1
+        metrics.incr('autocomplete.queries')
+        ranked = sorted(found.items(), key=lambda item: (item[1], item[0]))[:limit]
+        return [{
+            'id': snapshot.patients[slot][0],
+            'first_name': snapshot.patients[slot][1],
+            'last_name': snapshot.patients[slot][2],
+            'medical_record_number': snapshot.patients[slot][3]
+        } for slot, _ in ranked]
+
+    def stats(self) -> dict:
+        """Return the current snapshot's size and age"""
+        snapshot = self._snapshot
+        return {
+            'patients': len(snapshot.patients),
+            'keys': len(snapshot.keys),
+            'max_patients': self.max_patients,
+            'truncated': snapshot.truncated,
+            'built_at': snapshot.built_at.isoformat() if snapshot.built_at else None,
+            'refresh_seconds': self.refresh_seconds
+        }
+
+# Global directory shared by the request handlers of this process
+patient_directory = PatientDirectory()
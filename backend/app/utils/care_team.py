@@ -0,0 +1,223 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import logging
+from app.models.database import db_manager
+from app.utils.jobs import job_handler
+
+logger = logging.getLogger(__name__)
+
+class CareRelationships:
+    """Materialized (care team member, patient) pairs in care_relationships
+
+    One document per pair counts the records the member authored for the
+    patient and the active grants the member holds on the patient's
+    records (document or patient-scoped). Members are usually doctors, but
+    any grantee gets a pair. Uploads, deletes, grants, revocations and
+    expiry adjust the counts with $inc. Authorization is then one lookup
+    on the unique (member_id, patient_id) key, and a doctor's patient list
+    is one indexed query. rebuild() recomputes every pair from scratch; it
+    runs at startup while the collection is empty, then daily to repair
+    drift.
+    """
+
+    @staticmethod
+    def _apply(changes: dict):
+        """Apply {(member_id, patient_id): {'authored': n, 'grants': m}} with one unordered bulk write"""
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'member_id': member_id, 'patient_id': patient_id},
+                {'$inc': counts, '$set': {'updated_at': now}, '$setOnInsert': {'created_at': now}},
+                upsert=True
+            )
+            for (member_id, patient_id), counts in changes.items()
+            if member_id and patient_id and member_id != patient_id
+        ]
+        if not operations:
+            return
+        try:
+            db_manager.db.care_relationships.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to update {len(operations)} care relationships: {e}")
+
+    @staticmethod
+    def _count(pairs, field: str, delta: int):
+        changes = {}
+        for pair in pairs:
+            counts = changes.setdefault(pair, {field: 0})
+            counts[field] += delta
+        CareRelationships._apply(changes)
+
+    @staticmethod
+    def records_added(documents: list):
+        """Count new records for their authoring doctors"""
+        CareRelationships._count(((doc['doctor_id'], doc['patient_id']) for doc in documents), 'authored', 1)
+
+    @staticmethod
+    def record_added(document: dict):
+        CareRelationships.records_added([document])
+
+    @staticmethod
+    def records_removed(documents: list):
+        """Uncount deleted or archived records"""
+        CareRelationships._count(((doc['doctor_id'], doc['patient_id']) for doc in documents), 'authored', -1)
+
+    @staticmethod
+    def record_removed(document: dict):
+        CareRelationships.records_removed([document])
+
+    @staticmethod
+    def grants_added(grants: list):
+        """Count newly created grants (dicts with grantee_id and patient_id)"""
+        CareRelationships._count(((grant['grantee_id'], grant.get('patient_id')) for grant in grants), 'grants', 1)
+
+    @staticmethod
+    def grants_removed(grants: list):
+        """Uncount revoked or expired grants"""
+        CareRelationships._count(((grant['grantee_id'], grant.get('patient_id')) for grant in grants), 'grants', -1)
+
+    @staticmethod
+    def get(member_id: str, patient_id: str) -> dict:
+        """Return the pair's counts, or None when the member has no relationship with the patient"""
+        relationship = db_manager.find_one('care_relationships',
+                                           {'member_id': member_id, 'patient_id': patient_id})
+        if not relationship or (relationship.get('authored', 0) <= 0 and relationship.get('grants', 0) <= 0):
+            return None
+        return relationship
+
+    @staticmethod
+    def is_treating(doctor_id: str, patient_id: str) -> bool:
+        """Check whether a doctor has authored any current record for the patient"""
+        return patient_id in CareRelationships.treating(doctor_id, [patient_id])
+
+    @staticmethod
+    def treating(doctor_id: str, patient_ids: list) -> set:
+        """Return which of the patients the doctor has authored current records for, in one query"""
+        if not patient_ids:
+            return set()
+        return {
+            relationship['patient_id'] for relationship in db_manager.find_many(
+                'care_relationships',
+                {'member_id': doctor_id, 'patient_id': {'$in': list(patient_ids)}, 'authored': {'$gt': 0}},
+                projection={'patient_id': 1}
+            )
+        }
+
+    @staticmethod
+    def related(member_id: str, patient_ids: list) -> set:
+        """Return which of the patients the member treats or holds grants for, in one query"""
+        if not patient_ids:
+            return set()
+        return {
+            relationship['patient_id'] for relationship in db_manager.find_many(
+                'care_relationships',
+                {'member_id': member_id, 'patient_id': {'$in': list(patient_ids)},
+                 '$or': [{'authored': {'$gt': 0}}, {'grants': {'$gt': 0}}]},
+                projection={'patient_id': 1}
+            )
+        }
+
+    @staticmethod
+    def patient_ids(member_id: str) -> list:
+        """Ids of every patient the member treats or holds grants for, most recent first"""
+        return [
+            relationship['patient_id'] for relationship in db_manager.find_many(
+                'care_relationships',
+                {'member_id': member_id, '$or': [{'authored': {'$gt': 0}}, {'grants': {'$gt': 0}}]},
+                sort=[('updated_at', -1)],
+                projection={'patient_id': 1}
+            )
+        ]
+
+    @staticmethod
+    def _recount(pairs: list = None) -> dict:
+        """Count {(member_id, patient_id): {'authored': n, 'grants': m}} from medical_documents and access_grants
+
+        pairs limits the count to those pairs; by default every pair is counted.
+        """
+        documents_match = {'is_deleted': False}
+        grants_match = {'is_active': True, 'expires_at': {'$gt': datetime.utcnow()}, 'patient_id': {'$type': 'string'}}
+        if pairs is not None:
+            documents_match['$or'] = [{'doctor_id': member_id, 'patient_id': patient_id}
+                                      for member_id, patient_id in pairs]
+            grants_match['$or'] = [{'grantee_id': member_id, 'patient_id': patient_id}
+                                   for member_id, patient_id in pairs]
+        counts = {}
+        for row in db_manager.aggregate('medical_documents', [
+            {'$match': documents_match},
+            {'$group': {'_id': {'member_id': '$doctor_id', 'patient_id': '$patient_id'}, 'count': {'$sum': 1}}}
+        ]):
+            counts.setdefault((row['_id']['member_id'], row['_id']['patient_id']), {})['authored'] = row['count']
+        for row in db_manager.aggregate('access_grants', [
+            {'$match': grants_match},
+            {'$group': {'_id': {'member_id': '$grantee_id', 'patient_id': '$patient_id'}, 'count': {'$sum': 1}}}
+        ]):
+            counts.setdefault((row['_id']['member_id'], row['_id']['patient_id']), {})['grants'] = row['count']
+        return {(member_id, patient_id): pair_counts for (member_id, patient_id), pair_counts in counts.items()
+                if member_id and patient_id and member_id != patient_id}
+
+    @staticmethod
+    def rebuild() -> int:
+        """Recompute every pair from medical_documents and access_grants; returns the pair count
+
+        Uploads and grants keep applying $inc while this runs, so counts are
+        never overwritten blindly: pairs that differ from the full recount
+        are counted again just before the write, and each write only matches
+        if the stored counts are still the ones read, leaving a pair changed
+        in the meantime to the next rebuild. Rows with nothing left to count
+        are then deleted; an $inc arriving later simply recreates its pair.
+        """
+        counts = CareRelationships._recount()
+        stored = {
+            (row['member_id'], row['patient_id']): row
+            for row in db_manager.find_many('care_relationships', {},
+                                            projection={'member_id': 1, 'patient_id': 1, 'authored': 1, 'grants': 1})
+        }
+
+        def differs(pair, recount):
+            row = stored.get(pair) or {}
+            expected = recount.get(pair, {})
+            return (row.get('authored') or 0, row.get('grants') or 0) != \
+                (expected.get('authored', 0), expected.get('grants', 0))
+
+        drifted = [pair for pair in set(counts) | set(stored) if differs(pair, counts)]
+        operations = []
+        for start in range(0, len(drifted), 1000):
+            batch = drifted[start:start + 1000]
+            recount = CareRelationships._recount(batch)
+            now = datetime.utcnow()
+            for member_id, patient_id in batch:
+                if not differs((member_id, patient_id), recount):
+                    continue
+                pair_counts = {'authored': recount.get((member_id, patient_id), {}).get('authored', 0),
+                               'grants': recount.get((member_id, patient_id), {}).get('grants', 0)}
+                row = stored.get((member_id, patient_id))
+                if row is None:
+                    operations.append(UpdateOne(
+                        {'member_id': member_id, 'patient_id': patient_id},
+                        {'$set': {'updated_at': now}, '$setOnInsert': {**pair_counts, 'created_at': now}},
+                        upsert=True
+                    ))
+                else:
+                    operations.append(UpdateOne(
+                        {'_id': row['_id'], 'authored': row.get('authored'), 'grants': row.get('grants')},
+                        {'$set': {**pair_counts, 'updated_at': now}}
+                    ))
+        for start in range(0, len(operations), 1000):
+            try:
+                db_manager.db.care_relationships.bulk_write(operations[start:start + 1000], ordered=False)
+            except BulkWriteError as e:
+                # A pair inserted concurrently by $inc; the next rebuild checks it
+                logger.warning(f"Skipped {len(e.details.get('writeErrors', []))} care relationship repairs: {e}")
+        db_manager.db.care_relationships.delete_many(
+            {'authored': {'$not': {'$gt': 0}}, 'grants': {'$not': {'$gt': 0}}})
+        if drifted:
+            logger.info(f"Repaired {len(operations)} of {len(drifted)} drifted care relationships")
+        return len(counts)
+
+@job_handler('care_relationships.rebuild', every=24 * 60 * 60)
+def rebuild_care_relationships():
+    """Daily full recount of care relationships"""
+    pairs = CareRelationships.rebuild()
+    logger.info(f"Rebuilt {pairs} care relationships")
@@ -0,0 +1,115 @@
+import zlib
+import logging
+
+try:
+    import zstandard as zstd
+except ImportError:  # zstandard is optional, zlib is always available
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_IDENTITY = 'identity'
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+# Formats that are already compressed internally; recompressing them only burns CPU
+INCOMPRESSIBLE_MIME_TYPES = {
+    'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp', 'image/heic',
+    'image/jp2', 'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/x-7z-compressed', 'application/x-rar-compressed', 'application/zstd',
+}
+INCOMPRESSIBLE_MIME_PREFIXES = ('video/', 'audio/')
+
+# Levels per MIME family: (zstd level, zlib level)
+HIGH_RATIO_MIME_TYPES = {
+    'text/plain', 'text/csv', 'text/html', 'text/xml', 'application/json',
+    'application/xml', 'application/dicom', 'application/hl7-v2', 'application/fhir+json',
+}
+LOW_RATIO_MIME_TYPES = {'application/pdf', 'image/tiff', 'image/bmp'}
+HIGH_RATIO_LEVELS = (9, 9)
+LOW_RATIO_LEVELS = (1, 1)
+DEFAULT_LEVELS = (3, 6)
+
+# Payloads smaller than this are stored as-is
+MIN_COMPRESS_SIZE = 256
+
+class CompressionManager:
+    """Compresses record content before encryption, chosen per MIME type"""
+
+    @staticmethod
+    def select_codec(mime_type: str, size: int = None) -> tuple:
+        """Return (codec, level) for the given MIME type"""
+        mime_type = (mime_type or '').split(';')[0].strip().lower()
+
+        if size is not None and size < MIN_COMPRESS_SIZE:
+            return CODEC_IDENTITY, 0
+        if (mime_type in INCOMPRESSIBLE_MIME_TYPES or
+                mime_type.startswith(INCOMPRESSIBLE_MIME_PREFIXES)):
+            return CODEC_IDENTITY, 0
+
+        if mime_type in HIGH_RATIO_MIME_TYPES or mime_type.startswith('text/'):
+            levels = HIGH_RATIO_LEVELS
+        elif mime_type in LOW_RATIO_MIME_TYPES:
+            levels = LOW_RATIO_LEVELS
+        else:
+            levels = DEFAULT_LEVELS
+
+        if zstd is not None:
+            return CODEC_ZSTD, levels[0]
+        return CODEC_ZLIB, levels[1]
+
+    @staticmethod
+    def compress(data: bytes, mime_type: str) -> tuple:
+        """Compress data for storage and return (payload, codec)
+
+        Falls back to identity when the codec does not shrink the payload.
+        """
+        codec, level = CompressionManager.select_codec(mime_type, len(data))
+        if codec == CODEC_IDENTITY:
+            return data, CODEC_IDENTITY
+
+        if codec == CODEC_ZSTD:
+            compressed = zstd.ZstdCompressor(level=level).compress(data)
+        else:
+            compressed = zlib.compress(data, level)
+
+        if len(compressed) >= len(data):
+            return data, CODEC_IDENTITY
+        return compressed, codec
+
+    @staticmethod
+    def decompress(data: bytes, codec: str) -> bytes:
+        """Reverse CompressionManager.compress"""
+        if not codec or codec == CODEC_IDENTITY:
+            return data
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec == CODEC_ZSTD:
+            if zstd is None:
+                raise RuntimeError('zstandard is required to read zstd-compressed records')
+            return zstd.ZstdDecompressor().decompressobj().decompress(data)
+        raise ValueError(f'Unknown compression codec: {codec}')
+
+    @staticmethod
+    def compressobj(codec: str, level: int):
+        """Return an incremental compressor with compress()/flush(), or None for identity"""
+        if codec == CODEC_IDENTITY:
+            return None
+        if codec == CODEC_ZLIB:
+            return zlib.compressobj(level)
+        if codec == CODEC_ZSTD:
+            return zstd.ZstdCompressor(level=level).compressobj()
+        raise ValueError(f'Unknown compression codec: {codec}')
+
+    @staticmethod
+    def decompressobj(codec: str):
+        """Return an incremental decompressor with decompress(), or None for identity"""
+        if not codec or codec == CODEC_IDENTITY:
+            return None
+        if codec == CODEC_ZLIB:
+            return zlib.decompressobj()
+        if codec == CODEC_ZSTD:
+            if zstd is None:
+                raise RuntimeError('zstandard is required to read zstd-compressed records')
+            return zstd.ZstdDecompressor().decompressobj()
+        raise ValueError(f'Unknown compression codec: {codec}')
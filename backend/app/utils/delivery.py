@@ -0,0 +1,97 @@
+from flask import current_app, request, has_request_context, send_from_directory, Response, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+from urllib.parse import urlencode, quote
+import base64
+import hashlib
+import hmac
+import mimetypes
+import os
+import time
+
+DELIVERY_DIRECT = 'direct'  # Flask sends the bytes itself
+DELIVERY_ACCEL = 'accel'    # Flask authorizes, nginx sends the bytes (X-Accel-Redirect)
+
+def accel_enabled() -> bool:
+    return current_app.config.get('FILE_DELIVERY_MODE', DELIVERY_DIRECT) == DELIVERY_ACCEL
+
+def send_frontend_file(frontend_dir: str, subdir: str, filename: str):
+    """Serve a frontend file directly or hand it to nginx with X-Accel-Redirect
+
+    subdir is the file's folder relative to the frontend root ('' for the root).
+    """
+    directory = os.path.join(frontend_dir, subdir) if subdir else frontend_dir
+    if not accel_enabled():
+        return send_from_directory(directory, filename)
+
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    internal_path = current_app.config['ACCEL_FRONTEND_LOCATION'].rstrip('/') + '/' + \
+        '/'.join(part for part in (subdir, filename) if part)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    # nginx replaces the empty body with the file, sent with sendfile
+    response = Response(status=200, mimetype=mimetype)
+    response.headers['X-Accel-Redirect'] = internal_path
+    return response
+
+def content_disposition(file_name: str) -> str:
+    """Build an attachment Content-Disposition header for a user-supplied file name
+
+    The quoted filename is a sanitized ASCII fallback; filename* carries the
+    original name percent-encoded (RFC 5987), so quotes, CR/LF or non-ASCII
+    characters in it cannot break or inject headers.
+    """
+    file_name = file_name or 'document'
+    fallback = secure_filename(file_name) or 'document'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+def check_signing_secret(config):
+    """Refuse to start without a dedicated SIGNED_URL_SECRET outside development and testing
+
+    Signed links stand in for the JWT, so a secret anyone can read would
+    let anyone mint them. Development and testing fall back to SECRET_KEY.
+    """
+    if not config.get('SIGNED_URL_SECRET') and not (config.get('DEBUG') or config.get('TESTING')):
+        raise RuntimeError('SIGNED_URL_SECRET must be set outside development and testing')
+
+def _signing_secret() -> bytes:
+    config = current_app.config
+    check_signing_secret(config)
+    return (config.get('SIGNED_URL_SECRET') or config['SECRET_KEY']).encode()
+
+def _signature(path: str, expires: int, user_id: str) -> str:
+    secret = _signing_secret()
+    message = f'{path}\n{expires}\n{user_id}'.encode()
+    digest = hmac.new(secret, message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+def sign_url(path: str, user_id: str, ttl: int = None) -> tuple:
+    """Return (url, expires) for a short-lived link to path issued to user_id
+
+    path is relative to the application root, the same string request.path
+    gives verify_signed_url; the returned URL adds the script root the app
+    is mounted under.
+    """
+    expires = int(time.time()) + (ttl or current_app.config['SIGNED_URL_TTL'])
+    query = urlencode({
+        'expires': expires,
+        'user': user_id,
+        'signature': _signature(path, expires, user_id)
+    })
+    script_root = request.script_root if has_request_context() else ''
+    return f'{script_root}{path}?{query}', expires
+
+def verify_signed_url(path: str, args) -> str:
+    """Check the signature and expiry of a signed request; returns the issuing user id or None"""
+    try:
+        expires = int(args.get('expires', ''))
+    except ValueError:
+        return None
+    user_id = args.get('user', '')
+    signature = args.get('signature', '')
+    if not user_id or not signature or expires < time.time():
+        return None
+    if not hmac.compare_digest(signature, _signature(path, expires, user_id)):
+        return None
+    return user_id
@@ -0,0 +1,140 @@
+from bson import ObjectId
+from datetime import datetime
+import io
+import logging
+from app.models.database import db_manager
+from app.utils.jobs import enqueue, job_handler
+from app.utils.storage import DocumentStorage, FORMAT_SEGMENTED
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; image derivatives are skipped without it
+    Image = None
+
+try:
+    import fitz  # PyMuPDF, optional; PDF previews are skipped without it
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+# Derivative kind -> longest edge in pixels
+DERIVATIVE_SIZES = {
+    'thumbnail': 256,
+    'preview': 1024
+}
+DERIVATIVE_MIME_TYPE = 'image/jpeg'
+
+RENDER_JOB = 'derivatives.render'
+
+def wants_derivatives(document: dict) -> bool:
+    """Check whether a document should get preview derivatives"""
+    # Client-side encrypted content cannot be decoded by the server
+    if document.get('content_format') != FORMAT_SEGMENTED:
+        return False
+    mime_type = (document.get('mime_type') or '').lower()
+    return (document.get('document_type') == 'imaging' or
+            mime_type.startswith('image/') or mime_type == 'application/pdf')
+
+def render_derivatives(data: bytes, mime_type: str) -> dict:
+    """Render every derivative kind for a file; returns {kind: jpeg_bytes}
+
+    A pure function of the file's bytes, run by the job worker so CPU-heavy
+    decoding never happens in a web process. Returns an empty dict for
+    unsupported inputs.
+    """
+    mime_type = (mime_type or '').lower()
+    if mime_type == 'application/pdf':
+        if fitz is None or Image is None:
+            return {}
+        with fitz.open(stream=data, filetype='pdf') as pdf:
+            if pdf.page_count == 0:
+                return {}
+            pixmap = pdf[0].get_pixmap(dpi=150)
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        if Image is None:
+            return {}
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception:
+            return {}
+
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    results = {}
+    for kind, max_edge in DERIVATIVE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge))
+        buffer = io.BytesIO()
+        resized.save(buffer, format='JPEG', quality=80, optimize=True)
+        results[kind] = buffer.getvalue()
+    return results
+
+class DerivativeManager:
+    """Stores rendered derivatives next to the original document content"""
+
+    @staticmethod
+    def store(document: dict, rendered: dict) -> dict:
+        """Encrypt and store rendered derivatives under the document's data key"""
+        derivatives = {}
+        for kind, data in rendered.items():
+            fields = DocumentStorage.store(
+                [data],
+                DERIVATIVE_MIME_TYPE,
+                document['patient_id'],
+                file_name=f"{document['_id']}.{kind}.jpg",
+                size_hint=len(data),
+                key_id=document['encryption_key_id']
+            )
+            fields['mime_type'] = DERIVATIVE_MIME_TYPE
+            fields['created_at'] = datetime.utcnow()
+            derivatives[kind] = fields
+
+        if derivatives:
+            db_manager.update_one(
+                'medical_documents',
+                {'_id': document['_id']},
+                {f'derivatives.{kind}': fields for kind, fields in derivatives.items()}
+            )
+            # A retried job replaces derivatives written by an earlier attempt
+            for kind, previous in (document.get('derivatives') or {}).items():
+                if kind in derivatives:
+                    DocumentStorage.delete(previous)
+        return derivatives
+
+def queue_derivatives(documents: list):
+    """Queue derivative rendering for the documents that want it
+
+    The job id is fixed per document, so a document already waiting in the
+    queue is not queued twice. A record whose job cannot be queued is still
+    saved; it just has no previews.
+    """
+    for document in documents:
+        if not wants_derivatives(document):
+            continue
+        document_id = str(document['_id'])
+        try:
+            enqueue(RENDER_JOB, document_id, job_id=f'derivatives:{document_id}')
+        except Exception as e:
+            logger.warning(f"Could not queue derivatives for document {document_id}: {e}")
+
+@job_handler(RENDER_JOB)
+def render_document_derivatives(document_id: str):
+    """Render and store a document's derivatives
+
+    Failures raise, so the job queue retries them with backoff and moves
+    the job to its dead list after JOB_MAX_ATTEMPTS.
+    """
+    document = db_manager.find_one('medical_documents', {
+        '_id': ObjectId(document_id),
+        'is_deleted': False
+    })
+    if not document or not wants_derivatives(document):
+        return
+    rendered = render_derivatives(DocumentStorage.read_all(document), document['mime_type'])
+    if rendered:
+        DerivativeManager.store(document, rendered)
+    logger.info(f"Derivatives for {document_id}: {sorted(rendered) or 'unsupported'}")
@@ -1,10 +1,37 @@
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
 import base64
 import os
 import hashlib
+import logging
 import secrets
+import threading
+import time
+from app.models.database import db_manager
+from app.utils.compression import CompressionManager
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Key id used for content stored exactly as the client sent it
+UNMANAGED_KEY_ID = 'simple_key'
+DATA_KEY_LENGTH = 32
+# Data keys are only ever used as AES-256-GCM keys for segmented content
+DATA_KEY_ALGORITHM = 'AES-256-GCM'
+# Label of keys issued before segmented content; their raw bytes also served
+# as the Fernet key for legacy inline records, so they keep both ciphers
+LEGACY_KEY_ALGORITHM = 'AES-256'
+
+def _as_fernet(key) -> Fernet:
+    """Accept either a Fernet key string or an already-built Fernet instance"""
+    if isinstance(key, Fernet):
+        return key
+    return Fernet(key.encode())
 
 class EncryptionManager:
     @staticmethod
@@ -24,20 +51,39 @@ class EncryptionManager:
         return base64.urlsafe_b64encode(kdf.derive(password.encode()))
     
     @staticmethod
-    def encrypt_data(data: str, key: str) -> str:
-        """Encrypt data using Fernet (AES-256)"""
-        f = Fernet(key.encode())
+    def encrypt_data(data: str, key) -> str:
+        """Encrypt data using Fernet (AES-128-CBC with HMAC-SHA256)"""
+        f = _as_fernet(key)
         encrypted_data = f.encrypt(data.encode())
         return base64.urlsafe_b64encode(encrypted_data).decode()
     
     @staticmethod
-    def decrypt_data(encrypted_data: str, key: str) -> str:
-        """Decrypt data using Fernet (AES-256)"""
-        f = Fernet(key.encode())
+    def decrypt_data(encrypted_data: str, key) -> str:
+        """Decrypt data using Fernet (AES-128-CBC with HMAC-SHA256)"""
+        f = _as_fernet(key)
         decoded_data = base64.urlsafe_b64decode(encrypted_data.encode())
         decrypted_data = f.decrypt(decoded_data)
         return decrypted_data.decode()
     
+    @staticmethod
+    def encrypt_content(content: bytes, key, mime_type: str) -> tuple:
+        """Compress content per MIME type, then encrypt it
+
+        Returns (encrypted_data, codec); the codec must be stored with the
+        document so decrypt_content can reverse the compression.
+        """
+        payload, codec = CompressionManager.compress(content, mime_type)
+        f = _as_fernet(key)
+        encrypted_data = base64.urlsafe_b64encode(f.encrypt(payload)).decode()
+        return encrypted_data, codec
+
+    @staticmethod
+    def decrypt_content(encrypted_data: str, key, codec: str) -> bytes:
+        """Decrypt content and transparently decompress it"""
+        f = _as_fernet(key)
+        payload = f.decrypt(base64.urlsafe_b64decode(encrypted_data.encode()))
+        return CompressionManager.decompress(payload, codec)
+
     @staticmethod
     def generate_salt() -> str:
         """Generate a random salt"""
@@ -53,33 +99,198 @@ class EncryptionManager:
         """Generate a secure random token"""
         return secrets.token_urlsafe(length)
 
+class DataKey:
+    """Unwrapped data key with the cipher objects built from it
+
+    Only legacy keys get a Fernet; current keys are used with AES-GCM alone.
+    """
+    
+    __slots__ = ('raw_key', 'fernet', 'aead')
+    
+    def __init__(self, raw_key: bytearray, algorithm: str = DATA_KEY_ALGORITHM):
+        self.raw_key = raw_key
+        self.aead = AESGCM(bytes(raw_key))
+        self.fernet = None
+        if algorithm == LEGACY_KEY_ALGORITHM:
+            self.fernet = Fernet(base64.urlsafe_b64encode(bytes(raw_key)))
+
+class DataKeyCache:
+    """Bounded LRU of unwrapped data keys with a TTL
+
+    Entries hold the raw key in a bytearray that is zeroed when the entry is
+    evicted or expires. Cipher objects built from it keep their own copy, so
+    zeroization is best effort until they are garbage collected.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: int = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def configure(self, max_size: int, ttl: int):
+        """Apply size/TTL settings, trimming the cache if it shrank"""
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            while len(self._entries) > self.max_size:
+                self._evict_oldest('key_cache.evictions')
+    
+    def get(self, key_id: str):
+        """Return the cached value for key_id, or None on miss"""
+        with self._lock:
+            entry = self._entries.get(key_id)
+            if entry is None:
+                metrics.incr('key_cache.misses')
+                return None
+            raw_key, cipher, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key_id]
+                self._zeroize(raw_key)
+                metrics.incr('key_cache.expirations')
+                metrics.incr('key_cache.misses')
+                return None
+            self._entries.move_to_end(key_id)
+            metrics.incr('key_cache.hits')
+            return cipher
+    
+    def put(self, key_id: str, raw_key: bytearray, cipher):
+        """Cache an unwrapped key, evicting the least recently used entry if full"""
+        with self._lock:
+            previous = self._entries.pop(key_id, None)
+            if previous is not None and previous[0] is not raw_key:
+                self._zeroize(previous[0])
+            self._entries[key_id] = (raw_key, cipher, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._evict_oldest('key_cache.evictions')
+    
+    def invalidate(self, key_id: str):
+        """Drop a single key, e.g. after revocation"""
+        with self._lock:
+            entry = self._entries.pop(key_id, None)
+            if entry is not None:
+                self._zeroize(entry[0])
+    
+    def clear(self):
+        """Zeroize and drop every cached key"""
+        with self._lock:
+            for raw_key, _, _ in self._entries.values():
+                self._zeroize(raw_key)
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """Return cache occupancy and hit/miss counters"""
+        with self._lock:
+            size = len(self._entries)
+        hits = metrics.get('key_cache.hits')
+        misses = metrics.get('key_cache.misses')
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'evictions': metrics.get('key_cache.evictions'),
+            'expirations': metrics.get('key_cache.expirations'),
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0
+        }
+    
+    def _evict_oldest(self, counter: str):
+        _, (raw_key, _, _) = self._entries.popitem(last=False)
+        self._zeroize(raw_key)
+        metrics.incr(counter)
+    
+    @staticmethod
+    def _zeroize(raw_key: bytearray):
+        for i in range(len(raw_key)):
+            raw_key[i] = 0
+
+# Global cache of unwrapped document keys
+data_key_cache = DataKeyCache()
+
 class KeyManager:
-    """Manages encryption keys for medical documents"""
+    """Envelope encryption for medical documents
+
+    Every document gets its own random data key. Data keys are stored in the
+    encryption_keys collection wrapped (encrypted) by the master key, and
+    unwrapped keys are kept in data_key_cache so repeat reads skip the
+    key-store round trip.
+    """
+    
+    _master_cipher = None
+    _master_source = None
+    _master_lock = threading.Lock()
     
     @staticmethod
     def generate_document_key() -> dict:
         """Generate a new document encryption key with metadata"""
-        key = EncryptionManager.generate_key()
+        raw_key = bytearray(os.urandom(DATA_KEY_LENGTH))
         key_id = EncryptionManager.generate_secure_token(16)
         
         return {
             'key_id': key_id,
-            'key': key,
+            'raw_key': raw_key,
             'created_at': datetime.utcnow(),
-            'algorithm': 'AES-256-CBC',
-            'key_length': 256
+            'algorithm': DATA_KEY_ALGORITHM,
+            'key_length': DATA_KEY_LENGTH * 8
         }
     
     @staticmethod
-    def store_key(key_data: dict, user_id: str):
-        """Store encryption key securely (in production, use HSM or key vault)"""
-        # In production, this should use a Hardware Security Module (HSM)
-        # or cloud key management service like AWS KMS, Azure Key Vault, etc.
-        from backend.app.models.database import db_manager
+    def check_master_key(config) -> bool:
+        """Return whether a master key is configured; raise when one is required
+
+        Only development and testing may fall back to a master key derived
+        from SECRET_KEY, whose default is public. Called at startup so a
+        misconfigured deployment fails before it serves any request.
+        """
+        if config.get('MASTER_ENCRYPTION_KEY'):
+            return True
+        if not (config.get('DEBUG') or config.get('TESTING')):
+            raise RuntimeError('MASTER_ENCRYPTION_KEY must be set outside development and testing')
+        logger.warning("MASTER_ENCRYPTION_KEY not set; deriving master key from SECRET_KEY")
+        return False
+    
+    @staticmethod
+    def get_master_cipher() -> Fernet:
+        """Return the key-encryption key, built once per configured secret"""
+        master_key = current_app.config.get('MASTER_ENCRYPTION_KEY')
+        if not master_key:
+            if not (current_app.config.get('DEBUG') or current_app.config.get('TESTING')):
+                raise RuntimeError('MASTER_ENCRYPTION_KEY must be set outside development and testing')
+            # Development fallback: derive a stable master key from SECRET_KEY
+            master_key = current_app.config['SECRET_KEY']
         
+        with KeyManager._master_lock:
+            if KeyManager._master_source != master_key:
+                if not current_app.config.get('MASTER_ENCRYPTION_KEY'):
+                    derived = EncryptionManager.derive_key_from_password(
+                        master_key, b'medical-records-master-key')
+                    KeyManager._master_cipher = Fernet(derived)
+                else:
+                    KeyManager._master_cipher = Fernet(master_key.encode())
+                KeyManager._master_source = master_key
+                data_key_cache.configure(
+                    current_app.config.get('KEY_CACHE_SIZE', 1024),
+                    current_app.config.get('KEY_CACHE_TTL', 300)
+                )
+            return KeyManager._master_cipher
+    
+    @staticmethod
+    def wrap_key(raw_key: bytearray) -> str:
+        """Encrypt a data key with the master key"""
+        return KeyManager.get_master_cipher().encrypt(bytes(raw_key)).decode()
+    
+    @staticmethod
+    def unwrap_key(wrapped_key: str) -> bytearray:
+        """Decrypt a wrapped data key"""
+        return bytearray(KeyManager.get_master_cipher().decrypt(wrapped_key.encode()))
+    
+    @staticmethod
+    def store_key(key_data: dict, user_id: str):
+        """Store a data key wrapped by the master key (use an HSM/KMS in production)"""
         key_record = {
             'key_id': key_data['key_id'],
-            'encrypted_key': key_data['key'],  # Should be encrypted with master key
+            'wrapped_key': KeyManager.wrap_key(key_data['raw_key']),
             'owner_id': user_id,
             'created_at': key_data['created_at'],
             'algorithm': key_data['algorithm'],
@@ -89,16 +300,59 @@ class KeyManager:
         return db_manager.insert_one('encryption_keys', key_record)
     
     @staticmethod
-    def get_key(key_id: str, user_id: str) -> str:
-        """Retrieve encryption key by ID"""
-        from backend.app.models.database import db_manager
+    def create_data_key(owner_id: str) -> tuple:
+        """Generate, store and cache a data key; returns (key_id, DataKey)"""
+        key_data = KeyManager.generate_document_key()
+        KeyManager.store_key(key_data, owner_id)
+        
+        data_key = DataKey(key_data['raw_key'])
+        data_key_cache.put(key_data['key_id'], data_key.raw_key, data_key)
+        return key_data['key_id'], data_key
+    
+    @staticmethod
+    def get_data_key(key_id: str) -> DataKey:
+        """Return the unwrapped data key, consulting the cache first"""
+        data_key = data_key_cache.get(key_id)
+        if data_key is not None:
+            return data_key
+        
+        key_record = db_manager.find_one('encryption_keys', {
+            'key_id': key_id,
+            'is_active': True
+        })
+        if not key_record:
+            return None
         
+        data_key = DataKey(KeyManager.unwrap_key(key_record['wrapped_key']),
+                           key_record.get('algorithm', LEGACY_KEY_ALGORITHM))
+        data_key_cache.put(key_id, data_key.raw_key, data_key)
+        return data_key
+    
+    @staticmethod
+    def get_cipher(key_id: str) -> Fernet:
+        """Return a Fernet for a legacy data key, or None (legacy record format)"""
+        data_key = KeyManager.get_data_key(key_id)
+        return data_key.fernet if data_key else None
+    
+    @staticmethod
+    def get_key(key_id: str, user_id: str) -> str:
+        """Retrieve a legacy data key by ID as a Fernet key string"""
         key_record = db_manager.find_one('encryption_keys', {
             'key_id': key_id,
             'owner_id': user_id,
             'is_active': True
         })
         
-        if key_record:
-            return key_record['encrypted_key']  # Should be decrypted with master key
-        return None
\ No newline at end of file
+        if key_record and key_record.get('algorithm', LEGACY_KEY_ALGORITHM) == LEGACY_KEY_ALGORITHM:
+            raw_key = KeyManager.unwrap_key(key_record['wrapped_key'])
+            try:
+                return base64.urlsafe_b64encode(bytes(raw_key)).decode()
+            finally:
+                DataKeyCache._zeroize(raw_key)
+        return None
+    
+    @staticmethod
+    def revoke_key(key_id: str) -> bool:
+        """Deactivate a data key and drop it from the cache"""
+        data_key_cache.invalidate(key_id)
+        return db_manager.update_one('encryption_keys', {'key_id': key_id}, {'is_active': False})
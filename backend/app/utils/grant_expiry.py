@@ -0,0 +1,88 @@
+from datetime import datetime
+from flask import current_app
+import logging
+from app.models.database import db_manager
+from app.utils.access_cache import AccessCache
+from app.utils.audit import AuditLogger
+from app.utils.care_team import CareRelationships
+from app.utils.grant_scopes import is_scoped
+from app.utils.jobs import job_handler
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class GrantExpiry:
+    """Deactivates access grants whose expires_at has passed
+
+    Reads already treat a grant as valid only while expires_at > now, so the
+    sweep does not change who can read what. It keeps expired grants out of
+    the active set, and it writes the audit entries and cache invalidations
+    for them in bulk.
+    """
+
+    @staticmethod
+    def sweep_batch(batch_size: int, now: datetime = None) -> int:
+        """Deactivate up to batch_size expired grants; returns how many were fetched"""
+        now = now or datetime.utcnow()
+        grants = db_manager.find_many(
+            'access_grants',
+            {'is_active': True, 'expires_at': {'$lte': now}},
+            limit=batch_size,
+            projection={'grantor_id': 1, 'grantee_id': 1, 'document_id': 1, 'patient_id': 1,
+                        'scope': 1, 'expires_at': 1}
+        )
+        if not grants:
+            return 0
+
+        # The filter is repeated so grants renewed in the meantime are left alone
+        ids = [grant['_id'] for grant in grants]
+        db_manager.db.access_grants.update_many(
+            {'_id': {'$in': ids}, 'is_active': True, 'expires_at': {'$lte': now}},
+            {'$set': {'is_active': False, 'expired_at': now, 'updated_at': now}}
+        )
+        # Side effects only for the grants this sweep deactivated
+        expired = {grant['_id'] for grant in db_manager.find_many(
+            'access_grants', {'_id': {'$in': ids}, 'is_active': False, 'expired_at': now},
+            projection={'_id': 1}
+        )}
+        grants = [grant for grant in grants if grant['_id'] in expired]
+
+        # Patient-scoped grants may cover any cached document of the grantee
+        AccessCache.invalidate_many(
+            (grant['grantee_id'], None if is_scoped(grant) else grant['document_id'])
+            for grant in grants
+        )
+        CareRelationships.grants_removed(grants)
+        AuditLogger.log_actions_bulk([{
+            'user_id': grant['grantor_id'],
+            'action': 'ACCESS_EXPIRED',
+            'resource_type': 'ACCESS_GRANT',
+            'resource_id': grant.get('document_id') or grant['patient_id'],
+            'details': {'grantee_id': grant['grantee_id'], 'grant_id': str(grant['_id']),
+                        'expires_at': grant['expires_at'].isoformat()}
+        } for grant in grants])
+
+        metrics.incr('grants.expired', len(grants))
+        return len(ids)
+
+    @staticmethod
+    def sweep(batch_size: int = None, max_batches: int = None) -> int:
+        """Deactivate expired grants batch by batch; returns the total processed"""
+        config = current_app.config
+        batch_size = batch_size or config['GRANT_EXPIRY_BATCH_SIZE']
+        max_batches = max_batches or config['GRANT_EXPIRY_MAX_BATCHES']
+        now = datetime.utcnow()
+        total = 0
+        for _ in range(max_batches):
+            swept = GrantExpiry.sweep_batch(batch_size, now)
+            total += swept
+            if swept < batch_size:
+                break
+        return total
+
+@job_handler('grants.expire', every=60)
+def expire_grants():
+    """Periodic grant expiry sweep"""
+    expired = GrantExpiry.sweep()
+    if expired:
+        logger.info(f"Deactivated {expired} expired access grants")
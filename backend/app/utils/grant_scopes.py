@@ -0,0 +1,52 @@
+from bson import ObjectId
+from app.models.schemas import GrantScope
+
+# Fields needed to evaluate any grant against a document
+GRANT_SCOPE_PROJECTION = {'document_id': 1, 'expires_at': 1, 'scope': 1, 'patient_id': 1,
+                          'document_types': 1, 'records_from': 1, 'records_to': 1}
+
+def is_scoped(grant: dict) -> bool:
+    """Check whether a grant covers a patient's records rather than one document"""
+    return grant.get('scope') == GrantScope.PATIENT.value
+
+def scoped_grant_filter(grant: dict) -> dict:
+    """medical_documents filter matching the records a patient-scoped grant covers
+
+    document_types narrows by category; records_from/records_to bound
+    created_at (from inclusive, to exclusive).
+    """
+    document_filter = {'patient_id': grant['patient_id']}
+    if grant.get('document_types'):
+        document_filter['document_type'] = {'$in': grant['document_types']}
+    window = {}
+    if grant.get('records_from'):
+        window['$gte'] = grant['records_from']
+    if grant.get('records_to'):
+        window['$lt'] = grant['records_to']
+    if window:
+        document_filter['created_at'] = window
+    return document_filter
+
+def scoped_grant_covers(grant: dict, document: dict) -> bool:
+    """Check in memory whether a patient-scoped grant covers a document"""
+    if document.get('patient_id') != grant.get('patient_id'):
+        return False
+    if grant.get('document_types') and document.get('document_type') not in grant['document_types']:
+        return False
+    created_at = document.get('created_at')
+    if grant.get('records_from') and (created_at is None or created_at < grant['records_from']):
+        return False
+    if grant.get('records_to') and (created_at is None or created_at >= grant['records_to']):
+        return False
+    return True
+
+def granted_documents_filter(grants: list) -> list:
+    """$or clauses for the records covered by a mix of document and scoped grants"""
+    document_ids = [
+        ObjectId(grant['document_id']) for grant in grants
+        if not is_scoped(grant) and ObjectId.is_valid(grant.get('document_id') or '')
+    ]
+    clauses = [scoped_grant_filter(grant) for grant in grants if is_scoped(grant)]
+    if document_ids:
+        clauses.append({'_id': {'$in': document_ids}})
+    return clauses
@@ -0,0 +1,118 @@
+from functools import wraps
+from flask import request, jsonify, current_app, make_response
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from datetime import datetime
+import hashlib
+import json
+import logging
+import time
+import uuid
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Only the holder of the lock token may release it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def _error(code: str, message: str, status: int):
+    return jsonify({
+        'error': {
+            'code': code,
+            'message': message,
+            'timestamp': datetime.utcnow().isoformat(),
+            'requestId': str(uuid.uuid4())
+        }
+    }), status
+
+def _replay(cached: bytes):
+    stored = json.loads(cached)
+    response = make_response(stored['body'], stored['status'])
+    response.headers['Content-Type'] = stored['content_type']
+    response.headers[REPLAY_HEADER] = 'true'
+    metrics.incr('idempotency.replays')
+    return response
+
+def idempotent(scope: str):
+    """Decorator making a POST endpoint safe to retry with an Idempotency-Key header
+
+    Place it above require_auth/require_role: the key is checked against the
+    JWT identity alone, so a replay is answered from Redis without a Mongo
+    lookup and without reading the request body. Responses below 500 are
+    cached for IDEMPOTENCY_TTL seconds; a concurrent request with the same
+    key waits briefly for the first one to finish, then gets 409.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return f(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return _error('INVALID_IDEMPOTENCY_KEY',
+                              f'{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters', 400)
+
+            # Unauthenticated requests are left to the auth decorator to reject
+            try:
+                verify_jwt_in_request()
+                user_id = get_jwt_identity()
+            except Exception:
+                return f(*args, **kwargs)
+
+            config = current_app.config
+            redis_client = current_app.redis_client
+            digest = hashlib.sha256(key.encode()).hexdigest()
+            result_key = f'idempotency:{scope}:{user_id}:{digest}'
+            lock_key = f'{result_key}:lock'
+            token = uuid.uuid4().hex
+
+            try:
+                cached = redis_client.get(result_key)
+                if cached:
+                    return _replay(cached)
+
+                if not redis_client.set(lock_key, token, nx=True, ex=config['IDEMPOTENCY_LOCK_TIMEOUT']):
+                    # Another request with this key is in flight
+                    deadline = time.monotonic() + config['IDEMPOTENCY_WAIT_SECONDS']
+                    while time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        cached = redis_client.get(result_key)
+                        if cached:
+                            return _replay(cached)
+                    metrics.incr('idempotency.conflicts')
+                    return _error('IDEMPOTENCY_IN_PROGRESS',
+                                  'A request with this Idempotency-Key is still being processed', 409)
+            except Exception as e:
+                # Redis outage: serve the request without deduplication
+                logger.warning(f"Idempotency check unavailable: {e}")
+                return f(*args, **kwargs)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+                # Server errors are not cached so the client can retry them
+                if response.status_code < 500:
+                    try:
+                        redis_client.set(result_key, json.dumps({
+                            'status': response.status_code,
+                            'body': response.get_data(as_text=True),
+                            'content_type': response.headers.get('Content-Type', 'application/json')
+                        }), ex=config['IDEMPOTENCY_TTL'])
+                    except Exception as e:
+                        logger.warning(f"Failed to cache idempotent response: {e}")
+                return response
+            finally:
+                try:
+                    redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"Failed to release idempotency lock: {e}")
+
+        return decorated_function
+    return decorator
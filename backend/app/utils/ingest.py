@@ -0,0 +1,282 @@
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+import base64
+import binascii
+import json
+import logging
+import tempfile
+from app.models.database import db_manager
+from app.models.schemas import UserRole
+from app.utils.storage import DocumentStorage
+
+logger = logging.getLogger(__name__)
+
+VALID_DOCUMENT_TYPES = ['lab_result', 'prescription', 'diagnosis', 'imaging', 'consultation']
+READ_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 1024 * 1024
+DUPLICATE_KEY_ERROR = 11000
+
+STATUS_CREATED = 'created'
+STATUS_DUPLICATE = 'duplicate'
+STATUS_INVALID = 'invalid'
+STATUS_ERROR = 'error'
+
+class IngestFormatError(ValueError):
+    """Raised when a bulk request body cannot be parsed at all"""
+
+class IngestItem:
+    """One entry of a bulk ingestion request"""
+
+    def __init__(self, index: int, metadata: dict):
+        self.index = index
+        self.metadata = metadata if isinstance(metadata, dict) else {}
+        self.content = None  # seekable file-like object holding plaintext
+        self.errors = [] if isinstance(metadata, dict) else ['Entry must be a JSON object']
+        self.status = None
+        self.document_id = None
+
+    @property
+    def idempotency_key(self):
+        return self.metadata.get('idempotency_key')
+
+    def manifest(self) -> dict:
+        entry = {'index': self.index, 'idempotency_key': self.idempotency_key, 'status': self.status}
+        if self.document_id:
+            entry['document_id'] = self.document_id
+        if self.errors:
+            entry['errors'] = self.errors
+        return entry
+
+def _iter_file(f):
+    f.seek(0)
+    while True:
+        chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def _parse_entries(text: str) -> list:
+    """Parse a JSON array or NDJSON manifest"""
+    text = text.strip()
+    if text.startswith('['):
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise IngestFormatError(f'Invalid JSON manifest: {e}')
+    entries = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError as e:
+            raise IngestFormatError(f'Invalid JSON on line {line_number}: {e}')
+    return entries
+
+class BulkIngestor:
+    """Ingests many records for many patients in one request
+
+    Every entry is validated before anything is stored. Content is spooled
+    to temporary files while parsing and streamed through DocumentStorage,
+    metadata goes in with one unordered insert_many and the caller gets a
+    status per entry. Entries carrying an idempotency_key are stored at
+    most once per uploader, so a retried batch reports them as duplicates.
+    """
+
+    def __init__(self, uploader: dict, max_items: int):
+        self.uploader = uploader
+        self.uploader_id = str(uploader['_id'])
+        self.max_items = max_items
+        self.items = []
+
+    def _ingest_key(self, item: IngestItem) -> str:
+        return f'{self.uploader_id}:{item.idempotency_key}'
+
+    def parse_ndjson(self, stream):
+        """Read NDJSON entries with base64 file_content from a request stream"""
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            self._check_size()
+            try:
+                metadata = json.loads(line)
+            except ValueError as e:
+                raise IngestFormatError(f'Invalid JSON on line {line_number}: {e}')
+            item = IngestItem(len(self.items), metadata)
+            self.items.append(item)
+            if not item.errors:
+                self._spool_base64(item, item.metadata.pop('file_content', None))
+
+    def parse_multipart(self, form, files):
+        """Read a manifest form field whose entries name raw file parts"""
+        if 'manifest' not in form:
+            raise IngestFormatError('Multipart batches need a manifest field')
+        entries = _parse_entries(form['manifest'])
+        if not isinstance(entries, list):
+            raise IngestFormatError('Manifest must be a list of entries')
+        for metadata in entries:
+            self._check_size()
+            item = IngestItem(len(self.items), metadata)
+            self.items.append(item)
+            if item.errors:
+                continue
+            part = files.get(item.metadata.get('file') or '')
+            if part is None:
+                item.errors.append('Missing file part for entry')
+                continue
+            # Werkzeug has already spooled large parts to disk
+            item.content = part.stream
+            item.metadata.setdefault('mime_type', part.mimetype or 'application/octet-stream')
+            item.metadata.setdefault('file_name', part.filename or 'document')
+
+    def _check_size(self):
+        if len(self.items) >= self.max_items:
+            raise IngestFormatError(f'At most {self.max_items} records can be ingested at once')
+
+    def _spool_base64(self, item: IngestItem, file_content):
+        if not file_content:
+            item.errors.append('Missing required field: file_content')
+            return
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            spool.write(base64.b64decode(file_content, validate=True))
+        except (binascii.Error, ValueError, TypeError):
+            spool.close()
+            item.errors.append('file_content must be base64 encoded')
+            return
+        item.content = spool
+
+    def validate(self):
+        """Check every entry before anything is stored"""
+        seen_keys = set()
+        for item in self.items:
+            if item.errors:
+                continue
+            metadata = item.metadata
+            for field in ('patient_id', 'document_type', 'title'):
+                if not metadata.get(field):
+                    item.errors.append(f'Missing required field: {field}')
+            if metadata.get('document_type') and metadata['document_type'] not in VALID_DOCUMENT_TYPES:
+                item.errors.append(f'Invalid document type. Must be one of: {", ".join(VALID_DOCUMENT_TYPES)}')
+            if metadata.get('patient_id') and not ObjectId.is_valid(str(metadata['patient_id'])):
+                item.errors.append('Invalid patient_id')
+            key = item.idempotency_key
+            if key is not None:
+                if not isinstance(key, str) or not key or len(key) > 255:
+                    item.errors.append('idempotency_key must be a non-empty string of at most 255 characters')
+                elif key in seen_keys:
+                    item.errors.append('Duplicate idempotency_key in batch')
+                else:
+                    seen_keys.add(key)
+
+        # One query for every referenced patient
+        patient_ids = {str(item.metadata['patient_id']) for item in self.items if not item.errors}
+        existing = {
+            str(user['_id']) for user in db_manager.find_many('users', {
+                '_id': {'$in': [ObjectId(patient_id) for patient_id in patient_ids]},
+                'role': UserRole.PATIENT.value,
+                'is_active': True
+            }, projection={'_id': 1})
+        } if patient_ids else set()
+
+        for item in self.items:
+            if not item.errors and str(item.metadata['patient_id']) not in existing:
+                item.errors.append('Patient not found')
+            if item.errors:
+                item.status = STATUS_INVALID
+
+    def _mark_duplicates(self, items: list) -> list:
+        """Resolve entries already ingested under their idempotency key; returns the rest"""
+        keyed = {self._ingest_key(item): item for item in items if item.idempotency_key}
+        if not keyed:
+            return items
+        for document in db_manager.find_many(
+                'medical_documents',
+                {'ingest_key': {'$in': list(keyed)}},
+                projection={'ingest_key': 1}):
+            item = keyed[document['ingest_key']]
+            item.status = STATUS_DUPLICATE
+            item.document_id = str(document['_id'])
+        return [item for item in items if item.status is None]
+
+    def store(self) -> list:
+        """Store content and metadata for valid entries; returns the inserted documents"""
+        pending = self._mark_duplicates([item for item in self.items if item.status is None])
+
+        documents = []
+        stored_items = []
+        for item in pending:
+            metadata = item.metadata
+            mime_type = metadata.get('mime_type', 'application/octet-stream')
+            try:
+                content_fields = DocumentStorage.store(
+                    _iter_file(item.content),
+                    mime_type,
+                    str(metadata['patient_id']),
+                    file_name=metadata.get('file_name', 'document')
+                )
+            except Exception as e:
+                logger.error(f"Bulk ingest item {item.index} failed to store content: {e}")
+                item.status = STATUS_ERROR
+                item.errors.append('Failed to store content')
+                continue
+
+            now = datetime.utcnow()
+            document = {
+                '_id': ObjectId(),
+                'patient_id': str(metadata['patient_id']),
+                'doctor_id': self.uploader_id,
+                'document_type': metadata['document_type'],
+                'title': metadata['title'],
+                'description': metadata.get('description', ''),
+                'file_name': metadata.get('file_name', 'document'),
+                'mime_type': mime_type,
+                'created_at': now,
+                'updated_at': now,
+                'is_deleted': False,
+                **content_fields
+            }
+            if item.idempotency_key:
+                document['ingest_key'] = self._ingest_key(item)
+            documents.append(document)
+            stored_items.append(item)
+
+        if not documents:
+            return []
+
+        failed = {}
+        try:
+            db_manager.db.medical_documents.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index']: error for error in e.details.get('writeErrors', [])}
+
+        inserted = []
+        lost_races = []
+        for position, (item, document) in enumerate(zip(stored_items, documents)):
+            error = failed.get(position)
+            if error is None:
+                item.status = STATUS_CREATED
+                item.document_id = str(document['_id'])
+                inserted.append(document)
+                continue
+            # Content of entries that were not inserted is orphaned
+            DocumentStorage.delete(document)
+            if error.get('code') == DUPLICATE_KEY_ERROR and item.idempotency_key:
+                lost_races.append(item)  # a concurrent retry inserted it first
+            else:
+                item.status = STATUS_ERROR
+                item.errors.append('Failed to save record')
+
+        for item in self._mark_duplicates(lost_races):
+            item.status = STATUS_ERROR
+            item.errors.append('Failed to save record')
+        return inserted
+
+    def manifest(self) -> list:
+        return [item.manifest() for item in self.items]
+
+    def close(self):
+        for item in self.items:
+            if item.content is not None:
+                item.content.close()
@@ -0,0 +1,263 @@
+from flask import current_app
+import json
+import logging
+import time
+import uuid
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# name -> handler function; handlers must be idempotent (delivery is at-least-once)
+JOB_HANDLERS = {}
+
+# name -> interval in seconds for jobs the worker schedules itself
+PERIODIC_JOBS = {}
+
+def job_handler(name: str, every: int = None):
+    """Register a function as the handler for a job name
+
+    With every=N the worker also enqueues the job once per N seconds.
+    """
+    def decorator(f):
+        JOB_HANDLERS[name] = f
+        if every:
+            PERIODIC_JOBS[name] = every
+        return f
+    return decorator
+
+# KEYS: data, ready, scheduled   ARGV: job_id, payload, run_at (0 = now)
+ENQUEUE_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return 0
+end
+if tonumber(ARGV[3]) > 0 then
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+else
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+# KEYS: ready, scheduled, inflight, data, attempts   ARGV: now, visibility deadline
+DEQUEUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, id in ipairs(due) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('LPUSH', KEYS[1], id)
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[3], id)
+    redis.call('RPUSH', KEYS[1], id)
+end
+while true do
+    local id = redis.call('RPOP', KEYS[1])
+    if not id then
+        return nil
+    end
+    local payload = redis.call('HGET', KEYS[4], id)
+    if payload then
+        redis.call('ZADD', KEYS[3], ARGV[2], id)
+        local attempts = redis.call('HINCRBY', KEYS[5], id, 1)
+        return {id, payload, attempts}
+    end
+end
+"""
+
+class JobQueue:
+    """Reliable Redis job queue
+
+    Jobs live in a hash keyed by job id. Ids move between a ready list, a
+    scheduled sorted set (delayed jobs and retries) and an in-flight sorted
+    set scored by visibility deadline; a job that is not acknowledged before
+    its deadline is delivered again. Enqueue and dequeue are single Lua
+    scripts, so each is one round trip and atomic.
+    """
+
+    def __init__(self, redis_client, name: str = 'default', visibility_timeout: int = 60,
+                 max_attempts: int = 5, retry_backoff: float = 5):
+        self.redis = redis_client
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        prefix = f'jobs:{name}'
+        self.ready_key = f'{prefix}:ready'
+        self.scheduled_key = f'{prefix}:scheduled'
+        self.inflight_key = f'{prefix}:inflight'
+        self.data_key = f'{prefix}:data'
+        self.attempts_key = f'{prefix}:attempts'
+        self.dead_key = f'{prefix}:dead'
+        self.stats_key = f'{prefix}:stats'
+        self.periodic_prefix = f'{prefix}:periodic'
+        self._enqueue = redis_client.register_script(ENQUEUE_SCRIPT)
+        self._dequeue = redis_client.register_script(DEQUEUE_SCRIPT)
+
+    def enqueue(self, name: str, *args, job_id: str = None, delay: float = 0, run_at: float = None,
+                **kwargs) -> str:
+        """Queue a job; returns its id, or None if a job with job_id is already pending"""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        if run_at is None and delay:
+            run_at = now + delay
+        payload = json.dumps({
+            'id': job_id,
+            'name': name,
+            'args': args,
+            'kwargs': kwargs,
+            'enqueued_at': now,
+            'run_at': run_at or now
+        }, default=str)
+
+        created = self._enqueue(
+            keys=[self.data_key, self.ready_key, self.scheduled_key],
+            args=[job_id, payload, run_at or 0]
+        )
+        metrics.incr('jobs.enqueued' if created else 'jobs.duplicates')
+        return job_id if created else None
+
+    def claim_periodic_slot(self, name: str, slot: int, interval: int) -> bool:
+        """Mark a periodic job's time slot as scheduled; False if it already was
+
+        The marker is separate from the job data, so it survives the job's
+        ack and the slot is not enqueued again once its job has run.
+        """
+        return bool(self.redis.set(f'{self.periodic_prefix}:{name}:{slot}', 1, nx=True, ex=interval))
+
+    def dequeue(self):
+        """Lease the next due job; returns (job, attempts) or None"""
+        now = time.time()
+        result = self._dequeue(
+            keys=[self.ready_key, self.scheduled_key, self.inflight_key,
+                  self.data_key, self.attempts_key],
+            args=[now, now + self.visibility_timeout]
+        )
+        if not result:
+            return None
+        _, payload, attempts = result
+        return json.loads(payload), int(attempts)
+
+    def ack(self, job: dict):
+        """Remove a completed job"""
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.inflight_key, job['id'])
+        pipe.hdel(self.data_key, job['id'])
+        pipe.hdel(self.attempts_key, job['id'])
+        pipe.execute()
+
+    def fail(self, job: dict, attempts: int) -> bool:
+        """Retry a failed job with exponential backoff; returns False once it is dead"""
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.inflight_key, job['id'])
+        if attempts >= self.max_attempts:
+            pipe.lpush(self.dead_key, job['id'])
+            pipe.execute()
+            return False
+        delay = self.retry_backoff * (2 ** (attempts - 1))
+        pipe.zadd(self.scheduled_key, {job['id']: time.time() + delay})
+        pipe.execute()
+        return True
+
+    def record_timing(self, wait_seconds: float, run_seconds: float, succeeded: bool):
+        """Aggregate job latency in Redis so every process can report it"""
+        pipe = self.redis.pipeline()
+        pipe.hincrby(self.stats_key, 'processed', 1)
+        pipe.hincrby(self.stats_key, 'succeeded' if succeeded else 'failed', 1)
+        pipe.hincrbyfloat(self.stats_key, 'wait_seconds_sum', wait_seconds)
+        pipe.hincrbyfloat(self.stats_key, 'run_seconds_sum', run_seconds)
+        pipe.execute()
+        metrics.observe('jobs.wait_seconds', wait_seconds)
+        metrics.observe('jobs.run_seconds', run_seconds)
+
+    def stats(self) -> dict:
+        """Return queue depths and aggregate job latency"""
+        pipe = self.redis.pipeline()
+        pipe.llen(self.ready_key)
+        pipe.zcard(self.scheduled_key)
+        pipe.zcard(self.inflight_key)
+        pipe.llen(self.dead_key)
+        pipe.hgetall(self.stats_key)
+        ready, scheduled, inflight, dead, raw_stats = pipe.execute()
+
+        totals = {k.decode() if isinstance(k, bytes) else k: float(v) for k, v in raw_stats.items()}
+        processed = totals.get('processed', 0)
+        return {
+            'depth': {'ready': ready, 'scheduled': scheduled, 'inflight': inflight, 'dead': dead},
+            'processed': int(processed),
+            'succeeded': int(totals.get('succeeded', 0)),
+            'failed': int(totals.get('failed', 0)),
+            'avg_wait_seconds': totals.get('wait_seconds_sum', 0) / processed if processed else 0.0,
+            'avg_run_seconds': totals.get('run_seconds_sum', 0) / processed if processed else 0.0
+        }
+
+def get_queue(name: str = 'default') -> JobQueue:
+    """Return a JobQueue bound to the current app's Redis client"""
+    config = current_app.config
+    return JobQueue(
+        current_app.redis_client,
+        name=name,
+        visibility_timeout=config['JOB_VISIBILITY_TIMEOUT'],
+        max_attempts=config['JOB_MAX_ATTEMPTS'],
+        retry_backoff=config['JOB_RETRY_BACKOFF']
+    )
+
+def enqueue(name: str, *args, **kwargs) -> str:
+    """Queue a job on the default queue of the current app"""
+    return get_queue().enqueue(name, *args, **kwargs)
+
+class Worker:
+    """Runs queued jobs inside an application context"""
+
+    def __init__(self, app, queue: JobQueue):
+        self.app = app
+        self.queue = queue
+        self.running = False
+
+    def schedule_periodic(self):
+        """Enqueue each periodic job once per slot of its interval, across all workers"""
+        now = time.time()
+        for name, interval in PERIODIC_JOBS.items():
+            slot = int(now // interval)
+            if self.queue.claim_periodic_slot(name, slot, interval):
+                self.queue.enqueue(name, job_id=f'periodic:{name}:{slot}')
+
+    def run_once(self) -> bool:
+        """Run a single job; returns False when nothing was due"""
+        leased = self.queue.dequeue()
+        if leased is None:
+            return False
+        job, attempts = leased
+
+        started = time.time()
+        wait_seconds = max(0.0, started - job.get('run_at', job['enqueued_at']))
+        handler = JOB_HANDLERS.get(job['name'])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job['name']}")
+            with self.app.app_context():
+                handler(*job['args'], **job['kwargs'])
+        except Exception as e:
+            retrying = self.queue.fail(job, attempts)
+            metrics.incr('jobs.retried' if retrying else 'jobs.dead')
+            self.queue.record_timing(wait_seconds, time.time() - started, succeeded=False)
+            logger.error(f"Job {job['name']} ({job['id']}) attempt {attempts} failed: {e}")
+            return True
+
+        self.queue.ack(job)
+        metrics.incr('jobs.succeeded')
+        self.queue.record_timing(wait_seconds, time.time() - started, succeeded=True)
+        return True
+
+    def run(self, poll_interval: float = 0.5):
+        """Process jobs until stopped"""
+        self.running = True
+        last_schedule = 0
+        while self.running:
+            if time.time() - last_schedule >= 1:
+                self.schedule_periodic()
+                last_schedule = time.time()
+            if not self.run_once():
+                time.sleep(poll_interval)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,45 @@
+import threading
+
+class MetricsRegistry:
+    """Process-local counters and timings exposed through the admin API"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+
+    def incr(self, name: str, value: int = 1):
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Record a timing/size sample (count, sum, max)"""
+        with self._lock:
+            stats = self._timings.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['sum'] += value
+            stats['max'] = max(stats['max'], value)
+
+    def get(self, name: str) -> int:
+        """Return the current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """Return a copy of all counters and timing summaries"""
+        with self._lock:
+            timings = {
+                name: dict(stats, avg=stats['sum'] / stats['count'] if stats['count'] else 0.0)
+                for name, stats in self._timings.items()
+            }
+            return {'counters': dict(self._counters), 'timings': timings}
+
+    def reset(self):
+        """Clear all metrics"""
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+# Global metrics registry instance
+metrics = MetricsRegistry()
@@ -0,0 +1,21 @@
+import base64
+import json
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(position: dict) -> str:
+    """Encode a keyset position as an opaque URL-safe cursor"""
+    raw = json.dumps(position, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, *fields) -> dict:
+    """Decode a cursor made by encode_cursor, checking the expected fields are present"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursorError('Invalid pagination cursor')
+    if not isinstance(position, dict) or any(field not in position for field in fields):
+        raise InvalidCursorError('Invalid pagination cursor')
+    return position
@@ -0,0 +1,72 @@
+import re
+
+# Spelling variants common in romanized Indian names, applied in order to
+# a casefolded, accent-folded token: Lakshmi/Laxmi, Shrinivas/Srinivas,
+# Vijay/Wijay, Pooja/Puja, Bhaskar/Baskar, Farhan/Pharhan, Zaheer/Jaheer
+PHONETIC_RULES = (
+    (re.compile(r'ksh|x'), 'ks'),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'([bcdgjkpst])h'), r'\1'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'z'), 'j'),
+    (re.compile(r'q'), 'k'),
+    (re.compile(r'ck|c'), 'k'),
+)
+VOWELS = re.compile(r'[aeiouyh]')
+REPEATS = re.compile(r'(.)\1+')
+
+def phonetic_key(token: str) -> str:
+    """Sound-alike key of a romanized name token
+
+    After the spelling rules, doubled letters are collapsed and every
+    vowel and h after the first letter is dropped, so Mohammed, Mohamad
+    and Muhammad all become 'mmd'. Tokens in other scripts are returned
+    as they are.
+    """
+    if not token.isascii() or not token.isalpha():
+        return token
+    key = token
+    for pattern, replacement in PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    key = REPEATS.sub(r'\1', key)
+    return key[0] + VOWELS.sub('', key[1:])
+
+def trigrams(token: str) -> list:
+    """Padded trigrams of a token, in order: 'raj' -> ['  r', ' ra', 'raj', 'aj ']"""
+    padded = f'  {token} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+def trigram_groups(token: str, groups: int = 4, min_size: int = 2) -> list:
+    """Split a token's trigrams into groups for candidate lookup
+
+    One edit changes at most three consecutive trigrams, so any name within
+    one edit of the token still contains every trigram of at least one
+    group. Long tokens use four interleaved groups. Shorter ones get, for
+    each run of three trigrams an edit could change, the trigrams outside
+    it. Groups smaller than min_size match too many names to be worth a
+    lookup, so tokens of three or fewer characters get none.
+    """
+    grams = trigrams(token)
+    if len(grams) >= groups * min_size:
+        candidates = [grams[start::groups] for start in range(groups)]
+    else:
+        candidates = [grams[:start] + grams[start + 3:] for start in range(len(grams) - 2)]
+    selective = [sorted(set(group)) for group in candidates if len(set(group)) >= min_size]
+    return [group for index, group in enumerate(selective) if group not in selective[:index]]
+
+def edit_distance(a: str, b: str, limit: int = None) -> int:
+    """Levenshtein distance, giving up with limit + 1 once it must exceed limit"""
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
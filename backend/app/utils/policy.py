@@ -0,0 +1,208 @@
+from datetime import datetime
+from app.models.database import db_manager
+from app.models.schemas import UserRole, GrantScope
+from app.utils.access_cache import AccessCache
+from app.utils.care_team import CareRelationships
+from app.utils.grant_scopes import (
+    GRANT_SCOPE_PROJECTION, is_scoped, scoped_grant_covers, granted_documents_filter
+)
+from app.utils.metrics import metrics
+
+# Actions on a medical record
+ACTION_READ = 'read'      # view, download or fetch derivatives
+ACTION_MANAGE = 'manage'  # share, list its grants or delete
+
+# The record field that makes a role its owner
+OWNER_FIELDS = {
+    UserRole.PATIENT.value: 'patient_id',
+    UserRole.DOCTOR.value: 'doctor_id',
+}
+
+# Actions an active access grant can allow beyond ownership
+GRANTABLE_ACTIONS = frozenset({ACTION_READ})
+
+# Filter that matches no record
+NOTHING = {'_id': {'$in': []}}
+
+class AccessPolicy:
+    """The one place record authorization rules are evaluated
+
+    The rules, in order:
+      1. admins may do anything;
+      2. the record's patient and the doctor who created it own it;
+      3. for reads, an active document or patient-scoped grant also allows.
+
+    Rules 1 and 2 run in memory and decide most requests before any I/O.
+    Rule 3 resolves every undecided record of a call with a single grants
+    query (or from the access cache), so check_many costs the same number
+    of queries for one record or a thousand. Patient-level checks go through
+    the care_relationships index, also one query per call.
+    """
+
+    @staticmethod
+    def check_many(user: dict, action: str, documents: list) -> dict:
+        """Decide an action on each document; returns {document_id: allowed}"""
+        metrics.incr('policy.decisions', len(documents))
+        if user['role'] == UserRole.ADMIN.value:
+            return {str(document['_id']): True for document in documents}
+
+        user_id = str(user['_id'])
+        owner_field = OWNER_FIELDS.get(user['role'])
+        decisions = {}
+        undecided = []
+        for document in documents:
+            document_id = str(document['_id'])
+            if owner_field and document.get(owner_field) == user_id:
+                decisions[document_id] = True
+            elif action in GRANTABLE_ACTIONS:
+                undecided.append(document)
+            else:
+                decisions[document_id] = False
+
+        if undecided:
+            granted = AccessPolicy._granted_document_ids(user_id, undecided)
+            for document in undecided:
+                document_id = str(document['_id'])
+                decisions[document_id] = document_id in granted
+        return decisions
+
+    @staticmethod
+    def check(user: dict, action: str, document: dict) -> bool:
+        """Decide an action on one document"""
+        return AccessPolicy.check_many(user, action, [document])[str(document['_id'])]
+
+    @staticmethod
+    def check_patients(user: dict, action: str, patient_ids: list) -> dict:
+        """Decide an action on each patient's records as a whole; returns {patient_id: allowed}
+
+        Admins and the patients themselves may do anything. Doctors who
+        have created records for a patient, and anyone holding a grant on
+        the patient's records, may read them, found with one
+        care_relationships query; only the patient shares them all.
+        """
+        metrics.incr('policy.decisions', len(patient_ids))
+        user_id = str(user['_id'])
+        if user['role'] == UserRole.ADMIN.value:
+            return {patient_id: True for patient_id in patient_ids}
+        is_self = {patient_id: user['role'] == UserRole.PATIENT.value and patient_id == user_id
+                   for patient_id in patient_ids}
+        if action != ACTION_READ:
+            return is_self
+        related = CareRelationships.related(user_id, [patient_id for patient_id in patient_ids
+                                                      if patient_id != user_id])
+        return {patient_id: is_self[patient_id] or patient_id in related for patient_id in patient_ids}
+
+    @staticmethod
+    def check_patient(user: dict, action: str, patient_id: str) -> bool:
+        """Decide an action on one patient's records"""
+        return AccessPolicy.check_patients(user, action, [patient_id])[patient_id]
+
+    @staticmethod
+    def readable_filter(user: dict, patient_id: str = None) -> dict:
+        """Build a medical_documents filter matching exactly what the user may read
+
+        The query form of check_many(user, ACTION_READ, ...), so
+        authorization can run inside a listing query. With patient_id the
+        care relationship decides first whether the grants need fetching.
+        """
+        user_id = str(user['_id'])
+        if user['role'] == UserRole.ADMIN.value:
+            return {}
+        owner_field = OWNER_FIELDS.get(user['role'])
+        owned = {owner_field: user_id} if owner_field else NOTHING
+
+        if patient_id is not None and patient_id != user_id:
+            relationship = CareRelationships.get(user_id, patient_id)
+            if relationship is None:
+                return NOTHING
+            if relationship.get('grants', 0) <= 0:
+                return owned
+        elif patient_id == user_id:
+            patient_id = None
+        return AccessPolicy._granted_filter(user_id, owned, patient_id)
+
+    @staticmethod
+    def patient_records_filter(user: dict, patient_id: str):
+        """Build the filter for listing one patient's records, or None when the user may read none
+
+        The patient, admins and doctors treating the patient list every
+        record, as check_patient allows; other care team members list only
+        what their grants cover. One care_relationships lookup, plus the
+        grants query for grantees.
+        """
+        user_id = str(user['_id'])
+        if user['role'] == UserRole.ADMIN.value or \
+                (user['role'] == UserRole.PATIENT.value and patient_id == user_id):
+            return {}
+        relationship = CareRelationships.get(user_id, patient_id) if patient_id != user_id else None
+        if relationship is None:
+            return None
+        if user['role'] == UserRole.DOCTOR.value and relationship.get('authored', 0) > 0:
+            return {}
+        owner_field = OWNER_FIELDS.get(user['role'])
+        return AccessPolicy._granted_filter(user_id, {owner_field: user_id} if owner_field else NOTHING,
+                                            patient_id)
+
+    @staticmethod
+    def _granted_filter(user_id: str, owned: dict, patient_id: str = None) -> dict:
+        """owned, widened by the records the user's active grants cover (on patient_id's records only, if given)"""
+        grants_filter = {
+            'grantee_id': user_id,
+            'is_active': True,
+            'expires_at': {'$gt': datetime.utcnow()}
+        }
+        if patient_id is not None:
+            # Document and patient-scoped grants both carry patient_id
+            grants_filter['patient_id'] = patient_id
+
+        granted = granted_documents_filter(
+            db_manager.find_many('access_grants', grants_filter, projection=GRANT_SCOPE_PROJECTION)
+        )
+        if not granted:
+            return owned
+        return {'$or': [owned] + granted}
+
+    @staticmethod
+    def _granted_document_ids(user_id: str, documents: list) -> set:
+        """Return the ids of the documents the user holds an active grant for
+
+        Cached decisions are answered from the access cache. The rest are
+        resolved with one query that fetches both the per-document grants and
+        the patient-scoped grants of the documents' patients, however many
+        documents there are, and the decisions are cached.
+        """
+        by_id = {str(document['_id']): document for document in documents}
+        cached, version = AccessCache.lookup(user_id, list(by_id))
+        missing = [document_id for document_id in by_id if document_id not in cached]
+        granted = {document_id for document_id, allowed in cached.items() if allowed}
+        if not missing:
+            return granted
+
+        metrics.incr('access.grant_queries')
+        grants = db_manager.find_many('access_grants', {
+            'grantee_id': user_id,
+            'is_active': True,
+            'expires_at': {'$gt': datetime.utcnow()},
+            '$or': [
+                {'document_id': {'$in': missing}},
+                {'scope': GrantScope.PATIENT.value,
+                 'patient_id': {'$in': list({by_id[document_id]['patient_id'] for document_id in missing})}}
+            ]
+        }, projection=GRANT_SCOPE_PROJECTION)
+
+        # A decision stays cached until the longest-lived covering grant expires
+        expiry = {}
+        for grant in grants:
+            if is_scoped(grant):
+                covered = [document_id for document_id in missing
+                           if scoped_grant_covers(grant, by_id[document_id])]
+            else:
+                covered = [grant['document_id']]
+            for document_id in covered:
+                if document_id not in expiry or grant['expires_at'] > expiry[document_id]:
+                    expiry[document_id] = grant['expires_at']
+        AccessCache.put_many(user_id, {
+            document_id: (document_id in expiry, expiry.get(document_id))
+            for document_id in missing
+        }, version)
+        return granted | set(expiry)
@@ -0,0 +1,177 @@
+import unicodedata
+from app.utils.phonetics import phonetic_key, trigrams, trigram_groups, edit_distance
+
+# Prefixes of each name, email and MRN token are stored so a search for the
+# first few characters is an equality lookup on the multikey index
+SEARCH_PREFIX_MIN = 2
+SEARCH_PREFIX_MAX = 12
+
+# Fields a user's search terms are derived from
+SEARCH_SOURCE_FIELDS = ('first_name', 'last_name', 'email', 'medical_record_number')
+SEARCH_SOURCE_PROJECTION = {field: 1 for field in SEARCH_SOURCE_FIELDS}
+
+# Ranking weights: an exact name token beats a name prefix beats anything else
+SCORE_EXACT_IDENTIFIER = 10
+SCORE_NAME_TOKEN = 3
+SCORE_NAME_PREFIX = 2
+SCORE_OTHER_PREFIX = 1
+
+# Fuzzy mode looks up at most this many query tokens
+FUZZY_MAX_TOKENS = 3
+
+def normalize(text) -> str:
+    """Casefold and strip accents from Latin text; other scripts are kept as written"""
+    folded = []
+    for char in unicodedata.normalize('NFKD', str(text or '')):
+        # Drop accents on Latin letters only; Indic vowel signs are letters too
+        if unicodedata.combining(char) and folded and folded[-1].isascii():
+            continue
+        folded.append(char)
+    return unicodedata.normalize('NFC', ''.join(folded)).casefold().strip()
+
+def tokenize(text) -> list:
+    """Split normalized text on whitespace, punctuation and symbols"""
+    tokens = []
+    current = []
+    for char in normalize(text):
+        if unicodedata.category(char)[0] in 'PZSC':
+            if current:
+                tokens.append(''.join(current))
+                current = []
+        else:
+            current.append(char)
+    if current:
+        tokens.append(''.join(current))
+    return tokens
+
+def compact(text) -> str:
+    """Normalized text with separators removed, e.g. 'MRN-00 12' -> 'mrn0012'"""
+    return ''.join(tokenize(text))
+
+def prefixes(token: str) -> list:
+    """The token's prefixes from SEARCH_PREFIX_MIN up to SEARCH_PREFIX_MAX, then the token itself"""
+    terms = [token[:length] for length in range(SEARCH_PREFIX_MIN, min(len(token), SEARCH_PREFIX_MAX) + 1)]
+    if token not in terms:
+        terms.append(token)
+    return terms
+
+def _field_tokens(user: dict) -> tuple:
+    """(name tokens, other tokens) a user is found by"""
+    names = tokenize(user.get('first_name')) + tokenize(user.get('last_name'))
+    # The email's local part only; every address shares a handful of domains
+    local_part = str(user.get('email') or '').split('@', 1)[0]
+    others = tokenize(local_part)
+    if user.get('medical_record_number'):
+        others += tokenize(user['medical_record_number']) + [compact(user['medical_record_number'])]
+    return names, others
+
+def _identifiers(user: dict) -> set:
+    """The user's whole email and MRN, as exact identifier queries are normalized"""
+    identifiers = {normalize(user[field]) for field in ('email', 'medical_record_number') if user.get(field)}
+    if user.get('medical_record_number'):
+        identifiers.add(compact(user['medical_record_number']))
+    return identifiers
+
+def user_search_terms(user: dict) -> list:
+    """Every index term of a user: token prefixes plus the exact email and MRN"""
+    names, others = _field_tokens(user)
+    terms = set()
+    for token in names + others:
+        terms.update(prefixes(token))
+    for field in ('email', 'medical_record_number'):
+        if user.get(field):
+            terms.add(normalize(user[field]))
+    return sorted(terms)
+
+def search_fields(user: dict) -> dict:
+    """Fields to store on a user document whenever its searchable fields change
+
+    search_terms serve prefix search; exact_terms hold only whole name
+    tokens and identifiers, for the exact lookup that runs before it.
+    phonetic_keys and name_trigrams are the fuzzy name signatures.
+    """
+    names, _ = _field_tokens(user)
+    return {
+        'search_terms': user_search_terms(user),
+        'exact_terms': sorted(set(names) | _identifiers(user)),
+        'phonetic_keys': sorted({phonetic_key(token) for token in names}),
+        'name_trigrams': sorted({gram for token in names for gram in trigrams(token)})
+    }
+
+def query_terms(query: str) -> tuple:
+    """Split a query into (tokens, index lookup terms, exact identifier terms)
+
+    Every lookup term must be present on a match ($all). Tokens shorter
+    than SEARCH_PREFIX_MIN are too unselective to look up and longer ones
+    are looked up by their longest stored prefix; both are then checked in
+    memory by match_score. The exact terms match a whole email or MRN.
+    """
+    tokens = tokenize(query)
+    lookup = sorted({token[:SEARCH_PREFIX_MAX] for token in tokens if len(token) >= SEARCH_PREFIX_MIN},
+                    key=len, reverse=True)
+    exact = sorted({term for term in (normalize(query), compact(query)) if term})
+    return tokens, lookup, exact
+
+def whole_name_terms(tokens: list) -> list:
+    """Query tokens looked up as whole names in exact_terms before any prefix lookup"""
+    return sorted({token for token in tokens if len(token) >= SEARCH_PREFIX_MIN})
+
+def match_score(user: dict, tokens: list, exact: list) -> int:
+    """Score how well a candidate matches the query; 0 when it does not match"""
+    for field in ('email', 'medical_record_number'):
+        if user.get(field) and (normalize(user[field]) in exact or compact(user[field]) in exact):
+            return SCORE_EXACT_IDENTIFIER
+    names, others = _field_tokens(user)
+    score = 0
+    for token in tokens:
+        if token in names:
+            score += SCORE_NAME_TOKEN
+        elif any(name.startswith(token) for name in names):
+            score += SCORE_NAME_PREFIX
+        elif any(other.startswith(token) for other in others):
+            score += SCORE_OTHER_PREFIX
+        else:
+            return 0
+    return score
+
+def fuzzy_query(query: str) -> tuple:
+    """Split a fuzzy query into (tokens, candidate $or clauses)
+
+    A candidate shares a phonetic key with some token, or holds every
+    trigram of one of a token's trigram groups, which any name within one
+    edit of the token does. Tokens of three or fewer characters have no
+    selective trigram groups and are found by phonetic key only. Tokens
+    shorter than SEARCH_PREFIX_MIN are ignored.
+    """
+    tokens = [token for token in tokenize(query) if len(token) >= SEARCH_PREFIX_MIN][:FUZZY_MAX_TOKENS]
+    if not tokens:
+        return tokens, []
+    clauses = [{'phonetic_keys': {'$in': sorted({phonetic_key(token) for token in tokens})}}]
+    for token in tokens:
+        clauses.extend({'name_trigrams': {'$all': group}} for group in trigram_groups(token))
+    return tokens, clauses
+
+def fuzzy_distance(user: dict, tokens: list):
+    """Total edit distance from the query tokens to the user's closest name tokens
+
+    Each token may be up to a third of its length away (at least one
+    edit), or any distance if it sounds the same. Returns None when some
+    token has no acceptable match.
+    """
+    names, _ = _field_tokens(user)
+    if not names:
+        return None
+    total = 0
+    for token in tokens:
+        allowed = max(1, len(token) // 3)
+        key = phonetic_key(token)
+        best = None
+        for name in names:
+            sounds_alike = phonetic_key(name) == key
+            distance = edit_distance(token, name, None if sounds_alike else allowed)
+            if (sounds_alike or distance <= allowed) and (best is None or distance < best):
+                best = distance
+        if best is None:
+            return None
+        total += best
+    return total
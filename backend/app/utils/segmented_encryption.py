@@ -0,0 +1,154 @@
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+import os
+import struct
+
+# Segmented AEAD format (version 1)
+#
+#   header  = MAGIC(4) | VERSION(1) | segment_size(4, big endian) | nonce_prefix(7)
+#   segment = AES-256-GCM(plaintext[segment_size]) | tag(16)
+#
+# Segment i is sealed with nonce = nonce_prefix | i (4 bytes) | last flag (1 byte)
+# and the header as associated data, so segments cannot be reordered, dropped,
+# truncated or moved between documents. Every segment but the last carries
+# exactly segment_size bytes of plaintext, which makes byte ranges seekable.
+MAGIC = b'BMSE'
+VERSION = 1
+NONCE_PREFIX_LENGTH = 7
+HEADER_LENGTH = len(MAGIC) + 1 + 4 + NONCE_PREFIX_LENGTH
+TAG_LENGTH = 16
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+MAX_SEGMENTS = 2 ** 32
+
+class SegmentedFormatError(ValueError):
+    """Raised when ciphertext is malformed or fails authentication"""
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index >= MAX_SEGMENTS:
+        raise SegmentedFormatError('Too many segments for one stream')
+    return prefix + struct.pack('>I', index) + (b'\x01' if last else b'\x00')
+
+def parse_header(header: bytes) -> tuple:
+    """Return (segment_size, nonce_prefix) from a stream header"""
+    if len(header) != HEADER_LENGTH or header[:4] != MAGIC:
+        raise SegmentedFormatError('Not a segmented ciphertext stream')
+    if header[4] != VERSION:
+        raise SegmentedFormatError(f'Unsupported segmented format version: {header[4]}')
+    segment_size = struct.unpack('>I', header[5:9])[0]
+    return segment_size, header[9:]
+
+def ciphertext_length(plaintext_length: int, segment_size: int = DEFAULT_SEGMENT_SIZE) -> int:
+    """Size of the encrypted stream for a plaintext of the given length"""
+    segments = max(1, -(-plaintext_length // segment_size))
+    return HEADER_LENGTH + plaintext_length + segments * TAG_LENGTH
+
+def plaintext_length(total_length: int, segment_size: int) -> int:
+    """Size of the plaintext held in an encrypted stream of total_length bytes"""
+    body = total_length - HEADER_LENGTH
+    segments = max(1, -(-body // (segment_size + TAG_LENGTH)))
+    return body - segments * TAG_LENGTH
+
+class SegmentedEncryptor:
+    """Incremental encryptor holding at most one segment of plaintext in memory"""
+
+    def __init__(self, aead: AESGCM, segment_size: int = DEFAULT_SEGMENT_SIZE):
+        self.aead = aead
+        self.segment_size = segment_size
+        self.nonce_prefix = os.urandom(NONCE_PREFIX_LENGTH)
+        self.header = (MAGIC + bytes([VERSION]) + struct.pack('>I', segment_size) +
+                       self.nonce_prefix)
+        self._buffer = bytearray()
+        self._index = 0
+        self._header_sent = False
+        self._finalized = False
+
+    def _seal(self, plaintext: bytes, last: bool) -> bytes:
+        sealed = self.aead.encrypt(_nonce(self.nonce_prefix, self._index, last),
+                                   plaintext, self.header)
+        self._index += 1
+        return sealed
+
+    def update(self, data: bytes) -> bytes:
+        """Feed plaintext, returning any ciphertext that is ready"""
+        if self._finalized:
+            raise SegmentedFormatError('Encryptor already finalized')
+        self._buffer += data
+        out = bytearray()
+        if not self._header_sent:
+            out += self.header
+            self._header_sent = True
+        # Keep the trailing segment buffered: only finalize() knows it is the last
+        full_segments = (len(self._buffer) - 1) // self.segment_size
+        if full_segments > 0:
+            view = memoryview(self._buffer)
+            for i in range(full_segments):
+                start = i * self.segment_size
+                out += self._seal(bytes(view[start:start + self.segment_size]), last=False)
+            view.release()
+            del self._buffer[:full_segments * self.segment_size]
+        return bytes(out)
+
+    def finalize(self) -> bytes:
+        """Seal the final segment"""
+        if self._finalized:
+            raise SegmentedFormatError('Encryptor already finalized')
+        out = b'' if self._header_sent else self.header
+        self._header_sent = True
+        out += self._seal(bytes(self._buffer), last=True)
+        self._buffer = bytearray()
+        self._finalized = True
+        return out
+
+def encrypt_stream(aead: AESGCM, chunks, segment_size: int = DEFAULT_SEGMENT_SIZE):
+    """Yield ciphertext for an iterable of plaintext chunks"""
+    encryptor = SegmentedEncryptor(aead, segment_size)
+    for chunk in chunks:
+        out = encryptor.update(chunk)
+        if out:
+            yield out
+    yield encryptor.finalize()
+
+def decrypt_stream(aead: AESGCM, reader):
+    """Yield plaintext segments from a file-like object positioned at the header"""
+    header = reader.read(HEADER_LENGTH)
+    segment_size, prefix = parse_header(header)
+    sealed_size = segment_size + TAG_LENGTH
+
+    index = 0
+    current = reader.read(sealed_size)
+    while True:
+        following = reader.read(sealed_size)
+        last = not following
+        try:
+            yield aead.decrypt(_nonce(prefix, index, last), current, header)
+        except InvalidTag:
+            raise SegmentedFormatError(f'Segment {index} failed authentication')
+        if last:
+            return
+        current = following
+        index += 1
+
+def decrypt_range(aead: AESGCM, reader, total_length: int, start: int, end: int):
+    """Yield plaintext bytes start..end (inclusive) by seeking to the covering segments
+
+    reader must support seek(); total_length is the full ciphertext size.
+    """
+    reader.seek(0)
+    header = reader.read(HEADER_LENGTH)
+    segment_size, prefix = parse_header(header)
+    sealed_size = segment_size + TAG_LENGTH
+    size = plaintext_length(total_length, segment_size)
+    if size == 0 or start > end:
+        return
+    end = min(end, size - 1)
+    last_index = max(0, -(-size // segment_size) - 1)
+
+    for index in range(start // segment_size, end // segment_size + 1):
+        reader.seek(HEADER_LENGTH + index * sealed_size)
+        sealed = reader.read(sealed_size)
+        try:
+            segment = aead.decrypt(_nonce(prefix, index, index == last_index), sealed, header)
+        except InvalidTag:
+            raise SegmentedFormatError(f'Segment {index} failed authentication')
+        offset = index * segment_size
+        yield segment[max(0, start - offset):end - offset + 1]
@@ -0,0 +1,199 @@
+from flask import current_app
+from gridfs.errors import NoFile
+import base64
+import hashlib
+import logging
+from app.models.database import db_manager
+from app.utils.compression import CompressionManager, CODEC_IDENTITY
+from app.utils.encryption import EncryptionManager, KeyManager, UNMANAGED_KEY_ID
+from app.utils.segmented_encryption import (
+    encrypt_stream, decrypt_stream, decrypt_range, DEFAULT_SEGMENT_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# content_format values on medical_documents
+FORMAT_SEGMENTED = 'segmented-v1'  # raw AES-GCM segments in GridFS
+FORMAT_FERNET = 'fernet'           # legacy: base64(Fernet token) inline
+FORMAT_INLINE = 'inline'           # base64 content stored as received
+
+class ContentUnavailableError(Exception):
+    """Raised when record content cannot be decrypted (missing or revoked key)"""
+
+class DocumentStorage:
+    """Reads and writes medical document content
+
+    New content is compressed per MIME type, encrypted as a stream of
+    AES-GCM segments with a per-document data key and written as raw bytes
+    to GridFS, so neither side needs the whole file in memory. Legacy
+    inline formats are still decoded.
+    """
+
+    @staticmethod
+    def content_format(document: dict) -> str:
+        """Return the storage format of a document"""
+        if document.get('content_format'):
+            return document['content_format']
+        if document.get('encryption_key_id', UNMANAGED_KEY_ID) != UNMANAGED_KEY_ID:
+            return FORMAT_FERNET
+        return FORMAT_INLINE
+
+    @staticmethod
+    def store(chunks, mime_type: str, owner_id: str, file_name: str = 'document',
+              size_hint: int = None, key_id: str = None) -> dict:
+        """Compress, encrypt and store plaintext chunks
+
+        A fresh data key is created unless key_id names an existing one.
+        Returns the content fields to save on the medical document.
+        """
+        codec, level = CompressionManager.select_codec(mime_type, size_hint)
+        compressor = CompressionManager.compressobj(codec, level)
+        if key_id:
+            data_key = KeyManager.get_data_key(key_id)
+            if data_key is None:
+                raise ContentUnavailableError('Encryption key for this record is unavailable')
+        else:
+            key_id, data_key = KeyManager.create_data_key(owner_id)
+        segment_size = current_app.config.get('CONTENT_SEGMENT_SIZE', DEFAULT_SEGMENT_SIZE)
+
+        checksum = hashlib.sha256()
+        size = 0
+
+        def plaintext():
+            nonlocal size
+            for chunk in chunks:
+                checksum.update(chunk)
+                size += len(chunk)
+                yield compressor.compress(chunk) if compressor else chunk
+            if compressor:
+                yield compressor.flush()
+
+        upload = db_manager.fs.open_upload_stream(
+            file_name,
+            metadata={'owner_id': owner_id, 'encryption_key_id': key_id}
+        )
+        try:
+            for block in encrypt_stream(data_key.aead, plaintext(), segment_size):
+                upload.write(block)
+            upload.close()
+        except Exception:
+            upload.abort()
+            raise
+
+        return {
+            'content_id': upload._id,
+            'content_format': FORMAT_SEGMENTED,
+            'encryption_key_id': key_id,
+            'compression': codec,
+            'file_size': size,
+            'stored_size': upload.length,
+            'checksum': checksum.hexdigest()
+        }
+
+    @staticmethod
+    def _data_key(document: dict):
+        data_key = KeyManager.get_data_key(document['encryption_key_id'])
+        if data_key is None:
+            raise ContentUnavailableError('Encryption key for this record is unavailable')
+        return data_key
+
+    @staticmethod
+    def _read_inline(document: dict) -> bytes:
+        """Decode the legacy inline formats into plaintext bytes"""
+        codec = document.get('compression', CODEC_IDENTITY)
+        if DocumentStorage.content_format(document) == FORMAT_FERNET:
+            cipher = DocumentStorage._data_key(document).fernet
+            if cipher is None:
+                raise ContentUnavailableError('Encryption key for this record is unavailable')
+            return EncryptionManager.decrypt_content(document['encrypted_content'], cipher, codec)
+        return CompressionManager.decompress(base64.b64decode(document['encrypted_content']), codec)
+
+    @staticmethod
+    def iter_content(document: dict):
+        """Yield the plaintext content of a document in chunks"""
+        if DocumentStorage.content_format(document) != FORMAT_SEGMENTED:
+            yield DocumentStorage._read_inline(document)
+            return
+
+        data_key = DocumentStorage._data_key(document)
+        decompressor = CompressionManager.decompressobj(document.get('compression'))
+        with db_manager.fs.open_download_stream(document['content_id']) as stream:
+            for segment in decrypt_stream(data_key.aead, stream):
+                chunk = decompressor.decompress(segment) if decompressor else segment
+                if chunk:
+                    yield chunk
+
+    @staticmethod
+    def open_content(document: dict):
+        """Return an iterator over a document's plaintext, already started
+
+        The key lookup, header parse and first segment's authentication run
+        here, so a missing key or corrupt content raises before the caller
+        has sent any response headers.
+        """
+        return DocumentStorage._started(document, DocumentStorage.iter_content(document))
+
+    @staticmethod
+    def open_range(document: dict, start: int, end: int):
+        """Return an iterator over plaintext bytes start..end (inclusive), already started"""
+        return DocumentStorage._started(document, DocumentStorage.iter_range(document, start, end))
+
+    @staticmethod
+    def _started(document: dict, chunks):
+        first = next(chunks, None)
+
+        def body():
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated body
+                logger.error(f"Content stream for document {document.get('_id')} failed mid-response: {e}")
+                raise
+
+        return body()
+
+    @staticmethod
+    def delete(content: dict):
+        """Remove GridFS content referenced by a document or derivative"""
+        if content.get('content_id') is not None:
+            try:
+                db_manager.fs.delete(content['content_id'])
+            except NoFile:
+                pass
+
+    @staticmethod
+    def read_all(document: dict) -> bytes:
+        """Return the full plaintext content of a document"""
+        return b''.join(DocumentStorage.iter_content(document))
+
+    @staticmethod
+    def content_length(document: dict) -> int:
+        """Return the plaintext size of a document"""
+        if DocumentStorage.content_format(document) == FORMAT_SEGMENTED:
+            return document['file_size']
+        return len(DocumentStorage._read_inline(document))
+
+    @staticmethod
+    def iter_range(document: dict, start: int, end: int):
+        """Yield plaintext bytes start..end (inclusive)
+
+        Uncompressed segmented content is decrypted by seeking straight to
+        the covering segments; other formats are decoded and skipped through.
+        """
+        if (DocumentStorage.content_format(document) == FORMAT_SEGMENTED and
+                document.get('compression', CODEC_IDENTITY) == CODEC_IDENTITY):
+            data_key = DocumentStorage._data_key(document)
+            with db_manager.fs.open_download_stream(document['content_id']) as stream:
+                yield from decrypt_range(data_key.aead, stream, stream.length, start, end)
+            return
+
+        offset = 0
+        for chunk in DocumentStorage.iter_content(document):
+            chunk_end = offset + len(chunk)
+            if chunk_end > start:
+                yield chunk[max(0, start - offset):end - offset + 1]
+            offset = chunk_end
+            if offset > end:
+                return
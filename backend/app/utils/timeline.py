@@ -0,0 +1,219 @@
+from datetime import datetime
+from flask import current_app
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+import logging
+from app.models.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATEST_SIZE = 20
+
+def _month(created_at: datetime) -> str:
+    return created_at.strftime('%Y-%m')
+
+def _latest_entry(document: dict) -> dict:
+    """The fields of a record kept in the summary's latest list"""
+    return {
+        'id': str(document['_id']),
+        'document_type': document['document_type'],
+        'title': document.get('title', ''),
+        'doctor_id': document['doctor_id'],
+        'created_at': document['created_at']
+    }
+
+class TimelineManager:
+    """Per-patient timeline summaries in the patient_timelines collection
+
+    Each patient has one small document with record counts by type, by
+    month and by doctor plus the newest records. Uploads and deletes adjust
+    it with $inc/$push instead of recounting and bump its version; a missing
+    summary (patients with history from before summaries existed) is built
+    once on first read.
+    """
+
+    @staticmethod
+    def _latest_size() -> int:
+        return current_app.config.get('TIMELINE_LATEST_SIZE', DEFAULT_LATEST_SIZE)
+
+    @staticmethod
+    def _added_update(document: dict) -> dict:
+        return {
+            '$inc': {
+                'version': 1,
+                'total_records': 1,
+                f"by_type.{document['document_type']}": 1,
+                f"by_month.{_month(document['created_at'])}": 1,
+                f"doctors.{document['doctor_id']}": 1
+            },
+            '$push': {'latest': {
+                '$each': [_latest_entry(document)],
+                '$sort': {'created_at': -1},
+                '$slice': TimelineManager._latest_size()
+            }},
+            '$min': {'first_record_at': document['created_at']},
+            '$max': {'last_record_at': document['created_at']},
+            '$set': {'updated_at': datetime.utcnow()}
+        }
+
+    @staticmethod
+    def record_added(document: dict):
+        """Count a newly stored record in its patient's summary"""
+        try:
+            db_manager.db.patient_timelines.update_one(
+                {'patient_id': document['patient_id']},
+                TimelineManager._added_update(document)
+            )
+        except Exception as e:
+            logger.error(f"Failed to update timeline for patient {document['patient_id']}: {e}")
+
+    @staticmethod
+    def records_added(documents: list):
+        """Count several new records with one unordered bulk write"""
+        if not documents:
+            return
+        try:
+            db_manager.db.patient_timelines.bulk_write([
+                UpdateOne({'patient_id': document['patient_id']}, TimelineManager._added_update(document))
+                for document in documents
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to update timelines for {len(documents)} records: {e}")
+
+    @staticmethod
+    def record_removed(document: dict):
+        """Remove a deleted record from its patient's summary"""
+        patient_id = document['patient_id']
+        try:
+            summary = db_manager.db.patient_timelines.find_one_and_update(
+                {'patient_id': patient_id},
+                {
+                    '$inc': {
+                        'version': 1,
+                        'total_records': -1,
+                        f"by_type.{document['document_type']}": -1,
+                        f"by_month.{_month(document['created_at'])}": -1,
+                        f"doctors.{document['doctor_id']}": -1
+                    },
+                    '$pull': {'latest': {'id': str(document['_id'])}},
+                    '$set': {'updated_at': datetime.utcnow()}
+                },
+                projection={'latest': 1}
+            )
+            # Refill the latest list only when the deleted record was on it
+            if summary and any(entry['id'] == str(document['_id']) for entry in summary['latest']):
+                latest = db_manager.find_many(
+                    'medical_documents',
+                    {'patient_id': patient_id, 'is_deleted': False},
+                    limit=TimelineManager._latest_size(),
+                    sort=[('created_at', -1)],
+                    projection={'document_type': 1, 'title': 1, 'doctor_id': 1, 'created_at': 1}
+                )
+                db_manager.db.patient_timelines.update_one(
+                    {'patient_id': patient_id},
+                    {'$set': {'latest': [_latest_entry(doc) for doc in latest]}}
+                )
+        except Exception as e:
+            logger.error(f"Failed to update timeline for patient {patient_id}: {e}")
+
+    @staticmethod
+    def _recount(patient_id: str) -> dict:
+        """Count a patient's summary from medical_documents"""
+        match = {'$match': {'patient_id': patient_id, 'is_deleted': False}}
+        facets = db_manager.aggregate('medical_documents', [
+            match,
+            {'$facet': {
+                'by_type': [{'$group': {'_id': '$document_type', 'count': {'$sum': 1}}}],
+                'by_month': [{'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m', 'date': '$created_at'}},
+                    'count': {'$sum': 1}
+                }}],
+                'doctors': [{'$group': {'_id': '$doctor_id', 'count': {'$sum': 1}}}],
+                'range': [{'$group': {
+                    '_id': None,
+                    'total': {'$sum': 1},
+                    'first': {'$min': '$created_at'},
+                    'last': {'$max': '$created_at'}
+                }}],
+                'latest': [
+                    {'$sort': {'created_at': -1}},
+                    {'$limit': TimelineManager._latest_size()},
+                    {'$project': {'document_type': 1, 'title': 1, 'doctor_id': 1, 'created_at': 1}}
+                ]
+            }}
+        ])[0]
+
+        totals = facets['range'][0] if facets['range'] else {}
+        summary = {
+            'patient_id': patient_id,
+            'total_records': totals.get('total', 0),
+            'by_type': {row['_id']: row['count'] for row in facets['by_type']},
+            'by_month': {row['_id']: row['count'] for row in facets['by_month']},
+            'doctors': {row['_id']: row['count'] for row in facets['doctors']},
+            'latest': [_latest_entry(doc) for doc in facets['latest']],
+            'first_record_at': totals.get('first'),
+            'last_record_at': totals.get('last'),
+            'updated_at': datetime.utcnow()
+        }
+        return summary
+
+    @staticmethod
+    def rebuild(patient_id: str, attempts: int = 3) -> dict:
+        """Recompute a patient's summary from medical_documents
+
+        Uploads and deletes keep applying $inc while this runs. A pending
+        placeholder is stored first so those updates have a row to land on,
+        and the recount replaces the row only if its version is still the one
+        read before counting; otherwise it is counted again. If every attempt
+        races, the recount is returned unsaved and the next read retries.
+        """
+        timelines = db_manager.db.patient_timelines
+        try:
+            timelines.update_one({'patient_id': patient_id},
+                                 {'$setOnInsert': {'pending': True}}, upsert=True)
+        except DuplicateKeyError:
+            pass  # created concurrently
+        for _ in range(attempts):
+            version = (timelines.find_one({'patient_id': patient_id}, {'version': 1}) or {}).get('version')
+            summary = TimelineManager._recount(patient_id)
+            result = timelines.replace_one({'patient_id': patient_id, 'version': version},
+                                           {**summary, 'version': (version or 0) + 1})
+            if result.matched_count:
+                return summary
+        logger.warning(f"Timeline for patient {patient_id} kept changing during rebuild; not saved")
+        return summary
+
+    @staticmethod
+    def get(patient_id: str) -> dict:
+        """Return a patient's summary, building it on first use"""
+        summary = db_manager.find_one('patient_timelines', {'patient_id': patient_id})
+        if summary and not summary.get('pending'):
+            return summary
+        return TimelineManager.rebuild(patient_id)
+
+    @staticmethod
+    def format(summary: dict) -> dict:
+        """Format a summary for API responses, dropping counts that reached zero"""
+        return {
+            'patient_id': summary['patient_id'],
+            'total_records': summary.get('total_records', 0),
+            'by_type': {k: v for k, v in summary.get('by_type', {}).items() if v > 0},
+            'by_month': [
+                {'month': month, 'count': count}
+                for month, count in sorted(summary.get('by_month', {}).items()) if count > 0
+            ],
+            'doctors': [
+                {'doctor_id': doctor_id, 'record_count': count}
+                for doctor_id, count in sorted(summary.get('doctors', {}).items(),
+                                               key=lambda item: -item[1])
+                # Records a patient uploaded themselves carry their own id as doctor_id
+                if count > 0 and doctor_id != summary['patient_id']
+            ],
+            'latest': [
+                {**entry, 'created_at': entry['created_at'].isoformat()}
+                for entry in summary.get('latest', [])
+            ],
+            'first_record_at': summary['first_record_at'].isoformat() if summary.get('first_record_at') else None,
+            'last_record_at': summary['last_record_at'].isoformat() if summary.get('last_record_at') else None,
+            'updated_at': summary['updated_at'].isoformat()
+        }
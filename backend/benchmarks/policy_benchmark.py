@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Policy benchmark - authorization decisions per second
+
+Seeds a patient's records, a treating doctor and a colleague holding a mix
+of document and patient-scoped grants, then reports decisions/sec for each
+path through AccessPolicy: in-memory short-circuits, grant lookups with a
+cold and a warm access cache, and one check() per record against one
+check_many() for the batch.
+
+Runs against mongomock and fakeredis unless --mongodb-uri / --redis-url
+point at real servers (a throwaway database is created and dropped).
+
+Usage: python benchmarks/policy_benchmark.py [--records 1000] [--batch 100]
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from bson import ObjectId
+from flask import Flask
+from app.models.database import db_manager
+from app.utils.policy import AccessPolicy, ACTION_READ, ACTION_MANAGE
+
+def connect(mongodb_uri: str, redis_url: str):
+    """Return (database, redis client, cleanup)"""
+    if mongodb_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongodb_uri)
+        database = client.get_database(f'policy_benchmark_{ObjectId()}')
+        cleanup = lambda: client.drop_database(database.name)
+    else:
+        import mongomock
+        database = mongomock.MongoClient().db
+        cleanup = lambda: None
+    if redis_url:
+        import redis
+        redis_client = redis.from_url(redis_url)
+    else:
+        import fakeredis
+        redis_client = fakeredis.FakeRedis()
+    return database, redis_client, cleanup
+
+def seed(database, records: int) -> tuple:
+    """Create the records, users and grants; returns (documents, users)"""
+    patient_id, author_id, colleague_id = (str(ObjectId()) for _ in range(3))
+    now = datetime.utcnow()
+    documents = [{
+        '_id': ObjectId(), 'patient_id': patient_id, 'doctor_id': author_id,
+        'document_type': ('lab_result', 'imaging', 'prescription')[i % 3],
+        'is_deleted': False, 'created_at': now - timedelta(days=i)
+    } for i in range(records)]
+    database.medical_documents.insert_many(documents)
+
+    # Every tenth record shared directly, imaging shared patient-wide
+    grants = [{
+        'document_id': str(document['_id']), 'grantee_id': colleague_id, 'patient_id': patient_id,
+        'scope': 'document', 'is_active': True, 'expires_at': now + timedelta(days=30)
+    } for document in documents[::10]]
+    grants.append({
+        'document_id': None, 'grantee_id': colleague_id, 'patient_id': patient_id,
+        'scope': 'patient', 'document_types': ['imaging'], 'is_active': True,
+        'expires_at': now + timedelta(days=30)
+    })
+    database.access_grants.insert_many(grants)
+    database.access_grants.create_index([('grantee_id', 1), ('document_id', 1), ('is_active', 1)])
+    database.care_relationships.insert_many([
+        {'member_id': author_id, 'patient_id': patient_id, 'authored': records, 'grants': 0},
+        {'member_id': colleague_id, 'patient_id': patient_id, 'authored': 0, 'grants': len(grants)},
+    ])
+    database.care_relationships.create_index([('member_id', 1), ('patient_id', 1)], unique=True)
+
+    users = {
+        'admin': {'_id': ObjectId(), 'role': 'admin'},
+        'author': {'_id': ObjectId(author_id), 'role': 'doctor'},
+        'colleague': {'_id': ObjectId(colleague_id), 'role': 'doctor'},
+    }
+    return documents, users
+
+def rate(fn, decisions: int, seconds: float, before=None) -> float:
+    """Return decisions/sec, repeating fn for at least the given seconds"""
+    elapsed = 0.0
+    total = 0
+    while elapsed < seconds:
+        if before:
+            before()
+        start = time.perf_counter()
+        fn()
+        elapsed += time.perf_counter() - start
+        total += decisions
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000, help='records seeded for the patient')
+    parser.add_argument('--batch', type=int, default=100, help='records decided per call')
+    parser.add_argument('--seconds', type=float, default=1.0, help='minimum time per measurement')
+    parser.add_argument('--mongodb-uri', help='benchmark against this MongoDB instead of mongomock')
+    parser.add_argument('--redis-url', help='benchmark against this Redis instead of fakeredis')
+    args = parser.parse_args()
+
+    database, redis_client, cleanup = connect(args.mongodb_uri, args.redis_url)
+    db_manager.db = database
+    app = Flask(__name__)
+    app.config['ACCESS_CACHE_TTL'] = 300
+    app.redis_client = redis_client
+
+    try:
+        documents, users = seed(database, args.records)
+        batch = documents[:args.batch]
+        patient_ids = [batch[0]['patient_id']] + [str(ObjectId()) for _ in range(args.batch - 1)]
+        colleague = users['colleague']
+        flush = lambda: redis_client.delete(f"acl:{colleague['_id']}")
+
+        cases = [
+            ('admin, read', lambda: AccessPolicy.check_many(users['admin'], ACTION_READ, batch), None),
+            ('owner, read', lambda: AccessPolicy.check_many(users['author'], ACTION_READ, batch), None),
+            ('non-owner, manage', lambda: AccessPolicy.check_many(colleague, ACTION_MANAGE, batch), None),
+            ('grants, cold cache', lambda: AccessPolicy.check_many(colleague, ACTION_READ, batch), flush),
+            ('grants, warm cache', lambda: AccessPolicy.check_many(colleague, ACTION_READ, batch), None),
+            ('grants, check() per record',
+             lambda: [AccessPolicy.check(colleague, ACTION_READ, document) for document in batch], flush),
+            ('patients, doctor', lambda: AccessPolicy.check_patients(users['author'], ACTION_READ, patient_ids),
+             None),
+        ]
+
+        with app.app_context():
+            allowed = sum(AccessPolicy.check_many(colleague, ACTION_READ, batch).values())
+            print(f'{args.records} records, batch of {len(batch)}, colleague may read {allowed}\n')
+            print(f"{'path':<30}{'decisions/s':>14}")
+            for name, fn, before in cases:
+                print(f'{name:<30}{rate(fn, len(batch), args.seconds, before):>14,.0f}')
+    finally:
+        cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -25,12 +25,61 @@ class Config:
     BCRYPT_LOG_ROUNDS = 12
     AES_KEY_LENGTH = 32  # 256 bits
     
+    # Envelope encryption: master key wraps per-document data keys
+    MASTER_ENCRYPTION_KEY = os.getenv('MASTER_ENCRYPTION_KEY')
+    KEY_CACHE_SIZE = int(os.getenv('KEY_CACHE_SIZE', '1024'))
+    KEY_CACHE_TTL = int(os.getenv('KEY_CACHE_TTL', '300'))  # seconds
+    
     # CORS Configuration
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'https://localhost:3000').split(',')
     
     # File Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    RECORDS_BATCH_MAX_IDS = int(os.getenv('RECORDS_BATCH_MAX_IDS', '50'))
+    BULK_INGEST_MAX_ITEMS = int(os.getenv('BULK_INGEST_MAX_ITEMS', '500'))
+    ACCESS_BULK_MAX_PAIRS = int(os.getenv('ACCESS_BULK_MAX_PAIRS', '1000'))  # documents x grantees
+    PATIENT_SEARCH_CANDIDATES = int(os.getenv('PATIENT_SEARCH_CANDIDATES', '200'))  # index matches ranked per search
+    AUTOCOMPLETE_MAX_PATIENTS = int(os.getenv('AUTOCOMPLETE_MAX_PATIENTS', '200000'))  # held in memory per process
+    AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', '60'))
+    TIMELINE_LATEST_SIZE = int(os.getenv('TIMELINE_LATEST_SIZE', '20'))  # records kept on the patient timeline
+    CONTENT_SEGMENT_SIZE = int(os.getenv('CONTENT_SEGMENT_SIZE', str(64 * 1024)))  # AES-GCM segment
+    
+    # File delivery: 'direct' (Flask sends bytes) or 'accel' (nginx X-Accel-Redirect)
+    FILE_DELIVERY_MODE = os.getenv('FILE_DELIVERY_MODE', 'direct')
+    FRONTEND_FOLDER = os.getenv('FRONTEND_FOLDER')  # defaults to <backend>/frontend
+    ACCEL_FRONTEND_LOCATION = os.getenv('ACCEL_FRONTEND_LOCATION', '/_frontend/')  # internal nginx location
+    SIGNED_URL_SECRET = os.getenv('SIGNED_URL_SECRET')  # required outside development and testing
+    SIGNED_URL_TTL = int(os.getenv('SIGNED_URL_TTL', '300'))  # seconds
+    
+    # Idempotency-Key handling (Redis)
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))  # seconds a response is replayable
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '60'))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '5'))
+    
+    # Access-decision cache (Redis)
+    ACCESS_CACHE_TTL = int(os.getenv('ACCESS_CACHE_TTL', '300'))  # seconds, capped at grant expiry
+    SHARED_COUNT_CACHE_TTL = int(os.getenv('SHARED_COUNT_CACHE_TTL', '60'))  # "shared with me" badge
+    
+    # Expired access grants are deactivated by a periodic sweep
+    GRANT_EXPIRY_BATCH_SIZE = int(os.getenv('GRANT_EXPIRY_BATCH_SIZE', '500'))
+    GRANT_EXPIRY_MAX_BATCHES = int(os.getenv('GRANT_EXPIRY_MAX_BATCHES', '20'))  # per sweep
+    
+    # Background job queue (Redis)
+    JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', '60'))  # seconds before redelivery
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+    JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '5'))  # seconds, doubled per attempt
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+    
+    # Archival of expired and deleted records to local compressed segments
+    ARCHIVE_FOLDER = os.getenv('ARCHIVE_FOLDER', 'archive')
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '100'))
+    ARCHIVE_MAX_DOCS_PER_SECOND = float(os.getenv('ARCHIVE_MAX_DOCS_PER_SECOND', '50'))
+    ARCHIVE_MAX_RUN_SECONDS = int(os.getenv('ARCHIVE_MAX_RUN_SECONDS', '45'))  # keep below JOB_VISIBILITY_TIMEOUT
+    ARCHIVE_WINDOW_START_HOUR = int(os.getenv('ARCHIVE_WINDOW_START_HOUR', '1'))  # off-peak, server local time
+    ARCHIVE_WINDOW_END_HOUR = int(os.getenv('ARCHIVE_WINDOW_END_HOUR', '5'))
+    ARCHIVE_DELETED_GRACE_DAYS = int(os.getenv('ARCHIVE_DELETED_GRACE_DAYS', '30'))
+    ARCHIVE_REHYDRATE_HOLD_DAYS = int(os.getenv('ARCHIVE_REHYDRATE_HOLD_DAYS', '7'))
     
     # Audit Logging
     AUDIT_LOG_RETENTION_DAYS = int(os.getenv('AUDIT_LOG_RETENTION_DAYS', '2555'))  # 7 years
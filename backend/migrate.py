@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Medical Records Management System - Data Migrations
+
+Applies the data migrations that have not run yet (backfills and the
+de-duplication behind unique indexes) and records each one, so later runs
+skip it. Run once per deploy, before starting the API and job workers.
+"""
+
+import os
+import sys
+import logging
+from pathlib import Path
+
+# Add the backend directory to Python path for proper imports
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from app import create_app
+from app.models.database import db_manager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """Migration entry point"""
+    config_name = os.getenv('FLASK_ENV', 'development')
+    app = create_app(config_name)
+    db_manager.init_app(app)
+
+    with app.app_context():
+        applied = db_manager.migrate()
+    if applied:
+        logger.info(f"Applied migrations: {', '.join(applied)}")
+    else:
+        logger.info("No pending migrations")
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,9 @@ sys.path.insert(0, str(backend_dir))
 from flask import Flask
 from app import create_app
 from app.models.database import db_manager
+from app.utils.autocomplete import patient_directory
+from app.utils.encryption import KeyManager
+from app.utils.delivery import check_signing_secret
 
 # Configure logging
 logging.basicConfig(
@@ -39,9 +42,16 @@ def main():
     # Create Flask application
     app = create_app(config_name)
     
+    # Refuse to derive the master key or the link signing secret from SECRET_KEY in production
+    KeyManager.check_master_key(app.config)
+    check_signing_secret(app.config)
+    
     # Initialize database manager
     db_manager.init_app(app)
     
+    # Build the typeahead directory in the background
+    patient_directory.start(app)
+    
     # Log startup information
     logger.info(f"Starting Medical Records System in {config_name} mode")
     logger.info(f"Database: {app.config['MONGODB_URI']}")
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Blueprints import the package as `app`, so tests run with backend/ on the path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+@pytest.fixture
+def mongomock_bulk_sort(monkeypatch):
+    """Let mongomock's bulk builders accept the sort argument newer pymongo passes"""
+    mongomock = pytest.importorskip('mongomock')
+    for name in ('add_update', 'add_replace'):
+        original = getattr(mongomock.collection.BulkOperationBuilder, name)
+        monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, name,
+                            lambda self, *args, _original=original, sort=None, **kwargs:
+                            _original(self, *args, **kwargs))
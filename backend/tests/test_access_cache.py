@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from app.utils.access_cache import AccessCache
+from app.utils.metrics import metrics
+
+fakeredis = pytest.importorskip('fakeredis')
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['ACCESS_CACHE_TTL'] = 300
+    app.redis_client = fakeredis.FakeRedis()
+    metrics.reset()
+    with app.app_context():
+        yield app
+
+class TestAccessCache:
+    """Test the (user, document) access-decision cache"""
+    
+    def test_hits_and_misses(self, app):
+        """Test cached decisions are returned and counted"""
+        assert AccessCache.get('u1', 'd1') is None
+        AccessCache.put_many('u1', {'d1': (True, None), 'd2': (False, None)}, AccessCache.version('u1'))
+        
+        assert AccessCache.get_many('u1', ['d1', 'd2', 'd3']) == {'d1': True, 'd2': False}
+        assert metrics.get('access_cache.hits') == 2
+        assert metrics.get('access_cache.misses') == 2
+    
+    def test_ttl_capped_at_grant_expiry(self, app):
+        """Test an allow is not served past the grant's expires_at"""
+        AccessCache.put('u1', 'd1', True, AccessCache.version('u1'),
+                         datetime.utcnow() + timedelta(seconds=0.05))
+        assert AccessCache.get('u1', 'd1') is True
+        time.sleep(0.1)
+        assert AccessCache.get('u1', 'd1') is None
+    
+    def test_invalidate_one_document(self, app):
+        """Test a grant change drops only that document"""
+        AccessCache.put_many('u1', {'d1': (True, None), 'd2': (True, None)}, AccessCache.version('u1'))
+        AccessCache.invalidate('u1', 'd1')
+        assert AccessCache.get_many('u1', ['d1', 'd2']) == {'d2': True}
+    
+    def test_invalidate_user(self, app):
+        """Test a status change drops every decision for the user"""
+        AccessCache.put_many('u1', {'d1': (True, None), 'd2': (False, None)}, AccessCache.version('u1'))
+        AccessCache.put('u2', 'd1', True, AccessCache.version('u2'))
+        AccessCache.invalidate('u1')
+        assert AccessCache.get_many('u1', ['d1', 'd2']) == {}
+        assert AccessCache.get('u2', 'd1') is True
+    
+    def test_invalidate_many(self, app):
+        """Test bulk invalidation drops exactly the listed pairs"""
+        AccessCache.put_many('u1', {'d1': (True, None), 'd2': (True, None)}, AccessCache.version('u1'))
+        AccessCache.put('u2', 'd1', True, AccessCache.version('u2'))
+        AccessCache.invalidate_many([('u1', 'd1'), ('u2', 'd1')])
+        assert AccessCache.get_many('u1', ['d1', 'd2']) == {'d2': True}
+        assert AccessCache.get('u2', 'd1') is None
+        assert metrics.get('access_cache.invalidations') == 2
+    
+    def test_write_after_invalidation_is_dropped(self, app):
+        """Test a decision computed before a grant change is not cached after it"""
+        _, version = AccessCache.lookup('u1', ['d1'])
+        AccessCache.invalidate('u1', 'd1')  # revoked while the grants were being read
+        
+        assert AccessCache.put_many('u1', {'d1': (True, None)}, version) is False
+        assert AccessCache.get('u1', 'd1') is None
+        assert metrics.get('access_cache.stale_writes') == 1
+        
+        assert AccessCache.put_many('u1', {'d1': (False, None)}, AccessCache.version('u1')) is True
+        assert AccessCache.get('u1', 'd1') is False
+    
+    def test_shared_count_is_cached_until_a_grant_changes(self, app):
+        """Test the inbox badge count is computed once per grant change"""
+        app.config['SHARED_COUNT_CACHE_TTL'] = 60
+        calls = []
+        compute = lambda: calls.append(1) or 3
+        
+        assert AccessCache.shared_count('u1', compute) == 3
+        assert AccessCache.shared_count('u1', compute) == 3
+        assert len(calls) == 1
+        
+        AccessCache.invalidate('u1', 'd1')
+        assert AccessCache.shared_count('u1', compute) == 3
+        assert len(calls) == 2
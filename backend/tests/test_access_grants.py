@@ -0,0 +1,402 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import inspect
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+from app.utils.care_team import CareRelationships
+from app.utils.policy import AccessPolicy
+import app.blueprints.access as access
+import app.blueprints.records as records
+
+class CountingStore:
+    """In-memory stand-in for db_manager's read helpers that counts queries"""
+    
+    def __init__(self, collections):
+        self.collections = collections
+        self.queries = 0
+    
+    def _matches(self, document, filter_dict):
+        for field, condition in filter_dict.items():
+            if field == '$or':
+                if not any(self._matches(document, clause) for clause in condition):
+                    return False
+            elif isinstance(condition, dict) and '$in' in condition:
+                if document.get(field) not in condition['$in']:
+                    return False
+            elif isinstance(condition, dict) and '$gt' in condition:
+                if document.get(field) is None or not document[field] > condition['$gt']:
+                    return False
+            elif document.get(field) != condition:
+                return False
+        return True
+    
+    def find_one(self, collection, filter_dict, projection=None):
+        self.queries += 1
+        return next((d for d in self.collections[collection] if self._matches(d, filter_dict)), None)
+    
+    def find_many(self, collection, filter_dict, limit=None, skip=None, sort=None, projection=None):
+        self.queries += 1
+        return [d for d in self.collections[collection] if self._matches(d, filter_dict)]
+    
+    def insert_many(self, collection, documents, ordered=True):
+        self.queries += 1
+        self.collections[collection].extend(documents)
+    
+    def bulk_write(self, collection, operations):
+        """Apply UpdateOne upserts: matching rows are updated, the rest inserted"""
+        self.queries += 1
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            match = next((d for d in self.collections[collection]
+                          if self._matches(d, operation._filter)), None)
+            if match is not None:
+                match.update(operation._doc['$set'])
+                continue
+            inserted = {'_id': ObjectId(), **operation._filter,
+                        **operation._doc['$setOnInsert'], **operation._doc['$set']}
+            self.collections[collection].append(inserted)
+            upserted_ids[index] = inserted['_id']
+        return SimpleNamespace(upserted_ids=upserted_ids)
+    
+    @property
+    def db(self):
+        store = self
+        return SimpleNamespace(access_grants=SimpleNamespace(
+            bulk_write=lambda operations, ordered=True: store.bulk_write('access_grants', operations)
+        ))
+
+@pytest.fixture
+def shared_document(monkeypatch):
+    patient = {'_id': ObjectId(), 'role': 'patient', 'first_name': 'Asha',
+               'last_name': 'Rao', 'email': 'asha@example.com'}
+    document = {'_id': ObjectId(), 'patient_id': str(patient['_id']),
+                'doctor_id': str(ObjectId()), 'is_deleted': False}
+    doctors = [{'_id': ObjectId(), 'role': 'doctor', 'first_name': f'Doc{i}',
+                'last_name': 'Kumar', 'email': f'doc{i}@example.com'} for i in range(200)]
+    grants = [{'_id': ObjectId(), 'document_id': str(document['_id']),
+               'grantee_id': str(doctor['_id']), 'access_level': 'read',
+               'is_active': True, 'created_at': datetime.utcnow()} for doctor in doctors]
+    # A grant to a deleted account still lists, with a placeholder grantee
+    grants.append({'_id': ObjectId(), 'document_id': str(document['_id']),
+                   'grantee_id': str(ObjectId()), 'access_level': 'read',
+                   'is_active': True, 'created_at': datetime.utcnow()})
+    
+    store = CountingStore({
+        'users': [patient] + doctors,
+        'medical_documents': [document],
+        'access_grants': grants
+    })
+    monkeypatch.setattr(db_manager, 'find_one', store.find_one)
+    monkeypatch.setattr(db_manager, 'find_many', store.find_many)
+    monkeypatch.setattr(access, 'get_current_user', lambda: patient)
+    return store, str(document['_id'])
+
+class TestGetAccessGrants:
+    """Test listing the grants on a document"""
+    
+    def test_query_count_is_bounded(self, shared_document):
+        """Test grantees are resolved in one query however many grants exist"""
+        store, document_id = shared_document
+        view = access.get_access_grants.__wrapped__
+        
+        with Flask(__name__).test_request_context():
+            response, status = view(document_id)
+        
+        body = response.get_json()
+        assert status == 200
+        assert body['count'] == 201
+        assert body['grants'][0]['grantee']['name'] == 'Doc0 Kumar'
+        assert body['grants'][-1]['grantee']['name'] == 'Unknown User'
+        # document lookup, grant listing and one batched grantee fetch
+        assert store.queries == 3
+
+@pytest.fixture
+def care_team(monkeypatch):
+    patient = {'_id': ObjectId(), 'role': 'patient', 'is_active': True}
+    documents = [{'_id': ObjectId(), 'patient_id': str(patient['_id']), 'doctor_id': str(ObjectId()),
+                  'document_type': 'lab_result', 'is_deleted': False} for _ in range(3)]
+    doctors = [{'_id': ObjectId(), 'role': 'doctor', 'is_active': True} for _ in range(4)]
+    existing = {'_id': ObjectId(), 'document_id': str(documents[0]['_id']),
+                'grantee_id': str(doctors[0]['_id']), 'access_level': 'read', 'is_active': True}
+    
+    store = CountingStore({
+        'users': [patient] + doctors,
+        'medical_documents': documents,
+        'access_grants': [existing],
+        'audit_logs': []
+    })
+    for name in ('find_one', 'find_many', 'insert_many'):
+        monkeypatch.setattr(db_manager, name, getattr(store, name))
+    monkeypatch.setattr(db_manager, 'db', store.db)
+    monkeypatch.setattr(access, 'get_current_user', lambda: patient)
+    
+    app = Flask(__name__)
+    app.config['ACCESS_BULK_MAX_PAIRS'] = 100
+    return app, store, [str(d['_id']) for d in documents], [str(d['_id']) for d in doctors]
+
+class TestBulkGrant:
+    """Test granting a care team access to several documents at once"""
+    
+    def test_pairs_are_upserted_in_one_write(self, care_team):
+        """Test validation and writes take a fixed number of round trips"""
+        app, store, document_ids, grantee_ids = care_team
+        view = inspect.unwrap(access.grant_access_bulk)
+        
+        with app.test_request_context(json={'document_ids': document_ids,
+                                            'grantee_ids': grantee_ids,
+                                            'access_level': 'read'}):
+            response, status = view()
+        
+        body = response.get_json()
+        assert status == 200
+        assert (body['created'], body['updated'], body['failed']) == (11, 1, 0)
+        assert len([g for g in store.collections['access_grants'] if g['is_active']]) == 12
+        assert len(store.collections['audit_logs']) == 12
+        # documents, grantees, one bulk_write and one audit insert
+        assert store.queries == 4
+    
+    def test_rejects_documents_the_user_cannot_share(self, care_team):
+        """Test nothing is written when any document fails validation"""
+        app, store, document_ids, grantee_ids = care_team
+        store.collections['medical_documents'][0]['patient_id'] = str(ObjectId())
+        view = inspect.unwrap(access.grant_access_bulk)
+        
+        with app.test_request_context(json={'document_ids': document_ids,
+                                            'grantee_ids': grantee_ids,
+                                            'access_level': 'read'}):
+            response, status = view()
+        
+        assert status == 403
+        assert response.get_json()['error']['details']['document_ids'] == [document_ids[0]]
+        assert len(store.collections['access_grants']) == 1
+
+@pytest.fixture
+def patient_history(monkeypatch, mongomock_bulk_sort):
+    fakeredis = pytest.importorskip('fakeredis')
+    mongomock = pytest.importorskip('mongomock')
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    db_manager._create_patient_grant_unique_index()
+    
+    patient = {'_id': ObjectId(), 'role': 'patient', 'is_active': True}
+    doctor = {'_id': ObjectId(), 'role': 'doctor', 'is_active': True}
+    database.users.insert_many([patient, doctor])
+    now = datetime.utcnow()
+    database.medical_documents.insert_many([
+        {'patient_id': str(patient['_id']), 'doctor_id': str(ObjectId()), 'document_type': document_type,
+         'title': title, 'is_deleted': False, 'created_at': now - timedelta(days=age)}
+        for document_type, title, age in [('lab_result', 'old labs', 400), ('lab_result', 'labs', 10),
+                                          ('imaging', 'chest', 5)]
+    ])
+    monkeypatch.setattr(access, 'get_current_user', lambda: patient)
+    
+    app = Flask(__name__)
+    app.redis_client = fakeredis.FakeRedis()
+    with app.app_context():
+        yield app, database, str(patient['_id']), doctor
+
+def grant_patient(app, body):
+    view = inspect.unwrap(access.grant_patient_access)
+    with app.test_request_context(json=body):
+        response, status = view()
+    return response.get_json(), status
+
+class TestPatientGrant:
+    """Test POST /api/access/grant/patient"""
+    
+    def test_repeated_grant_updates_the_active_row(self, patient_history):
+        """Test the same scope granted twice is one grant, counted once"""
+        app, database, patient_id, doctor = patient_history
+        body = {'grantee_id': str(doctor['_id']), 'access_level': 'read', 'document_types': ['lab_result']}
+        
+        first, first_status = grant_patient(app, body)
+        second, second_status = grant_patient(app, {**body, 'reason': 'follow-up'})
+        
+        assert (first_status, second_status) == (201, 200)
+        assert first['grant_id'] == second['grant_id']
+        grants = list(database.access_grants.find({'is_active': True}))
+        assert len(grants) == 1
+        assert grants[0]['reason'] == 'follow-up'
+        assert CareRelationships.get(str(doctor['_id']), patient_id)['grants'] == 1
+    
+    def test_overlapping_scopes_are_separate_grants(self, patient_history):
+        """Test scopes sharing a category or differing only by window do not collide"""
+        app, database, patient_id, doctor = patient_history
+        body = {'grantee_id': str(doctor['_id']), 'access_level': 'read'}
+        
+        statuses = [grant_patient(app, {**body, **scope})[1] for scope in [
+            {'document_types': ['lab_result']},
+            {'document_types': ['imaging', 'lab_result']},
+            {'document_types': ['lab_result'], 'records_from': '2020-01-01T00:00:00'}
+        ]]
+        
+        assert statuses == [201, 201, 201]
+        assert database.access_grants.count_documents({'is_active': True}) == 3
+    
+    def test_readable_filter_returns_scoped_records(self, patient_history):
+        """Test the grantee's listing filter matches exactly the records the scope covers"""
+        app, database, patient_id, doctor = patient_history
+        records_from = (datetime.utcnow() - timedelta(days=30)).isoformat()
+        grant_patient(app, {'grantee_id': str(doctor['_id']), 'access_level': 'read',
+                            'document_types': ['lab_result'], 'records_from': records_from})
+        
+        readable = AccessPolicy.readable_filter(doctor, patient_id)
+        
+        titles = [document['title'] for document in database.medical_documents.find(readable)]
+        assert titles == ['labs']
+
+class TestRevoke:
+    """Test DELETE /api/access/revoke/<id> and POST /api/access/revoke/bulk"""
+    
+    def test_lost_race_is_not_counted_twice(self, patient_history, monkeypatch):
+        """Test a revoke that finds the grant already inactive leaves the counts alone"""
+        app, database, patient_id, doctor = patient_history
+        body, _ = grant_patient(app, {'grantee_id': str(doctor['_id']), 'access_level': 'read'})
+        grant = database.access_grants.find_one({'is_active': True})
+        view = inspect.unwrap(access.revoke_access)
+        
+        with app.test_request_context():
+            _, first = view(body['grant_id'])
+        # A concurrent request read the grant before the first revoke landed
+        find_one = db_manager.find_one
+        monkeypatch.setattr(db_manager, 'find_one', lambda collection, filter_dict, **kwargs:
+                            grant if collection == 'access_grants' else
+                            find_one(collection, filter_dict, **kwargs))
+        with app.test_request_context():
+            _, second = view(body['grant_id'])
+        
+        assert (first, second) == (200, 404)
+        assert CareRelationships.get(str(doctor['_id']), patient_id) is None
+        assert database.care_relationships.find_one()['grants'] == 0
+    
+    def test_bulk_revoke_counts_only_grants_it_deactivated(self, patient_history, monkeypatch):
+        """Test grants revoked by someone else in the meantime are skipped"""
+        app, database, patient_id, doctor = patient_history
+        documents = list(database.medical_documents.find())
+        grants = [{'_id': ObjectId(), 'document_id': str(document['_id']), 'patient_id': patient_id,
+                   'grantor_id': patient_id, 'grantee_id': str(doctor['_id']), 'access_level': 'read',
+                   'is_active': True, 'created_at': datetime.utcnow()} for document in documents]
+        database.access_grants.insert_many(grants)
+        CareRelationships.grants_added(grants)
+        
+        find_many = db_manager.find_many
+        
+        def racing_find_many(collection, filter_dict, **kwargs):
+            found = find_many(collection, filter_dict, **kwargs)
+            if collection == 'access_grants' and filter_dict.get('is_active'):
+                # Another request revokes the first grant after this one read it
+                database.access_grants.update_one({'_id': grants[0]['_id']}, {'$set': {'is_active': False}})
+                CareRelationships.grants_removed(grants[:1])
+            return found
+        
+        monkeypatch.setattr(db_manager, 'find_many', racing_find_many)
+        app.config['ACCESS_BULK_MAX_PAIRS'] = 10
+        view = inspect.unwrap(access.revoke_access_bulk)
+        with app.test_request_context(json={'document_ids': [grant['document_id'] for grant in grants],
+                                            'grantee_ids': [str(doctor['_id'])]}):
+            response, status = view()
+        
+        assert status == 200
+        assert response.get_json()['revoked'] == 2
+        assert [grant['id'] for grant in response.get_json()['grants']] == [str(grant['_id'])
+                                                                            for grant in grants[1:]]
+        assert database.care_relationships.find_one()['grants'] == 0
+
+@pytest.fixture
+def inbox(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    mongomock = pytest.importorskip('mongomock')
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    
+    patient = {'_id': ObjectId(), 'role': 'patient', 'first_name': 'Asha', 'last_name': 'Rao'}
+    doctor = {'_id': ObjectId(), 'role': 'doctor', 'is_active': True}
+    database.users.insert_many([patient, doctor])
+    monkeypatch.setattr(access, 'get_current_user', lambda: doctor)
+    
+    app = Flask(__name__)
+    app.redis_client = fakeredis.FakeRedis()
+    app.config['SHARED_COUNT_CACHE_TTL'] = 60
+    with app.app_context():
+        yield app, database, patient, doctor
+
+def share(database, patient, doctor, created_at, **grant):
+    """Store a document and an active grant on it to the doctor, or a scoped grant without one"""
+    if grant.get('scope') != 'patient':
+        document = {'_id': ObjectId(), 'patient_id': str(patient['_id']), 'doctor_id': str(ObjectId()),
+                    'title': 'labs', 'document_type': 'lab_result', 'is_deleted': False,
+                    'created_at': created_at}
+        database.medical_documents.insert_one(document)
+        grant['document_id'] = str(document['_id'])
+    grant = {'_id': ObjectId(), 'grantor_id': str(patient['_id']), 'grantee_id': str(doctor['_id']),
+             'patient_id': str(patient['_id']), 'access_level': 'read', 'is_active': True,
+             'expires_at': created_at + timedelta(days=30), 'created_at': created_at, **grant}
+    database.access_grants.insert_one(grant)
+    return grant
+
+def shared_page(app, **args):
+    view = inspect.unwrap(access.get_shared_with_me)
+    with app.test_request_context(query_string=args):
+        response, status = view()
+    return response.get_json(), status
+
+def shared_count(app):
+    view = inspect.unwrap(access.get_shared_with_me_count)
+    with app.test_request_context():
+        response, status = view()
+    return response.get_json()['count']
+
+class TestSharedWithMe:
+    """Test GET /api/access/shared-with-me and its count"""
+    
+    def test_cursor_pages_through_equal_timestamps(self, inbox):
+        """Test grants sharing a created_at are neither repeated nor skipped across pages"""
+        app, database, patient, doctor = inbox
+        created_at = datetime.utcnow().replace(microsecond=0)
+        grants = [share(database, patient, doctor, created_at) for _ in range(5)]
+        
+        seen, cursor = [], None
+        while True:
+            body, status = shared_page(app, limit=2, **({'cursor': cursor} if cursor else {}))
+            assert status == 200
+            seen.extend(item['grant_id'] for item in body['shared'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        
+        assert seen == sorted((str(grant['_id']) for grant in grants), reverse=True)
+    
+    def test_scoped_grants_are_listed_without_a_document(self, inbox):
+        """Test a patient-scoped grant is listed with its scope instead of a document"""
+        app, database, patient, doctor = inbox
+        share(database, patient, doctor, datetime.utcnow(), scope='patient',
+              document_types=['lab_result'], records_from=datetime(2020, 1, 1))
+        
+        body, _ = shared_page(app)
+        
+        item, = body['shared']
+        assert item['scope'] == 'patient'
+        assert item['document'] is None
+        assert item['document_types'] == ['lab_result']
+        assert item['records_from'] == '2020-01-01T00:00:00'
+        assert item['granted_by']['name'] == 'Asha Rao'
+        assert shared_count(app) == 1
+    
+    def test_deleted_documents_are_skipped_and_not_counted(self, inbox, monkeypatch):
+        """Test the list and the badge count agree once a shared document is deleted"""
+        app, database, patient, doctor = inbox
+        now = datetime.utcnow()
+        kept = share(database, patient, doctor, now)
+        gone = share(database, patient, doctor, now + timedelta(seconds=1))
+        assert shared_count(app) == 2
+        
+        monkeypatch.setattr(records, 'get_current_user', lambda: patient)
+        with app.test_request_context(method='DELETE'):
+            _, status = inspect.unwrap(records.delete_record)(gone['document_id'])
+        assert status == 200
+        body, _ = shared_page(app)
+        
+        assert [item['grant_id'] for item in body['shared']] == [str(kept['_id'])]
+        assert shared_count(app) == 1
@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+import os
+from types import SimpleNamespace
+from bson import ObjectId
+import pytest
+from flask import Flask
+from gridfs import GridFSBucket
+from app.models.database import db_manager
+from app.utils.care_team import CareRelationships
+from app.utils.storage import DocumentStorage
+from app.utils.timeline import TimelineManager
+import app.utils.archive as archive
+from app.utils.archive import ArchiveManager, in_archive_window
+
+mongomock = pytest.importorskip('mongomock')
+import mongomock.gridfs  # noqa: E402
+
+def window_app(start, end):
+    app = Flask(__name__)
+    app.config['ARCHIVE_WINDOW_START_HOUR'] = start
+    app.config['ARCHIVE_WINDOW_END_HOUR'] = end
+    return app
+
+class TestArchiveWindow:
+    """Test the off-peak window that gates archival"""
+    
+    def test_same_day_window(self):
+        """Test a window inside one day"""
+        with window_app(1, 5).app_context():
+            assert in_archive_window(datetime(2024, 1, 1, 1, 0))
+            assert in_archive_window(datetime(2024, 1, 1, 4, 59))
+            assert not in_archive_window(datetime(2024, 1, 1, 5, 0))
+            assert not in_archive_window(datetime(2024, 1, 1, 14, 0))
+    
+    def test_window_across_midnight(self):
+        """Test a window that wraps past midnight"""
+        with window_app(22, 4).app_context():
+            assert in_archive_window(datetime(2024, 1, 1, 23, 0))
+            assert in_archive_window(datetime(2024, 1, 1, 2, 0))
+            assert not in_archive_window(datetime(2024, 1, 1, 12, 0))
+    
+    def test_equal_hours_mean_always(self):
+        """Test start == end disables the window"""
+        with window_app(0, 0).app_context():
+            assert in_archive_window(datetime(2024, 1, 1, 15, 0))
+
+@pytest.fixture
+def archive_app(monkeypatch, tmp_path, mongomock_bulk_sort):
+    mongomock.gridfs.enable_gridfs_integration()
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    monkeypatch.setattr(db_manager, 'fs', GridFSBucket(database, bucket_name='document_content'))
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY='test', MASTER_ENCRYPTION_KEY=None,
+                      ARCHIVE_FOLDER=str(tmp_path), ARCHIVE_DELETED_GRACE_DAYS=30,
+                      ARCHIVE_REHYDRATE_HOLD_DAYS=7, ARCHIVE_BATCH_SIZE=1,
+                      ARCHIVE_MAX_DOCS_PER_SECOND=1, ARCHIVE_MAX_RUN_SECONDS=45)
+    with app.app_context():
+        yield app, database, tmp_path
+
+def add_record(database, content: bytes = None, **fields) -> dict:
+    now = datetime.utcnow()
+    document = {'_id': ObjectId(), 'patient_id': 'p1', 'doctor_id': 'd1', 'document_type': 'imaging',
+                'title': 'X-ray', 'mime_type': 'image/png', 'encryption_key_id': 'simple_key',
+                'is_deleted': False, 'created_at': now, 'updated_at': now}
+    if content is not None:
+        document.update(DocumentStorage.store([content], 'image/png', 'p1'))
+        thumbnail = DocumentStorage.store([b'thumb'], 'image/jpeg', 'p1', key_id=document['encryption_key_id'])
+        document['derivatives'] = {'thumbnail': {**thumbnail, 'mime_type': 'image/jpeg'}}
+    document.update(fields)
+    database.medical_documents.insert_one(document)
+    if not document['is_deleted']:
+        CareRelationships.record_added(document)
+    return document
+
+class TestArchiveBatch:
+    """Test moving due records to segment files and back"""
+
+    def test_due_records_move_to_a_segment(self, archive_app):
+        """Test a batch writes frames, indexes them and removes the hot copies"""
+        app, database, folder = archive_app
+        now = datetime.utcnow()
+        expired = add_record(database, b'scan' * 1000, retention_date=now - timedelta(days=1))
+        deleted = add_record(database, is_deleted=True, deleted_at=now - timedelta(days=31))
+        hot = add_record(database, retention_date=now + timedelta(days=1))
+        TimelineManager.get('p1')
+
+        assert ArchiveManager.archive_batch(10) == 2
+
+        entries = {entry['document_id']: entry for entry in database.archive_index.find()}
+        assert set(entries) == {str(expired['_id']), str(deleted['_id'])}
+        assert entries[str(expired['_id'])]['reason'] == 'retention'
+        assert entries[str(deleted['_id'])]['reason'] == 'deleted'
+        segment = folder / entries[str(expired['_id'])]['segment']
+        assert segment.exists()
+        assert os.path.getsize(segment) == sum(entry['length'] for entry in entries.values())
+
+        assert [doc['_id'] for doc in database.medical_documents.find()] == [hot['_id']]
+        assert database['document_content.files'].count_documents({}) == 0
+        # Only the hot record still counts towards the doctor's relationship and the timeline
+        assert CareRelationships.get('d1', 'p1')['authored'] == 1
+        assert TimelineManager.get('p1')['total_records'] == 1
+
+    def test_rehydrate_restores_record_and_content(self, archive_app):
+        """Test an archived record comes back whole and is held from re-archival"""
+        app, database, _ = archive_app
+        content = os.urandom(3000)
+        expired = add_record(database, content, retention_date=datetime.utcnow() - timedelta(days=1))
+        TimelineManager.get('p1')
+        ArchiveManager.archive_batch(10)
+        assert CareRelationships.get('d1', 'p1') is None
+        assert TimelineManager.get('p1')['total_records'] == 0
+
+        document = ArchiveManager.rehydrate(str(expired['_id']))
+
+        restored = database.medical_documents.find_one({'_id': expired['_id']})
+        assert restored['archive_hold_until'] > datetime.utcnow() + timedelta(days=6)
+        assert DocumentStorage.read_all(restored) == content
+        assert DocumentStorage.read_all(restored['derivatives']['thumbnail']) == b'thumb'
+        assert database.archive_index.find_one({'document_id': str(expired['_id'])})['rehydrated_at']
+        assert CareRelationships.get('d1', 'p1')['authored'] == 1
+        assert TimelineManager.get('p1')['latest'][0]['id'] == str(expired['_id'])
+        assert ArchiveManager.archive_batch(10) == 0
+        assert document['_id'] == expired['_id']
+
+    def test_run_is_rate_limited_and_time_boxed(self, archive_app, monkeypatch):
+        """Test a run sleeps to the docs-per-second cap and stops at max_seconds"""
+        app, database, _ = archive_app
+        for _ in range(10):
+            add_record(database, retention_date=datetime.utcnow() - timedelta(days=1))
+        clock = SimpleNamespace(now=0.0, sleeps=[])
+
+        def sleep(seconds):
+            clock.sleeps.append(seconds)
+            clock.now += seconds
+
+        monkeypatch.setattr(archive, 'time', SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep))
+
+        # One record per batch at one record per second, for at most 2.5 seconds
+        assert ArchiveManager.run(max_seconds=2.5, ignore_window=True) == 3
+        assert clock.sleeps == [1.0, 1.0, 0.5]
+        assert database.medical_documents.count_documents({}) == 7
+
+class TestArchiveLock:
+    """Test the Redis lock around periodic archival runs"""
+    
+    def test_only_the_holder_releases_the_lock(self, monkeypatch):
+        """Test a run that outlived its lock leaves the next run's lock in place"""
+        fakeredis = pytest.importorskip('fakeredis')
+        app = Flask(__name__)
+        app.redis_client = fakeredis.FakeRedis()
+        app.config['ARCHIVE_MAX_RUN_SECONDS'] = 45
+        
+        def overrun():
+            # The lock expired mid-run and another worker took it
+            app.redis_client.set(archive.LOCK_KEY, 'next-run')
+            return 0
+        
+        with app.app_context():
+            monkeypatch.setattr(ArchiveManager, 'run', staticmethod(lambda: 0))
+            archive.run_archival()
+            assert app.redis_client.get(archive.LOCK_KEY) is None
+            
+            monkeypatch.setattr(ArchiveManager, 'run', staticmethod(overrun))
+            archive.run_archival()
+            assert app.redis_client.get(archive.LOCK_KEY) == b'next-run'
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+from bson import ObjectId
+from app.utils.autocomplete import PatientDirectory
+
+class Cursor(list):
+    """List standing in for a pymongo cursor"""
+
+    def batch_size(self, size):
+        return self
+
+    def close(self):
+        pass
+
+def directory_of(patients, max_patients=100):
+    database = SimpleNamespace(users=SimpleNamespace(find=lambda *args: Cursor(patients)))
+    directory = PatientDirectory(max_patients=max_patients)
+    directory.build(database)
+    return directory
+
+PATIENTS = [
+    {'_id': ObjectId(), 'first_name': 'Asha', 'last_name': 'Rao', 'medical_record_number': 'MRN-00123'},
+    {'_id': ObjectId(), 'first_name': 'Ashok', 'last_name': 'Kumar', 'medical_record_number': 'MRN-00999'},
+    {'_id': ObjectId(), 'first_name': 'José', 'last_name': 'Iyer', 'medical_record_number': None},
+]
+
+def names(results):
+    return [result['first_name'] for result in results]
+
+class TestPatientDirectory:
+    """Test the in-memory typeahead index"""
+
+    def test_not_ready_until_built(self):
+        """Test an unbuilt directory answers nothing"""
+        directory = PatientDirectory()
+        assert not directory.ready
+        assert directory.complete('asha') == []
+
+    def test_prefix_of_any_name_matches(self):
+        """Test first names, last names and full names can be typed from the start"""
+        directory = directory_of(PATIENTS)
+        assert directory.ready
+        assert names(directory.complete('ash')) == ['Asha', 'Ashok']
+        assert names(directory.complete('kum')) == ['Ashok']
+        assert names(directory.complete('Asha R')) == ['Asha']
+        assert names(directory.complete('rao as')) == ['Asha']
+        assert names(directory.complete('JOS')) == ['José']
+
+    def test_mrn_prefix_ignores_separators(self):
+        """Test MRNs match with or without their punctuation"""
+        directory = directory_of(PATIENTS)
+        assert names(directory.complete('MRN-00')) == ['Asha', 'Ashok']
+        assert names(directory.complete('mrn 009')) == ['Ashok']
+
+    def test_results_are_limited_and_unique(self):
+        """Test a patient matching several keys is returned once, up to limit"""
+        directory = directory_of(PATIENTS)
+        assert names(directory.complete('asha', limit=5)) == ['Asha']
+        assert len(directory.complete('a', limit=1)) == 1
+
+    def test_memory_is_bounded(self):
+        """Test the build stops at max_patients and reports truncation"""
+        directory = directory_of(PATIENTS, max_patients=2)
+        stats = directory.stats()
+        assert stats['patients'] == 2
+        assert stats['truncated']
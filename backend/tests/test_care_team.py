@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models.database import db_manager
+from app.utils.care_team import CareRelationships
+
+mongomock = pytest.importorskip('mongomock')
+
+@pytest.fixture
+def database(monkeypatch, mongomock_bulk_sort):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    return database
+
+def record(doctor_id, patient_id, **extra):
+    document = {'doctor_id': doctor_id, 'patient_id': patient_id, 'is_deleted': False,
+                'created_at': datetime.utcnow()}
+    document.update(extra)
+    return document
+
+class TestCareRelationships:
+    """Test the materialized care relationship counts"""
+
+    def test_records_counted_per_pair(self, database):
+        """Test uploads and deletes adjust the authored count of each pair"""
+        CareRelationships.records_added([record('d1', 'p1'), record('d1', 'p1'), record('d1', 'p2')])
+        CareRelationships.record_removed(record('d1', 'p2'))
+
+        assert CareRelationships.get('d1', 'p1')['authored'] == 2
+        assert CareRelationships.get('d1', 'p2') is None
+        assert CareRelationships.is_treating('d1', 'p1')
+        assert not CareRelationships.is_treating('d1', 'p2')
+        assert CareRelationships.patient_ids('d1') == ['p1']
+
+    def test_grants_do_not_make_a_treating_doctor(self, database):
+        """Test a grantee has a relationship but is not the treating doctor"""
+        grant = {'grantee_id': 'd2', 'patient_id': 'p1'}
+        CareRelationships.grants_added([grant])
+
+        assert CareRelationships.get('d2', 'p1')['grants'] == 1
+        assert not CareRelationships.is_treating('d2', 'p1')
+        assert CareRelationships.patient_ids('d2') == ['p1']
+
+        CareRelationships.grants_removed([grant])
+        assert CareRelationships.get('d2', 'p1') is None
+        assert CareRelationships.patient_ids('d2') == []
+
+    def test_self_and_incomplete_pairs_skipped(self, database):
+        """Test patients uploading their own records and grants without patient_id are ignored"""
+        CareRelationships.record_added(record('p1', 'p1'))
+        CareRelationships.grants_added([{'grantee_id': 'd1', 'patient_id': None}])
+
+        assert database.care_relationships.count_documents({}) == 0
+
+    def test_rebuild_repairs_drift(self, database):
+        """Test rebuild recounts every pair and drops stale ones"""
+        database.medical_documents.insert_many([
+            record('d1', 'p1'), record('d1', 'p1'), record('d1', 'p2', is_deleted=True)
+        ])
+        database.access_grants.insert_many([
+            {'grantee_id': 'd2', 'patient_id': 'p1', 'is_active': True,
+             'expires_at': datetime.utcnow() + timedelta(days=1)},
+            {'grantee_id': 'd3', 'patient_id': 'p1', 'is_active': True,
+             'expires_at': datetime.utcnow() - timedelta(days=1)}
+        ])
+        CareRelationships._apply({('d1', 'p1'): {'authored': 7}, ('d1', 'p2'): {'authored': 1},
+                                  ('d3', 'p1'): {'grants': 1}})
+
+        assert CareRelationships.rebuild() == 2
+        assert CareRelationships.get('d1', 'p1')['authored'] == 2
+        assert CareRelationships.get('d2', 'p1')['grants'] == 1
+        assert CareRelationships.get('d1', 'p2') is None
+        assert CareRelationships.get('d3', 'p1') is None
+        assert database.care_relationships.count_documents({}) == 2
+
+    def test_rebuild_keeps_concurrent_counts(self, database, monkeypatch):
+        """Test counts applied while the rebuild runs are neither overwritten nor deleted"""
+        database.medical_documents.insert_many([record('d1', 'p1'), record('d1', 'p1')])
+        CareRelationships._apply({('d1', 'p1'): {'authored': 5}})
+        created_at = CareRelationships.get('d1', 'p1')['created_at']
+        recount = CareRelationships._recount
+        uploads = [record('d1', 'p1'), record('d2', 'p2')]
+
+        def upload_during_rebuild(pairs=None):
+            counts = recount(pairs)
+            if pairs is not None and uploads:
+                # Two uploads land between the recount and the write
+                database.medical_documents.insert_many(uploads)
+                CareRelationships.records_added(uploads)
+                uploads.clear()
+            return counts
+
+        monkeypatch.setattr(CareRelationships, '_recount', staticmethod(upload_during_rebuild))
+        CareRelationships.rebuild()
+
+        # The drifted pair changed after it was read, so it is left for the next rebuild
+        assert CareRelationships.get('d1', 'p1')['authored'] == 6
+        assert CareRelationships.get('d2', 'p2')['authored'] == 1
+
+        CareRelationships.rebuild()
+        assert CareRelationships.get('d1', 'p1')['authored'] == 3
+        assert CareRelationships.get('d1', 'p1')['created_at'] == created_at
+
+    def test_built_by_migration(self, database):
+        """Test existing records and grants get their pairs before requests are served"""
+        database.medical_documents.insert_many([record('d1', 'p1')])
+        database.access_grants.insert_one({'grantee_id': 'd2', 'patient_id': 'p1', 'is_active': True,
+                                           'expires_at': datetime.utcnow() + timedelta(days=1)})
+
+        assert 'care_relationships' in db_manager.migrate()
+        assert CareRelationships.is_treating('d1', 'p1')
+        assert CareRelationships.get('d2', 'p1')['grants'] == 1
+
+        # Once applied the migration leaves the counts to the incremental updates
+        database.medical_documents.insert_many([record('d3', 'p1')])
+        assert db_manager.migrate() == []
+        assert CareRelationships.get('d3', 'p1') is None
@@ -0,0 +1,47 @@
+import os
+import pytest
+from app.utils.compression import (
+    CompressionManager, CODEC_IDENTITY, CODEC_ZLIB, CODEC_ZSTD, MIN_COMPRESS_SIZE
+)
+from app.utils.encryption import EncryptionManager
+
+class TestCompression:
+    """Test per-MIME compression of record content"""
+    
+    def test_text_is_compressed_and_restored(self):
+        """Test text reports shrink and round-trip"""
+        data = b'Hemoglobin 13.5 g/dL within normal range. ' * 200
+        packed, codec = CompressionManager.compress(data, 'text/plain')
+        
+        assert codec in (CODEC_ZLIB, CODEC_ZSTD)
+        assert len(packed) < len(data)
+        assert CompressionManager.decompress(packed, codec) == data
+    
+    @pytest.mark.parametrize('mime_type', ['image/jpeg', 'image/png', 'video/mp4'])
+    def test_precompressed_formats_are_skipped(self, mime_type):
+        """Test already-compressed formats are stored as-is"""
+        data = b'\x00' * 4096
+        packed, codec = CompressionManager.compress(data, mime_type)
+        
+        assert codec == CODEC_IDENTITY
+        assert packed == data
+    
+    def test_small_and_incompressible_payloads_fall_back_to_identity(self):
+        """Test payloads that do not shrink are stored as-is"""
+        small = b'a' * (MIN_COMPRESS_SIZE - 1)
+        assert CompressionManager.compress(small, 'text/plain')[1] == CODEC_IDENTITY
+        
+        noise = os.urandom(8192)
+        packed, codec = CompressionManager.compress(noise, 'application/octet-stream')
+        assert codec == CODEC_IDENTITY
+        assert packed == noise
+    
+    def test_encrypt_content_round_trip(self):
+        """Test compression is applied before encryption and undone on decrypt"""
+        key = EncryptionManager.generate_key()
+        data = b'patient_id,test,value\n' + b'12345,GLU,98\n' * 500
+        
+        encrypted, codec = EncryptionManager.encrypt_content(data, key, 'text/csv')
+        
+        assert codec != CODEC_IDENTITY
+        assert EncryptionManager.decrypt_content(encrypted, key, codec) == data
@@ -0,0 +1,146 @@
+import base64
+import inspect
+import time
+from datetime import datetime
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app import create_app
+from app.models.database import db_manager
+from app.utils.delivery import sign_url, verify_signed_url, check_signing_secret, content_disposition
+import app.blueprints.records as records
+
+@pytest.fixture
+def signing_app():
+    app = Flask(__name__)
+    app.config.update(SIGNED_URL_SECRET='secret', SIGNED_URL_TTL=60)
+    return app
+
+class TestSignedUrls:
+    """Test HMAC-signed expiring download URLs"""
+    
+    def test_valid_signature(self, signing_app):
+        """Test a freshly issued URL verifies and names its user"""
+        with signing_app.test_request_context():
+            url, _ = sign_url('/api/records/abc/signed-content', 'user-1')
+        with signing_app.test_request_context(url):
+            from flask import request
+            assert verify_signed_url(request.path, request.args) == 'user-1'
+    
+    def test_tampering_is_rejected(self, signing_app):
+        """Test changing the path or user breaks the signature"""
+        with signing_app.test_request_context():
+            url, _ = sign_url('/api/records/abc/signed-content', 'user-1')
+        query = url.split('?', 1)[1]
+        with signing_app.test_request_context('/api/records/other/signed-content?' + query):
+            from flask import request
+            assert verify_signed_url(request.path, request.args) is None
+        with signing_app.test_request_context(url.replace('user-1', 'user-2')):
+            from flask import request
+            assert verify_signed_url(request.path, request.args) is None
+    
+    def test_expired_url_is_rejected(self, signing_app):
+        """Test URLs past their expiry are rejected"""
+        with signing_app.test_request_context():
+            url, expires = sign_url('/x', 'user-1', ttl=-1)
+            assert expires < time.time()
+        with signing_app.test_request_context(url):
+            from flask import request
+            assert verify_signed_url(request.path, request.args) is None
+    
+    def test_secret_required_outside_development(self):
+        """Test production refuses to sign with the public SECRET_KEY fallback"""
+        with pytest.raises(RuntimeError):
+            check_signing_secret({'DEBUG': False, 'TESTING': False, 'SECRET_KEY': 'public'})
+        check_signing_secret({'DEBUG': False, 'SIGNED_URL_SECRET': 'secret'})
+        check_signing_secret({'TESTING': True})
+        
+        app = Flask(__name__)
+        app.config.update(SECRET_KEY='public', SIGNED_URL_TTL=60)
+        with app.test_request_context(), pytest.raises(RuntimeError):
+            sign_url('/x', 'user-1')
+
+class TestContentDisposition:
+    """Test download headers built from user-supplied file names"""
+    
+    def test_header_injection_is_neutralized(self):
+        """Test quotes and line breaks cannot escape the header value"""
+        header = content_disposition('scan"; x=y\r\nSet-Cookie: a=b.pdf')
+        
+        assert '\r' not in header and '\n' not in header
+        assert header.count('"') == 2
+        assert header.startswith('attachment; filename="scan_xy_Set-Cookie_ab.pdf"; ')
+    
+    def test_non_ascii_names_use_rfc_5987(self):
+        """Test the original name survives in filename* with an ASCII fallback"""
+        header = content_disposition('रिपोर्ट 2024.pdf')
+        
+        assert header == ("attachment; filename=\"2024.pdf\"; "
+                          "filename*=UTF-8''%E0%A4%B0%E0%A4%BF%E0%A4%AA%E0%A5%8B%E0%A4%B0%E0%A5%8D%E0%A4%9F%202024.pdf")
+        assert content_disposition(None) == "attachment; filename=\"document\"; filename*=UTF-8''document"
+
+@pytest.fixture
+def accel_client(tmp_path):
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'app.js').write_text('console.log(1);')
+    app = create_app('testing')
+    app.config.update(FILE_DELIVERY_MODE='accel', FRONTEND_FOLDER=str(tmp_path))
+    return app.test_client()
+
+class TestAccelRedirect:
+    """Test frontend delivery through nginx X-Accel-Redirect"""
+    
+    def test_accel_mode_returns_internal_redirect(self, accel_client):
+        """Test Flask hands the file to nginx instead of sending it"""
+        response = accel_client.get('/js/app.js')
+        
+        assert response.status_code == 200
+        assert response.headers['X-Accel-Redirect'] == '/_frontend/js/app.js'
+        assert response.mimetype in ('text/javascript', 'application/javascript')
+        assert response.data == b''
+    
+    def test_missing_file_is_not_redirected(self, accel_client):
+        """Test unknown or traversing paths return 404 without a redirect"""
+        for path in ('/js/missing.js', '/js/../../config/settings.py'):
+            response = accel_client.get(path)
+            assert response.status_code == 404
+            assert 'X-Accel-Redirect' not in response.headers
+
+class TestSignedDownloadUnderPrefix:
+    """Test signed download links when the app is mounted below a script root"""
+    
+    def test_signed_url_verifies_under_script_name(self, monkeypatch):
+        """Test the issued URL carries the prefix and its signature verifies"""
+        mongomock = pytest.importorskip('mongomock')
+        database = mongomock.MongoClient().db
+        monkeypatch.setattr(db_manager, 'db', database)
+        patient = {'_id': ObjectId(), 'role': 'patient', 'is_active': True}
+        database.users.insert_one(patient)
+        now = datetime.utcnow()
+        document = {'_id': ObjectId(), 'patient_id': str(patient['_id']), 'doctor_id': 'd1',
+                    'content_format': 'inline', 'encrypted_content': base64.b64encode(b'report').decode(),
+                    'encryption_key_id': 'simple_key', 'mime_type': 'text/plain', 'file_name': 'r.txt',
+                    'is_deleted': False, 'created_at': now, 'updated_at': now}
+        database.medical_documents.insert_one(document)
+        monkeypatch.setattr(records, 'get_current_user', lambda: patient)
+        app = create_app('testing')
+        app.config.update(SIGNED_URL_SECRET='secret')
+        document_id = str(document['_id'])
+        
+        with app.test_request_context(f'/api/records/{document_id}/download-url', method='POST',
+                                      base_url='http://localhost/medical'):
+            response, status = inspect.unwrap(records.create_download_url)(document_id)
+        url = response.get_json()['url']
+        assert status == 200
+        assert url.startswith(f'/medical/api/records/{document_id}/signed-content?')
+        
+        response = app.test_client().get(url[len('/medical'):], base_url='http://localhost/medical')
+        assert response.status_code == 200
+        assert response.data == b'report'
+        assert response.headers['Content-Disposition'] == "attachment; filename=\"r.txt\"; filename*=UTF-8''r.txt"
+        
+        # A deactivated user's outstanding links stop working
+        database.users.update_one({'_id': patient['_id']}, {'$set': {'is_active': False}})
+        response = app.test_client().get(url[len('/medical'):], base_url='http://localhost/medical')
+        assert response.status_code == 403
+        assert response.get_json()['error']['code'] == 'INVALID_SIGNATURE'
@@ -0,0 +1,122 @@
+import io
+import time
+from datetime import datetime
+from bson import ObjectId
+import pytest
+from flask import Flask
+from gridfs import GridFSBucket
+from app.models.database import db_manager
+from app.utils.derivatives import render_derivatives, wants_derivatives, queue_derivatives, DERIVATIVE_SIZES
+from app.utils.jobs import JobQueue, Worker
+from app.utils.storage import DocumentStorage, FORMAT_SEGMENTED
+
+Image = pytest.importorskip('PIL.Image')
+fakeredis = pytest.importorskip('fakeredis')
+mongomock = pytest.importorskip('mongomock')
+import mongomock.gridfs  # noqa: E402
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def app(monkeypatch):
+    mongomock.gridfs.enable_gridfs_integration()
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    monkeypatch.setattr(db_manager, 'fs', GridFSBucket(database, bucket_name='document_content'))
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY='test', MASTER_ENCRYPTION_KEY=None,
+                      JOB_VISIBILITY_TIMEOUT=30, JOB_MAX_ATTEMPTS=2, JOB_RETRY_BACKOFF=10)
+    app.redis_client = fakeredis.FakeRedis()
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def queue(app):
+    return JobQueue(app.redis_client, visibility_timeout=30, max_attempts=2, retry_backoff=10)
+
+def upload_image(content: bytes) -> dict:
+    document = {
+        'patient_id': 'patient-1', 'doctor_id': 'doctor-1', 'document_type': 'imaging',
+        'mime_type': 'image/png', 'is_deleted': False, 'created_at': datetime.utcnow(),
+        **DocumentStorage.store([content], 'image/png', 'patient-1')
+    }
+    db_manager.db.medical_documents.insert_one(document)
+    return document
+
+def stored_document(document: dict) -> dict:
+    return db_manager.db.medical_documents.find_one({'_id': document['_id']})
+
+class TestRenderDerivatives:
+    """Test thumbnail and preview rendering"""
+
+    def test_every_kind_fits_its_size(self):
+        """Test each derivative is a JPEG no larger than its longest edge"""
+        rendered = render_derivatives(png(2400, 1200), 'image/png')
+
+        assert set(rendered) == set(DERIVATIVE_SIZES)
+        for kind, max_edge in DERIVATIVE_SIZES.items():
+            image = Image.open(io.BytesIO(rendered[kind]))
+            assert image.format == 'JPEG'
+            assert max(image.size) == max_edge
+
+    def test_unsupported_input_renders_nothing(self):
+        """Test undecodable files produce no derivatives"""
+        assert render_derivatives(b'not an image', 'image/png') == {}
+
+    def test_only_server_readable_imaging_wants_derivatives(self):
+        """Test client-encrypted and non-image records are skipped"""
+        assert wants_derivatives({'content_format': FORMAT_SEGMENTED, 'mime_type': 'image/png'})
+        assert not wants_derivatives({'content_format': 'inline', 'mime_type': 'image/png'})
+        assert not wants_derivatives({'content_format': FORMAT_SEGMENTED, 'mime_type': 'text/plain',
+                                      'document_type': 'lab_result'})
+
+class TestDerivativeJobs:
+    """Test derivative rendering through the job queue"""
+
+    def test_queued_job_stores_derivatives(self, app, queue):
+        """Test a queued document gets its derivatives, queued once per document"""
+        document = upload_image(png(800, 600))
+        queue_derivatives([document, document])
+
+        assert queue.stats()['depth']['ready'] == 1
+        assert Worker(app, queue).run_once()
+
+        derivatives = stored_document(document)['derivatives']
+        assert set(derivatives) == set(DERIVATIVE_SIZES)
+        thumbnail = DocumentStorage.read_all(derivatives['thumbnail'])
+        assert max(Image.open(io.BytesIO(thumbnail)).size) == DERIVATIVE_SIZES['thumbnail']
+
+    def test_failure_backs_off_then_dies(self, app, queue, monkeypatch):
+        """Test a failing render is retried after the backoff and dead after max attempts"""
+        document = upload_image(png(64, 64))
+        queue_derivatives([document])
+
+        def unreadable(document):
+            raise IOError('GridFS unavailable')
+
+        monkeypatch.setattr(DocumentStorage, 'read_all', unreadable)
+        worker = Worker(app, queue)
+
+        assert worker.run_once()
+        retry_at = app.redis_client.zscore(queue.scheduled_key, f"derivatives:{document['_id']}")
+        assert retry_at == pytest.approx(time.time() + 10, abs=2)
+        assert not worker.run_once()  # not due yet
+
+        app.redis_client.zadd(queue.scheduled_key, {f"derivatives:{document['_id']}": 0})
+        assert worker.run_once()
+        assert queue.stats()['depth']['dead'] == 1
+        assert 'derivatives' not in stored_document(document)
+
+    def test_unacknowledged_job_is_redelivered(self, app):
+        """Test a job leased by a crashed worker runs again after its visibility timeout"""
+        queue = JobQueue(app.redis_client, visibility_timeout=0, max_attempts=2)
+        document = upload_image(png(64, 64))
+        queue_derivatives([document])
+
+        assert queue.dequeue() is not None  # leased, then the worker dies
+        time.sleep(0.01)
+        assert Worker(app, queue).run_once()
+        assert set(stored_document(document)['derivatives']) == set(DERIVATIVE_SIZES)
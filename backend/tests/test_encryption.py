@@ -0,0 +1,113 @@
+import base64
+import time
+import pytest
+from cryptography.fernet import Fernet
+from flask import Flask
+from app.utils.encryption import (
+    DataKey, DataKeyCache, KeyManager, DATA_KEY_ALGORITHM, LEGACY_KEY_ALGORITHM
+)
+from app.utils.metrics import metrics
+
+def make_entry():
+    raw_key = bytearray(b'k' * 32)
+    return raw_key, Fernet(Fernet.generate_key())
+
+class TestDataKeyCache:
+    """Test the LRU of unwrapped data keys"""
+    
+    def setup_method(self):
+        metrics.reset()
+    
+    def test_hit_and_miss_are_counted(self):
+        """Test cache lookups update hit/miss metrics"""
+        cache = DataKeyCache(max_size=4, ttl=60)
+        raw_key, cipher = make_entry()
+        
+        assert cache.get('doc-key') is None
+        cache.put('doc-key', raw_key, cipher)
+        assert cache.get('doc-key') is cipher
+        
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+    
+    def test_lru_eviction_zeroizes_key(self):
+        """Test the least recently used key is evicted and wiped"""
+        cache = DataKeyCache(max_size=2, ttl=60)
+        entries = {name: make_entry() for name in ('a', 'b', 'c')}
+        
+        cache.put('a', *entries['a'])
+        cache.put('b', *entries['b'])
+        cache.get('a')
+        cache.put('c', *entries['c'])
+        
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert entries['b'][0] == bytearray(32)
+        assert cache.stats()['evictions'] == 1
+    
+    def test_expired_keys_are_dropped(self):
+        """Test entries past their TTL are treated as misses"""
+        cache = DataKeyCache(max_size=2, ttl=0.01)
+        raw_key, cipher = make_entry()
+        cache.put('doc-key', raw_key, cipher)
+        
+        time.sleep(0.02)
+        
+        assert cache.get('doc-key') is None
+        assert raw_key == bytearray(32)
+        assert cache.stats()['expirations'] == 1
+
+class TestMasterKey:
+    """Test the master key is never derived from SECRET_KEY in production"""
+    
+    def make_app(self, **config):
+        app = Flask(__name__)
+        app.config.update({'SECRET_KEY': 'public-default', 'MASTER_ENCRYPTION_KEY': None, **config})
+        return app
+    
+    def setup_method(self):
+        KeyManager._master_source = None
+    
+    def test_production_requires_master_key(self):
+        """Test a missing key raises outside development and testing"""
+        app = self.make_app(DEBUG=False, TESTING=False)
+        with pytest.raises(RuntimeError):
+            KeyManager.check_master_key(app.config)
+        with app.app_context():
+            with pytest.raises(RuntimeError):
+                KeyManager.get_master_cipher()
+    
+    def test_testing_may_derive_master_key(self):
+        """Test development and testing fall back to a derived key"""
+        app = self.make_app(TESTING=True)
+        with app.app_context():
+            wrapped = KeyManager.wrap_key(bytearray(b'k' * 32))
+            assert KeyManager.unwrap_key(wrapped) == bytearray(b'k' * 32)
+    
+    def test_configured_key_is_used(self):
+        """Test an explicit master key is accepted in production"""
+        app = self.make_app(DEBUG=False, MASTER_ENCRYPTION_KEY=Fernet.generate_key().decode())
+        assert KeyManager.check_master_key(app.config)
+        with app.app_context():
+            assert KeyManager.get_master_cipher() is not None
+
+class TestDataKeyAlgorithms:
+    """Test a data key serves one cipher only"""
+    
+    def test_new_keys_are_aes_gcm_only(self):
+        """Test fresh keys are labelled AES-256-GCM and build no Fernet"""
+        key_data = KeyManager.generate_document_key()
+        assert key_data['algorithm'] == DATA_KEY_ALGORITHM
+        
+        data_key = DataKey(key_data['raw_key'], key_data['algorithm'])
+        assert data_key.fernet is None
+        assert data_key.aead is not None
+    
+    def test_legacy_keys_still_read_fernet_records(self):
+        """Test keys issued before segmented content keep their Fernet"""
+        raw_key = bytearray(b'k' * 32)
+        token = Fernet(base64.urlsafe_b64encode(bytes(raw_key))).encrypt(b'legacy')
+        
+        data_key = DataKey(raw_key, LEGACY_KEY_ALGORITHM)
+        assert data_key.fernet.decrypt(token) == b'legacy'
@@ -0,0 +1,99 @@
+import os
+import threading
+from datetime import datetime
+from bson import ObjectId
+import inspect
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+import app.blueprints.access as access
+
+fakeredis = pytest.importorskip('fakeredis')
+
+def grants_database():
+    """A real MongoDB when TEST_MONGODB_URI is set, otherwise mongomock"""
+    uri = os.getenv('TEST_MONGODB_URI')
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+        database = client.get_database(f'grant_concurrency_{ObjectId()}')
+        return database, lambda: client.drop_database(database.name)
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient().db, lambda: None
+
+@pytest.fixture
+def shared_record(monkeypatch):
+    database, cleanup = grants_database()
+    monkeypatch.setattr(db_manager, 'db', database)
+    db_manager._create_grant_unique_index()
+    db_manager._create_patient_grant_unique_index()
+    
+    patient = {'_id': ObjectId(), 'role': 'patient', 'is_active': True}
+    doctor = {'_id': ObjectId(), 'role': 'doctor', 'is_active': True}
+    database.users.insert_many([patient, doctor])
+    document_id = database.medical_documents.insert_one({
+        'patient_id': str(patient['_id']), 'doctor_id': str(ObjectId()),
+        'document_type': 'lab_result', 'is_deleted': False, 'created_at': datetime.utcnow()
+    }).inserted_id
+    monkeypatch.setattr(access, 'get_current_user', lambda: patient)
+    
+    app = Flask(__name__)
+    app.redis_client = fakeredis.FakeRedis()
+    yield app, database, str(document_id), str(doctor['_id']), str(patient['_id'])
+    cleanup()
+
+class TestConcurrentGrants:
+    """Test parallel grants of the same document to the same user"""
+    
+    def test_exactly_one_active_grant(self, shared_record):
+        """Test racing grants create one row and report the rest as updates"""
+        app, database, document_id, grantee_id, _ = shared_record
+        view = inspect.unwrap(access.grant_access)
+        workers = 8
+        barrier = threading.Barrier(workers)
+        results = []
+        
+        def grant():
+            body = {'document_id': document_id, 'grantee_id': grantee_id, 'access_level': 'read'}
+            with app.test_request_context(json=body):
+                barrier.wait()
+                response, status = view()
+                results.append((status, response.get_json()))
+        
+        threads = [threading.Thread(target=grant) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sorted(status for status, _ in results) == [200] * (workers - 1) + [201]
+        assert sum(1 for _, body in results if body['created']) == 1
+        assert len({body['grant_id'] for _, body in results}) == 1
+        assert database.access_grants.count_documents(
+            {'grantee_id': grantee_id, 'document_id': document_id, 'is_active': True}) == 1
+    
+    def test_exactly_one_active_patient_grant(self, shared_record):
+        """Test racing patient-scoped grants with the same scope create one row"""
+        app, database, _, grantee_id, patient_id = shared_record
+        view = inspect.unwrap(access.grant_patient_access)
+        workers = 8
+        barrier = threading.Barrier(workers)
+        results = []
+        
+        def grant():
+            body = {'grantee_id': grantee_id, 'access_level': 'read', 'document_types': ['lab_result']}
+            with app.test_request_context(json=body):
+                barrier.wait()
+                response, status = view()
+                results.append((status, response.get_json()))
+        
+        threads = [threading.Thread(target=grant) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sorted(status for status, _ in results) == [200] * (workers - 1) + [201]
+        assert len({body['grant_id'] for _, body in results}) == 1
+        assert database.access_grants.count_documents(
+            {'grantee_id': grantee_id, 'patient_id': patient_id, 'is_active': True}) == 1
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+from app.models.schemas import (
+    AccessGrantSchema, AccessLevel, GRANT_NO_EXPIRY, grant_expiry, public_grant_expiry
+)
+from app.utils.access_cache import AccessCache
+from app.utils.care_team import CareRelationships
+from app.utils.grant_expiry import GrantExpiry
+
+fakeredis = pytest.importorskip('fakeredis')
+mongomock = pytest.importorskip('mongomock')
+
+class TestGrantExpirySentinel:
+    """Test the stored no-expiry sentinel on access grants"""
+    
+    def test_grants_without_expiry_store_the_sentinel(self):
+        """Test expires_at > now holds for grants that never expire"""
+        grant = AccessGrantSchema('p1', 'd1', 'doc1', AccessLevel.READ)
+        assert grant.expires_at == GRANT_NO_EXPIRY
+        assert grant.expires_at > datetime.utcnow()
+    
+    def test_explicit_expiry_is_kept(self):
+        """Test a real expiry is stored unchanged"""
+        expires_at = datetime(2030, 1, 1)
+        assert grant_expiry(expires_at) == expires_at
+        assert AccessGrantSchema('p1', 'd1', 'doc1', AccessLevel.READ,
+                                 expires_at=expires_at).expires_at == expires_at
+    
+    def test_sentinel_is_hidden_from_clients(self):
+        """Test clients keep seeing null for grants that never expire"""
+        assert public_grant_expiry(GRANT_NO_EXPIRY) is None
+        assert public_grant_expiry(None) is None
+        assert public_grant_expiry(datetime(2030, 1, 1)) == datetime(2030, 1, 1)
+    
+    def test_grants_carry_document_fields(self):
+        """Test patient_id and document_type are stored for patient-scoped lookups"""
+        grant = AccessGrantSchema('p1', 'd1', 'doc1', AccessLevel.READ,
+                                  patient_id='p1', document_type='lab_result')
+        assert grant.__dict__['patient_id'] == 'p1'
+        assert grant.__dict__['document_type'] == 'lab_result'
+
+@pytest.fixture
+def app(monkeypatch, mongomock_bulk_sort):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    app = Flask(__name__)
+    app.config.update(TESTING=True, ACCESS_CACHE_TTL=300)
+    app.redis_client = fakeredis.FakeRedis()
+    with app.app_context():
+        yield app
+
+def expired_grant(grantee_id: str, document_id: str) -> dict:
+    grant = {'grantor_id': 'p1', 'grantee_id': grantee_id, 'document_id': document_id,
+             'patient_id': 'p1', 'is_active': True, 'expires_at': datetime.utcnow() - timedelta(minutes=1)}
+    db_manager.db.access_grants.insert_one(grant)
+    CareRelationships.grants_added([grant])
+    AccessCache.put(grantee_id, document_id, True, AccessCache.version(grantee_id))
+    return grant
+
+class TestGrantExpirySweep:
+    """Test the periodic deactivation of expired grants"""
+
+    def test_expired_grants_are_deactivated_and_audited(self, app):
+        """Test each expired grant is deactivated, uncounted, uncached and audited once"""
+        grant = expired_grant('d1', 'doc1')
+
+        assert GrantExpiry.sweep(batch_size=10, max_batches=2) == 1
+
+        assert db_manager.db.access_grants.find_one({'_id': grant['_id']})['is_active'] is False
+        assert CareRelationships.get('d1', 'p1') is None
+        assert AccessCache.get('d1', 'doc1') is None
+        assert db_manager.db.audit_logs.count_documents({'action': 'ACCESS_EXPIRED'}) == 1
+
+    def test_grant_renewed_during_the_sweep_is_untouched(self, app, monkeypatch):
+        """Test a grant renewed between the fetch and the update keeps its side effects"""
+        renewed = expired_grant('d1', 'doc1')
+        expired = expired_grant('d2', 'doc2')
+        find_many = db_manager.find_many
+
+        def renew_after_fetch(collection, filter_dict, **kwargs):
+            grants = find_many(collection, filter_dict, **kwargs)
+            db_manager.db.access_grants.update_one(
+                {'_id': renewed['_id']},
+                {'$set': {'expires_at': datetime.utcnow() + timedelta(days=1)}})
+            return grants
+
+        monkeypatch.setattr(db_manager, 'find_many', renew_after_fetch)
+        GrantExpiry.sweep_batch(10)
+
+        assert db_manager.db.access_grants.find_one({'_id': renewed['_id']})['is_active'] is True
+        assert CareRelationships.get('d1', 'p1')['grants'] == 1
+        assert AccessCache.get('d1', 'doc1') is True
+        audits = list(db_manager.db.audit_logs.find({'action': 'ACCESS_EXPIRED'}))
+        assert [audit['details']['grant_id'] for audit in audits] == [str(expired['_id'])]
+        assert CareRelationships.get('d2', 'p1') is None
@@ -0,0 +1,49 @@
+from datetime import datetime
+from bson import ObjectId
+from app.utils.grant_scopes import scoped_grant_covers, scoped_grant_filter, granted_documents_filter
+
+LABS_2024 = {
+    'scope': 'patient',
+    'patient_id': 'p1',
+    'document_types': ['lab_result'],
+    'records_from': datetime(2024, 1, 1),
+    'records_to': datetime(2025, 1, 1)
+}
+
+def document(**fields):
+    base = {'_id': ObjectId(), 'patient_id': 'p1', 'document_type': 'lab_result',
+            'created_at': datetime(2024, 6, 1)}
+    base.update(fields)
+    return base
+
+class TestGrantScopes:
+    """Test evaluation of patient-scoped grants"""
+    
+    def test_covers_matching_documents(self):
+        """Test category and window narrow a patient-scoped grant"""
+        assert scoped_grant_covers(LABS_2024, document())
+        assert not scoped_grant_covers(LABS_2024, document(patient_id='p2'))
+        assert not scoped_grant_covers(LABS_2024, document(document_type='imaging'))
+        assert not scoped_grant_covers(LABS_2024, document(created_at=datetime(2025, 1, 1)))
+        assert scoped_grant_covers({'scope': 'patient', 'patient_id': 'p1'},
+                                   document(document_type='imaging'))
+    
+    def test_filter_matches_in_memory_check(self):
+        """Test the query form of a scoped grant"""
+        assert scoped_grant_filter(LABS_2024) == {
+            'patient_id': 'p1',
+            'document_type': {'$in': ['lab_result']},
+            'created_at': {'$gte': datetime(2024, 1, 1), '$lt': datetime(2025, 1, 1)}
+        }
+    
+    def test_mixed_grants_become_or_clauses(self):
+        """Test document grants collapse into one $in next to scoped clauses"""
+        first, second = str(ObjectId()), str(ObjectId())
+        clauses = granted_documents_filter([
+            {'document_id': first}, {'document_id': second}, LABS_2024
+        ])
+        assert clauses == [
+            scoped_grant_filter(LABS_2024),
+            {'_id': {'$in': [ObjectId(first), ObjectId(second)]}}
+        ]
+        assert granted_documents_filter([]) == []
@@ -0,0 +1,97 @@
+import hashlib
+import pytest
+from flask import Flask, jsonify, request
+from flask_jwt_extended import JWTManager, create_access_token
+from app.utils.idempotency import idempotent
+
+fakeredis = pytest.importorskip('fakeredis')
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(
+        JWT_SECRET_KEY='test-secret-key-that-is-long-enough',
+        IDEMPOTENCY_TTL=60,
+        IDEMPOTENCY_LOCK_TIMEOUT=5,
+        IDEMPOTENCY_WAIT_SECONDS=0.1
+    )
+    JWTManager(app)
+    app.redis_client = fakeredis.FakeRedis()
+    app.calls = []
+    
+    @app.route('/create', methods=['POST'])
+    @idempotent('test.create')
+    def create():
+        app.calls.append(request.get_json())
+        return jsonify({'id': len(app.calls)}), 201
+    
+    @app.route('/fail', methods=['POST'])
+    @idempotent('test.fail')
+    def fail():
+        app.calls.append('fail')
+        return jsonify({'error': 'boom'}), 500
+    
+    return app
+
+def auth_headers(app, identity='user-1', key='retry-1'):
+    with app.app_context():
+        token = create_access_token(identity=identity)
+    return {'Authorization': f'Bearer {token}', 'Idempotency-Key': key}
+
+class TestIdempotency:
+    """Test Idempotency-Key handling"""
+    
+    def test_replay_returns_first_response(self, app):
+        """Test a retried request is answered from the cache"""
+        client = app.test_client()
+        headers = auth_headers(app)
+        
+        first = client.post('/create', json={'n': 1}, headers=headers)
+        second = client.post('/create', json={'n': 1}, headers=headers)
+        
+        assert first.status_code == second.status_code == 201
+        assert second.get_json() == first.get_json()
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        assert len(app.calls) == 1
+    
+    def test_keys_are_scoped_per_user(self, app):
+        """Test the same key from different users runs twice"""
+        client = app.test_client()
+        client.post('/create', json={}, headers=auth_headers(app, identity='a'))
+        client.post('/create', json={}, headers=auth_headers(app, identity='b'))
+        assert len(app.calls) == 2
+    
+    def test_without_key_runs_every_time(self, app):
+        """Test requests without the header are not deduplicated"""
+        client = app.test_client()
+        headers = auth_headers(app)
+        del headers['Idempotency-Key']
+        client.post('/create', json={}, headers=headers)
+        client.post('/create', json={}, headers=headers)
+        assert len(app.calls) == 2
+    
+    def test_server_errors_are_not_cached(self, app):
+        """Test a 500 can be retried with the same key"""
+        client = app.test_client()
+        headers = auth_headers(app)
+        client.post('/fail', headers=headers)
+        client.post('/fail', headers=headers)
+        assert app.calls == ['fail', 'fail']
+    
+    def test_concurrent_duplicate_gets_conflict(self, app):
+        """Test a request finding the lock held is rejected once the wait runs out"""
+        client = app.test_client()
+        digest = hashlib.sha256(b'retry-1').hexdigest()
+        # Simulate a first request that is still in flight
+        app.redis_client.set(f'idempotency:test.create:user-1:{digest}:lock', 'other-request')
+        
+        response = client.post('/create', json={}, headers=auth_headers(app))
+        assert response.status_code == 409
+        assert response.get_json()['error']['code'] == 'IDEMPOTENCY_IN_PROGRESS'
+        assert app.calls == []
+    
+    def test_invalid_key_rejected(self, app):
+        """Test oversized keys are rejected"""
+        client = app.test_client()
+        response = client.post('/create', json={}, headers=auth_headers(app, key='x' * 300))
+        assert response.status_code == 400
@@ -0,0 +1,148 @@
+import base64
+import inspect
+import io
+import json
+from bson import ObjectId
+import pytest
+from flask import Flask
+from gridfs import GridFSBucket
+from app.models.database import db_manager
+from app.utils.ingest import BulkIngestor, IngestFormatError, _parse_entries
+import app.blueprints.records as records
+
+mongomock = pytest.importorskip('mongomock')
+import mongomock.gridfs  # noqa: E402
+
+def ingestor(max_items=10):
+    return BulkIngestor({'_id': 'doctor-1'}, max_items)
+
+class TestBulkIngestParsing:
+    """Test parsing of bulk ingestion bodies"""
+    
+    def test_manifest_accepts_array_and_ndjson(self):
+        """Test both manifest encodings give the same entries"""
+        entries = [{'title': 'a'}, {'title': 'b'}]
+        assert _parse_entries(json.dumps(entries)) == entries
+        assert _parse_entries('\n'.join(json.dumps(e) for e in entries) + '\n\n') == entries
+    
+    def test_ndjson_spools_decoded_content(self):
+        """Test base64 content is decoded into a spool and removed from metadata"""
+        bulk = ingestor()
+        body = json.dumps({'title': 'a', 'file_content': 'aGVsbG8='}) + '\n'
+        bulk.parse_ndjson(io.BytesIO(body.encode()))
+        
+        item = bulk.items[0]
+        assert 'file_content' not in item.metadata
+        item.content.seek(0)
+        assert item.content.read() == b'hello'
+        bulk.close()
+    
+    def test_ndjson_per_item_errors(self):
+        """Test bad entries are flagged without failing the batch"""
+        bulk = ingestor()
+        body = '\n'.join([
+            json.dumps({'title': 'a'}),
+            json.dumps({'title': 'b', 'file_content': '***'}),
+            json.dumps(['not', 'an', 'object'])
+        ])
+        bulk.parse_ndjson(io.BytesIO(body.encode()))
+        
+        assert bulk.items[0].errors == ['Missing required field: file_content']
+        assert bulk.items[1].errors == ['file_content must be base64 encoded']
+        assert bulk.items[2].errors == ['Entry must be a JSON object']
+    
+    def test_batch_size_limit(self):
+        """Test batches larger than the limit are rejected"""
+        bulk = ingestor(max_items=2)
+        body = '\n'.join(json.dumps({'title': str(i), 'file_content': 'YQ=='}) for i in range(3))
+        with pytest.raises(IngestFormatError):
+            bulk.parse_ndjson(io.BytesIO(body.encode()))
+        bulk.close()
+    
+    def test_malformed_line_rejects_batch(self):
+        """Test unparseable JSON fails the whole request"""
+        with pytest.raises(IngestFormatError):
+            ingestor().parse_ndjson(io.BytesIO(b'{"title": "a"}\n{oops\n'))
+
+DOCTOR = {'_id': ObjectId(), 'role': 'doctor'}
+
+@pytest.fixture
+def bulk_app(monkeypatch, mongomock_bulk_sort):
+    mongomock.gridfs.enable_gridfs_integration()
+    database = mongomock.MongoClient().db
+    database.medical_documents.create_index('ingest_key', unique=True, sparse=True)
+    patients = [{'_id': ObjectId(), 'role': 'patient', 'is_active': True} for _ in range(2)]
+    database.users.insert_many(patients)
+    monkeypatch.setattr(db_manager, 'db', database)
+    monkeypatch.setattr(db_manager, 'fs', GridFSBucket(database, bucket_name='document_content'))
+
+    inserts = []
+    insert_many = database.medical_documents.insert_many
+    monkeypatch.setattr(database.medical_documents, 'insert_many',
+                        lambda documents, **kwargs: inserts.append(len(documents)) or
+                        insert_many(documents, **kwargs))
+
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY='test', MASTER_ENCRYPTION_KEY=None,
+                      BULK_INGEST_MAX_ITEMS=4)
+    with app.app_context():
+        yield app, database, [str(patient['_id']) for patient in patients], inserts
+
+def post_ndjson(app, entries):
+    body = '\n'.join(json.dumps(entry) for entry in entries)
+    view = inspect.unwrap(records.bulk_ingest_records)
+    with app.test_request_context('/api/records/bulk', method='POST', data=body,
+                                  content_type='application/x-ndjson'):
+        response, status = view(DOCTOR)
+    return response.get_json(), status
+
+def entry(patient_id, key, **fields):
+    return {'patient_id': patient_id, 'document_type': 'lab_result', 'title': f'Report {key}',
+            'mime_type': 'text/plain', 'idempotency_key': key,
+            'file_content': base64.b64encode(f'result {key}'.encode()).decode(), **fields}
+
+class TestBulkIngestEndpoint:
+    """Test POST /api/records/bulk"""
+
+    def test_batch_is_one_insert_with_per_item_status(self, bulk_app):
+        """Test valid entries go in with one insert_many and bad ones are reported"""
+        app, database, patient_ids, inserts = bulk_app
+
+        body, status = post_ndjson(app, [entry(patient_ids[0], 'a'), entry(patient_ids[1], 'b'),
+                                         entry(patient_ids[0], 'c', document_type='x-ray'),
+                                         entry(str(ObjectId()), 'd')])
+
+        assert status == 200
+        assert [item['status'] for item in body['results']] == ['created', 'created', 'invalid', 'invalid']
+        assert body['results'][3]['errors'] == ['Patient not found']
+        assert (body['created'], body['duplicates'], body['failed']) == (2, 0, 2)
+        assert inserts == [2]
+        assert database.medical_documents.count_documents({}) == 2
+        assert database.audit_logs.count_documents({'action': 'DOCUMENT_UPLOADED'}) == 2
+
+    def test_retried_batch_reports_duplicates(self, bulk_app):
+        """Test entries already ingested under their idempotency_key are not stored again"""
+        app, database, patient_ids, inserts = bulk_app
+        batch = [entry(patient_ids[0], 'a'), entry(patient_ids[1], 'b')]
+        first, _ = post_ndjson(app, batch)
+
+        retry, status = post_ndjson(app, batch + [entry(patient_ids[1], 'c')])
+
+        assert status == 200
+        assert [item['status'] for item in retry['results']] == ['duplicate', 'duplicate', 'created']
+        assert [item['document_id'] for item in retry['results'][:2]] == \
+            [item['document_id'] for item in first['results']]
+        assert inserts == [2, 1]
+        assert database.medical_documents.count_documents({}) == 3
+        assert database['document_content.files'].count_documents({}) == 3
+
+    def test_max_items_is_enforced(self, bulk_app):
+        """Test a batch over BULK_INGEST_MAX_ITEMS is rejected before anything is stored"""
+        app, database, patient_ids, inserts = bulk_app
+
+        body, status = post_ndjson(app, [entry(patient_ids[0], str(i)) for i in range(5)])
+
+        assert status == 400
+        assert body['error']['code'] == 'VALIDATION_ERROR'
+        assert inserts == []
+        assert database['document_content.files'].count_documents({}) == 0
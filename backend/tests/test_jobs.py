@@ -0,0 +1,105 @@
+import time
+import pytest
+from flask import Flask
+import app.utils.jobs as jobs
+from app.utils.jobs import JobQueue, Worker, job_handler, JOB_HANDLERS
+
+fakeredis = pytest.importorskip('fakeredis')
+
+calls = []
+
+@job_handler('test.record')
+def record_job(value):
+    calls.append(value)
+
+@job_handler('test.tick')
+def tick_job():
+    calls.append('tick')
+
+@job_handler('test.explode')
+def explode_job():
+    raise RuntimeError('boom')
+
+@pytest.fixture
+def queue():
+    calls.clear()
+    return JobQueue(fakeredis.FakeRedis(), name='test', visibility_timeout=30,
+                    max_attempts=2, retry_backoff=10)
+
+@pytest.fixture
+def worker(queue):
+    return Worker(Flask(__name__), queue)
+
+class TestJobQueue:
+    """Test the Redis job queue"""
+    
+    def test_enqueue_and_run(self, queue, worker):
+        """Test a queued job is run once and acknowledged"""
+        assert queue.enqueue('test.record', 'a')
+        assert worker.run_once() is True
+        assert worker.run_once() is False
+        assert calls == ['a']
+        
+        stats = queue.stats()
+        assert stats['depth'] == {'ready': 0, 'scheduled': 0, 'inflight': 0, 'dead': 0}
+        assert stats['succeeded'] == 1
+    
+    def test_enqueue_is_idempotent_per_job_id(self, queue, worker):
+        """Test a pending job id is only queued once"""
+        assert queue.enqueue('test.record', 'a', job_id='same') == 'same'
+        assert queue.enqueue('test.record', 'a', job_id='same') is None
+        worker.run_once()
+        assert worker.run_once() is False
+        assert calls == ['a']
+    
+    def test_scheduled_job_waits_until_due(self, queue):
+        """Test delayed jobs are not delivered early"""
+        queue.enqueue('test.record', 'later', delay=60)
+        assert queue.dequeue() is None
+        assert queue.stats()['depth']['scheduled'] == 1
+    
+    def test_unacknowledged_job_is_redelivered(self, queue):
+        """Test a job whose visibility timeout expired is delivered again"""
+        queue.visibility_timeout = 0
+        queue.enqueue('test.record', 'a')
+        job, attempts = queue.dequeue()
+        assert attempts == 1
+        
+        time.sleep(0.01)
+        job_again, attempts = queue.dequeue()
+        assert job_again['id'] == job['id']
+        assert attempts == 2
+    
+    def test_failed_job_retries_with_backoff_then_dies(self, queue, worker):
+        """Test failures are rescheduled and dead-lettered after max attempts"""
+        queue.enqueue('test.explode', job_id='bad')
+        worker.run_once()
+        assert queue.stats()['depth']['scheduled'] == 1
+        retry_at = queue.redis.zscore(queue.scheduled_key, 'bad')
+        assert retry_at >= time.time() + 9
+        
+        # Make the retry due now
+        queue.redis.zadd(queue.scheduled_key, {'bad': 0})
+        worker.run_once()
+        stats = queue.stats()
+        assert stats['depth']['dead'] == 1
+        assert stats['depth']['scheduled'] == 0
+        assert stats['failed'] == 2
+    
+    def test_unknown_job_name_fails(self, queue, worker):
+        """Test jobs without a handler are treated as failures"""
+        assert 'test.missing' not in JOB_HANDLERS
+        queue.enqueue('test.missing')
+        worker.run_once()
+        assert queue.stats()['failed'] == 1
+    
+    def test_periodic_job_runs_once_per_slot(self, queue, worker, monkeypatch):
+        """Test an acknowledged periodic job is not enqueued again in the same slot"""
+        monkeypatch.setattr(jobs, 'PERIODIC_JOBS', {'test.tick': 86400})
+        
+        for _ in range(5):
+            worker.schedule_periodic()
+            worker.run_once()
+        
+        assert calls == ['tick']
+        assert queue.redis.ttl(f'{queue.periodic_prefix}:test.tick:{int(time.time() // 86400)}') > 0
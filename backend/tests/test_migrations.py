@@ -0,0 +1,40 @@
+import pytest
+from app.models.database import db_manager
+
+mongomock = pytest.importorskip('mongomock')
+
+@pytest.fixture
+def database(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    return database
+
+class TestMigrate:
+    """Test the one-shot data migrations"""
+
+    def test_each_migration_runs_once(self, database, monkeypatch):
+        """Test applied migrations are recorded and skipped afterwards"""
+        names = [name for name, _ in db_manager.MIGRATIONS]
+
+        assert db_manager.migrate() == names
+        assert sorted(m['_id'] for m in database.schema_migrations.find()) == sorted(names)
+
+        monkeypatch.setattr(db_manager, '_backfill_search_terms', lambda: pytest.fail('ran again'))
+        assert db_manager.migrate() == []
+
+    def test_failed_migration_is_retried(self, database, monkeypatch):
+        """Test a migration that raises is left unrecorded for the next run"""
+        interrupted = [True]
+
+        def backfill():
+            if interrupted.pop():
+                raise RuntimeError('interrupted')
+
+        monkeypatch.setattr(db_manager, '_backfill_search_terms', backfill)
+        with pytest.raises(RuntimeError):
+            db_manager.migrate()
+        assert database.schema_migrations.find_one({'_id': 'user_search_terms'}) is None
+        assert database.schema_migrations.find_one({'_id': 'grant_expiry_sentinel'}) is not None
+
+        interrupted.append(False)
+        assert db_manager.migrate() == ['user_search_terms', 'care_relationships']
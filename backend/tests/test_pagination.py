@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+import inspect
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
+import app.blueprints.records as records
+
+mongomock = pytest.importorskip('mongomock')
+
+class TestCursor:
+    """Test opaque keyset pagination cursors"""
+    
+    def test_round_trip(self):
+        """Test a position survives encoding"""
+        position = {'score': 1.25, 'id': '64b7f0c2a1b2c3d4e5f60718'}
+        cursor = encode_cursor(position)
+        assert '=' not in cursor
+        assert decode_cursor(cursor, 'score', 'id') == position
+    
+    def test_missing_field_rejected(self):
+        """Test cursors without the expected keys are rejected"""
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(encode_cursor({'id': 'x'}), 'score', 'id')
+    
+    def test_garbage_rejected(self):
+        """Test undecodable cursors are rejected"""
+        with pytest.raises(InvalidCursorError):
+            decode_cursor('%%%not-a-cursor', 'id')
+
+def text_score(document: dict, terms: list) -> float:
+    """Approximate the document_text index: title matches weigh 3, description matches 1"""
+    title, description = document['title'].lower().split(), document['description'].lower().split()
+    return float(sum(3 * title.count(term) + description.count(term) for term in terms))
+
+def text_aggregate(database):
+    """db_manager.aggregate for a mongomock database, which has no $text support
+
+    The $text clause of the first $match is scored in Python; the rest of
+    the filter and every later stage run in mongomock.
+    """
+    def aggregate(collection, pipeline):
+        match = pipeline[0]['$match']
+        clauses = match['$and'] if '$and' in match else [match]
+        terms = next(clause['$text']['$search'] for clause in clauses if '$text' in clause).lower().split()
+        remaining = [{k: v for k, v in clause.items() if k != '$text'} for clause in clauses]
+        assert pipeline[1] == {'$addFields': {'score': {'$meta': 'textScore'}}}
+
+        staging = mongomock.MongoClient().db.staging
+        for document in database[collection].find({'$and': remaining}):
+            score = text_score(document, terms)
+            if score:
+                staging.insert_one({**document, 'score': score})
+        return list(staging.aggregate(pipeline[2:]))
+    return aggregate
+
+@pytest.fixture
+def search_app(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    monkeypatch.setattr(db_manager, 'aggregate', text_aggregate(database))
+    doctor = {'_id': ObjectId(), 'role': 'doctor'}
+    monkeypatch.setattr(records, 'get_current_user', lambda: doctor)
+
+    now = datetime.utcnow()
+
+    def add(doctor_id, title, description, **fields):
+        document = {'_id': ObjectId(), 'patient_id': 'p1', 'doctor_id': doctor_id,
+                    'document_type': 'imaging', 'title': title, 'description': description,
+                    'encryption_key_id': 'simple_key', 'file_size': 1, 'mime_type': 'image/png',
+                    'checksum': 'x', 'is_deleted': False, 'created_at': now, 'updated_at': now, **fields}
+        database.medical_documents.insert_one(document)
+        return str(document['_id'])
+
+    own = str(doctor['_id'])
+    readable = [
+        add(own, 'Fracture fracture review', 'fracture of the wrist'),
+        add(own, 'Wrist fracture', 'healing well'),
+        add(own, 'Wrist fracture', 'healing slowly'),
+        add(own, 'Follow up', 'no fracture visible'),
+        add(own, 'Follow up', 'old fracture'),
+    ]
+    shared = add('other-doctor', 'Fracture clinic', 'fracture fracture')
+    readable.insert(1, shared)
+    database.access_grants.insert_one({
+        'document_id': shared, 'grantee_id': own, 'patient_id': 'p1', 'scope': 'document',
+        'is_active': True, 'expires_at': now + timedelta(days=1)
+    })
+    hidden = [add('other-doctor', 'Fracture fracture fracture', 'fracture'),
+              add(own, 'Fracture', 'deleted record', is_deleted=True)]
+    add(own, 'Blood panel', 'normal ranges')
+
+    app = Flask(__name__)
+    with app.app_context():
+        yield app, readable, hidden
+
+def search(app, **args):
+    view = inspect.unwrap(records.search_records)
+    with app.test_request_context('/api/records/search', query_string=args):
+        response, status = view()
+    assert status == 200
+    return response.get_json()
+
+class TestRecordSearch:
+    """Test GET /api/records/search"""
+
+    def test_results_ranked_and_authorized(self, search_app):
+        """Test readable matches come back by text score, unreadable ones never"""
+        app, readable, hidden = search_app
+
+        body = search(app, q='fracture', limit=50)
+
+        ids = [result['id'] for result in body['results']]
+        scores = [result['score'] for result in body['results']]
+        assert set(ids) == set(readable)
+        assert ids[0] == readable[0]  # title matches outweigh description matches
+        assert scores == sorted(scores, reverse=True)
+        assert not set(ids) & set(hidden)
+        assert body['next_cursor'] is None
+
+    def test_cursor_pages_without_gaps_or_duplicates(self, search_app):
+        """Test following next_cursor visits every match once, ties broken by id"""
+        app, readable, _ = search_app
+        unpaged = [result['id'] for result in search(app, q='fracture', limit=50)['results']]
+
+        pages, cursor = [], None
+        while True:
+            args = {'q': 'fracture', 'limit': 2}
+            if cursor:
+                args['cursor'] = cursor
+            body = search(app, **args)
+            pages.append([result['id'] for result in body['results']])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+
+        assert [len(page) for page in pages] == [2, 2, 2]
+        assert [document_id for page in pages for document_id in page] == unpaged
@@ -0,0 +1,100 @@
+import inspect
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+from app.utils.search_terms import search_fields
+import app.blueprints.patients as patients
+
+mongomock = pytest.importorskip('mongomock')
+
+DOCTOR = {'_id': ObjectId(), 'role': 'doctor'}
+
+def patient(first_name: str, last_name: str, **fields) -> dict:
+    user = {'_id': ObjectId(), 'role': 'patient', 'is_active': True, 'first_name': first_name,
+            'last_name': last_name, 'email': f'{first_name}.{last_name}.{ObjectId()}@example.com'.lower(),
+            **fields}
+    return {**user, **search_fields(user)}
+
+@pytest.fixture
+def directory(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    app = Flask(__name__)
+    app.config.update(TESTING=True, PATIENT_SEARCH_CANDIDATES=20)
+    with app.app_context():
+        yield app, database
+
+def search(app, **args):
+    view = inspect.unwrap(patients.search_patients)
+    with app.test_request_context('/api/patients/search', query_string=args):
+        response, status = view(DOCTOR)
+    return response.get_json(), status
+
+def names(body) -> list:
+    return [f"{result['first_name']} {result['last_name']}" for result in body['patients']]
+
+class TestSearchPatients:
+    """Test GET /api/patients/search"""
+
+    def test_exact_name_survives_the_candidate_limit(self, directory):
+        """Test a whole-name match is found when more prefix matches than candidates exist"""
+        app, database = directory
+        # Stored first, so an unsorted limited prefix lookup returns only these
+        database.users.insert_many([patient('Raoul', f'Dubois{i}') for i in range(30)] +
+                                   [patient('Asha', 'Rao')])
+
+        body, status = search(app, q='rao')
+
+        assert status == 200
+        assert names(body)[0] == 'Asha Rao'
+        assert body['count'] == 20
+
+    def test_exact_identifier_and_prefix_queries(self, directory):
+        """Test an exact MRN ranks first and prefixes still match"""
+        app, database = directory
+        database.users.insert_many([patient('Meera', 'Nair', medical_record_number='MRN-0042'),
+                                    patient('Meena', 'Iyer'), patient('Arjun', 'Menon')])
+
+        body, _ = search(app, q='MRN-0042')
+        assert names(body) == ['Meera Nair']
+
+        body, _ = search(app, q='mee')
+        assert names(body) == ['Meena Iyer', 'Meera Nair']
+
+    def test_inactive_and_non_patients_are_excluded(self, directory):
+        """Test only active patients are returned"""
+        app, database = directory
+        database.users.insert_many([patient('Asha', 'Rao'), patient('Asha', 'Roy', is_active=False),
+                                    patient('Asha', 'Ray', role='doctor')])
+
+        body, _ = search(app, q='asha')
+        assert names(body) == ['Asha Rao']
+
+class TestFuzzySearchPatients:
+    """Test GET /api/patients/search?mode=fuzzy"""
+
+    def test_misspelling_found_among_decoys(self, directory):
+        """Test names sharing single trigrams with the query do not crowd out the match"""
+        app, database = directory
+        # Stored first; each holds the query's 'rav' trigram, alone once a group
+        decoys = [patient(f'{start}rav{end}', 'Decoy') for start in ('P', 'Sh', 'Gau', 'Bhai', 'K')
+                  for end in ('in', 'an', 'ina', 'esh', 'ya')]
+        database.users.insert_many(decoys + [patient('Ravi', 'Kumar'), patient('Ravindra', 'Patil')])
+
+        body, status = search(app, q='ravu', mode='fuzzy')
+
+        assert status == 200
+        assert len(decoys) > app.config['PATIENT_SEARCH_CANDIDATES']
+        assert names(body) == ['Ravi Kumar']
+
+    def test_short_tokens_match_by_sound(self, directory):
+        """Test a three-letter token finds sound-alike names without trigram lookups"""
+        app, database = directory
+        database.users.insert_many([patient('Anil', 'Rao'), patient('Anil', 'Roy'), patient('Asha', 'Rane')])
+
+        body, _ = search(app, q='rau', mode='fuzzy')
+        assert names(body) == ['Anil Rao', 'Anil Roy']
+
+        body, _ = search(app, q='anil rao', mode='fuzzy')
+        assert names(body) == ['Anil Rao', 'Anil Roy']
@@ -0,0 +1,94 @@
+import pytest
+from app.utils.phonetics import phonetic_key, trigrams, trigram_groups, edit_distance
+from app.utils.search_terms import search_fields, fuzzy_query, fuzzy_distance
+
+class TestPhoneticKey:
+    """Test sound-alike keys for romanized Indian names"""
+
+    @pytest.mark.parametrize('variants', [
+        ('lakshmi', 'laxmi', 'lakshmee'),
+        ('mohammed', 'mohamad', 'muhammad'),
+        ('srinivas', 'shrinivas', 'sreenivas'),
+        ('pooja', 'puja'),
+        ('bhaskar', 'baskar'),
+        ('vijay', 'wijay'),
+        ('farhan', 'pharhan'),
+    ])
+    def test_variants_share_a_key(self, variants):
+        """Test common transliteration variants get the same key"""
+        assert len({phonetic_key(name) for name in variants}) == 1
+
+    def test_distinct_names_differ(self):
+        """Test different names keep different keys"""
+        assert phonetic_key('ramesh') != phonetic_key('rajesh')
+
+    def test_other_scripts_unchanged(self):
+        """Test non-Latin tokens are used as written"""
+        assert phonetic_key('अनिल') == 'अनिल'
+
+class TestTrigrams:
+    """Test trigram signatures and edit distance"""
+
+    def test_padded_trigrams(self):
+        """Test tokens are padded so short names still have trigrams"""
+        assert trigrams('raj') == ['  r', ' ra', 'raj', 'aj ']
+
+    def test_one_edit_keeps_a_whole_group(self):
+        """Test a single edit leaves at least one trigram group intact"""
+        misspelled = set(trigrams('lakshni'))
+        assert any(set(group) <= misspelled for group in trigram_groups('lakshmi'))
+
+    @pytest.mark.parametrize('token', ['ravi', 'kumar', 'anjali', 'lakshmi', 'narayanan'])
+    def test_every_single_edit_keeps_a_whole_group(self, token):
+        """Test the guarantee holds for short and long tokens alike"""
+        letters = 'abz'
+        edits = {token[:i] + token[i + 1:] for i in range(len(token))}
+        edits |= {token[:i] + c + token[i + 1:] for i in range(len(token)) for c in letters}
+        edits |= {token[:i] + c + token[i:] for i in range(len(token) + 1) for c in letters}
+        groups = trigram_groups(token)
+        for misspelled in edits:
+            assert any(set(group) <= set(trigrams(misspelled)) for group in groups), misspelled
+
+    def test_groups_are_selective(self):
+        """Test no group is a lone trigram and three-letter tokens get none"""
+        for token in ('ravi', 'kumar', 'lakshmi'):
+            assert all(len(group) >= 2 for group in trigram_groups(token))
+        assert trigram_groups('rao') == []
+
+    def test_edit_distance(self):
+        """Test distances and the early exit past the limit"""
+        assert edit_distance('kitten', 'sitting') == 3
+        assert edit_distance('kitten', 'sitting', limit=1) == 2
+        assert edit_distance('rao', 'rao') == 0
+
+class TestFuzzySearch:
+    """Test fuzzy candidate clauses and re-ranking"""
+
+    PATIENT = {'first_name': 'Lakshmi', 'last_name': 'Narayanan', 'email': 'ln@example.com'}
+
+    def test_signatures_stored_with_search_terms(self):
+        """Test registration and profile fields carry the fuzzy signatures"""
+        fields = search_fields(self.PATIENT)
+        assert fields['phonetic_keys'] == sorted({phonetic_key('lakshmi'), phonetic_key('narayanan')})
+        assert ' la' in fields['name_trigrams']
+
+    def test_query_clauses(self):
+        """Test a query looks up phonetic keys and trigram groups, ignoring short tokens"""
+        tokens, clauses = fuzzy_query('Laxmi N')
+        assert tokens == ['laxmi']
+        assert clauses[0] == {'phonetic_keys': {'$in': [phonetic_key('laxmi')]}}
+        assert len(clauses) == 1 + len(trigram_groups('laxmi'))
+        assert fuzzy_query('a') == ([], [])
+        # Three-letter tokens are looked up by phonetic key only
+        assert fuzzy_query('rao') == (['rao'], [{'phonetic_keys': {'$in': [phonetic_key('rao')]}}])
+
+    def test_closer_spellings_rank_first(self):
+        """Test candidates are ranked by edit distance and unrelated names rejected"""
+        tokens, _ = fuzzy_query('laxmi')
+        assert fuzzy_distance(self.PATIENT, tokens) == 3
+        tokens, _ = fuzzy_query('lakshmi narayan')
+        assert fuzzy_distance(self.PATIENT, tokens) == 2
+        tokens, _ = fuzzy_query('lakshni')
+        assert fuzzy_distance(self.PATIENT, tokens) == 1
+        tokens, _ = fuzzy_query('ramesh')
+        assert fuzzy_distance(self.PATIENT, tokens) is None
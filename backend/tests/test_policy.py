@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+import inspect
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+from app.utils.policy import AccessPolicy, ACTION_READ, ACTION_MANAGE, NOTHING
+import app.blueprints.records as records
+
+mongomock = pytest.importorskip('mongomock')
+fakeredis = pytest.importorskip('fakeredis')
+
+class QueryCounter:
+    """Wraps db_manager's read helpers to count round trips"""
+
+    def __init__(self, monkeypatch):
+        self.queries = 0
+        for name in ('find_one', 'find_many'):
+            original = getattr(db_manager, name)
+            monkeypatch.setattr(db_manager, name, self._counted(original))
+
+    def _counted(self, function):
+        def wrapper(*args, **kwargs):
+            self.queries += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+@pytest.fixture
+def clinic(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    patient = {'_id': ObjectId(), 'role': 'patient'}
+    author = {'_id': ObjectId(), 'role': 'doctor'}
+    colleague = {'_id': ObjectId(), 'role': 'doctor'}
+    admin = {'_id': ObjectId(), 'role': 'admin'}
+    documents = [{'_id': ObjectId(), 'patient_id': str(patient['_id']), 'doctor_id': str(author['_id']),
+                  'document_type': 'lab_result' if i % 2 else 'imaging', 'is_deleted': False,
+                  'title': f'Record {i}', 'description': '', 'file_size': 10, 'mime_type': 'text/plain',
+                  'created_at': datetime.utcnow()} for i in range(20)]
+    database.medical_documents.insert_many(documents)
+    # The colleague holds a grant on the first document only
+    database.access_grants.insert_one({
+        'document_id': str(documents[0]['_id']), 'grantee_id': str(colleague['_id']),
+        'patient_id': str(patient['_id']), 'scope': 'document', 'is_active': True,
+        'expires_at': datetime.utcnow() + timedelta(days=1)
+    })
+    database.care_relationships.insert_many([
+        {'member_id': str(author['_id']), 'patient_id': str(patient['_id']), 'authored': 20, 'grants': 0},
+        {'member_id': str(colleague['_id']), 'patient_id': str(patient['_id']), 'authored': 0, 'grants': 1}
+    ])
+
+    app = Flask(__name__)
+    app.config['ACCESS_CACHE_TTL'] = 300
+    app.redis_client = fakeredis.FakeRedis()
+    counter = QueryCounter(monkeypatch)
+    with app.app_context():
+        yield counter, documents, patient, author, colleague, admin
+
+class TestCheckMany:
+    """Test batched record decisions"""
+
+    def test_owners_and_admins_need_no_queries(self, clinic):
+        """Test ownership and the admin role are decided in memory"""
+        counter, documents, patient, author, colleague, admin = clinic
+        for user in (patient, author, admin):
+            for action in (ACTION_READ, ACTION_MANAGE):
+                assert all(AccessPolicy.check_many(user, action, documents).values())
+        assert counter.queries == 0
+
+    def test_manage_is_never_granted(self, clinic):
+        """Test non-owners are refused management without looking up grants"""
+        counter, documents, patient, author, colleague, admin = clinic
+        assert not any(AccessPolicy.check_many(colleague, ACTION_MANAGE, documents).values())
+        assert counter.queries == 0
+
+    def test_grants_resolved_in_one_query(self, clinic):
+        """Test reads outside ownership cost one grants query, then hit the cache"""
+        counter, documents, patient, author, colleague, admin = clinic
+        decisions = AccessPolicy.check_many(colleague, ACTION_READ, documents)
+        assert [document_id for document_id, allowed in decisions.items() if allowed] == \
+            [str(documents[0]['_id'])]
+        assert counter.queries == 1
+
+        assert AccessPolicy.check(colleague, ACTION_READ, documents[0])
+        assert not AccessPolicy.check(colleague, ACTION_READ, documents[1])
+        assert counter.queries == 1
+
+class TestPatientChecks:
+    """Test patient-level decisions and the readable records filter"""
+
+    def test_treating_doctors_and_grantees_read_patients(self, clinic):
+        """Test one care relationship query decides every patient"""
+        counter, documents, patient, author, colleague, admin = clinic
+        other = str(ObjectId())
+        assert AccessPolicy.check_patients(author, ACTION_READ, [str(patient['_id']), other]) == \
+            {str(patient['_id']): True, other: False}
+        assert counter.queries == 1
+        assert AccessPolicy.check_patient(colleague, ACTION_READ, str(patient['_id']))
+        assert not AccessPolicy.check_patient({'_id': ObjectId(), 'role': 'doctor'},
+                                              ACTION_READ, str(patient['_id']))
+        assert not AccessPolicy.check_patient(colleague, ACTION_MANAGE, str(patient['_id']))
+        assert not AccessPolicy.check_patient(author, ACTION_MANAGE, str(patient['_id']))
+        assert AccessPolicy.check_patient(patient, ACTION_MANAGE, str(patient['_id']))
+        assert AccessPolicy.check_patient(admin, ACTION_MANAGE, other)
+
+    def test_readable_filter_skips_grants_without_a_relationship(self, clinic):
+        """Test the relationship short-circuits the grants query"""
+        counter, documents, patient, author, colleague, admin = clinic
+        assert AccessPolicy.readable_filter(colleague, str(ObjectId())) == NOTHING
+        assert AccessPolicy.readable_filter(author, str(patient['_id'])) == {'doctor_id': str(author['_id'])}
+        assert counter.queries == 2
+
+        readable = AccessPolicy.readable_filter(colleague, str(patient['_id']))
+        matched = list(db_manager.db.medical_documents.find(readable))
+        assert [document['_id'] for document in matched] == [documents[0]['_id']]
+
+def get_patient_view(view, user, patient_id, monkeypatch):
+    monkeypatch.setattr(records, 'get_current_user', lambda: user)
+    with Flask(__name__).test_request_context(query_string={'limit': 50}):
+        response, status = inspect.unwrap(view)(patient_id)
+    return response.get_json(), status
+
+class TestPatientEndpoints:
+    """Test GET /api/records/patient/<id> and its timeline go through the policy"""
+
+    def test_grantee_lists_only_covered_records(self, clinic, monkeypatch):
+        """Test a grantee gets the records its grants cover and the treating doctor all of them"""
+        counter, documents, patient, author, colleague, admin = clinic
+        patient_id = str(patient['_id'])
+
+        body, status = get_patient_view(records.list_patient_records, colleague, patient_id, monkeypatch)
+        assert status == 200
+        assert [record['id'] for record in body['records']] == [str(documents[0]['_id'])]
+        assert body['pagination']['total'] == 1
+
+        body, status = get_patient_view(records.list_patient_records, author, patient_id, monkeypatch)
+        assert (status, body['pagination']['total']) == (200, 20)
+
+        stranger = {'_id': ObjectId(), 'role': 'doctor'}
+        _, status = get_patient_view(records.list_patient_records, stranger, patient_id, monkeypatch)
+        assert status == 403
+
+    def test_timeline_is_for_full_readers_only(self, clinic, monkeypatch):
+        """Test the patient, admins and treating doctors see the timeline, grantees do not"""
+        counter, documents, patient, author, colleague, admin = clinic
+        patient_id = str(patient['_id'])
+
+        for user in (patient, author, admin):
+            body, status = get_patient_view(records.get_patient_timeline, user, patient_id, monkeypatch)
+            assert status == 200
+            assert body['timeline']['patient_id'] == patient_id
+
+        # A grantee of one record, and a patient-role grantee, would see every record in the summary
+        caregiver = {'_id': ObjectId(), 'role': 'patient'}
+        db_manager.db.care_relationships.insert_one(
+            {'member_id': str(caregiver['_id']), 'patient_id': patient_id, 'authored': 0, 'grants': 1})
+        stranger = {'_id': ObjectId(), 'role': 'doctor'}
+        for user in (colleague, caregiver, stranger):
+            body, status = get_patient_view(records.get_patient_timeline, user, patient_id, monkeypatch)
+            assert (status, body['error']['code']) == (403, 'FORBIDDEN')
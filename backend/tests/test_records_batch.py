@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+import inspect
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+import app.blueprints.records as records
+from test_access_grants import CountingStore
+
+fakeredis = pytest.importorskip('fakeredis')
+
+def record(patient_id, doctor_id):
+    now = datetime.utcnow()
+    return {'_id': ObjectId(), 'patient_id': patient_id, 'doctor_id': doctor_id,
+            'document_type': 'lab_result', 'title': 'CBC', 'description': '',
+            'encryption_key_id': 'simple_key', 'file_size': 10, 'mime_type': 'text/plain',
+            'checksum': 'x', 'is_deleted': False, 'created_at': now, 'updated_at': now}
+
+@pytest.fixture
+def batch(monkeypatch):
+    patient_id, author_id = str(ObjectId()), str(ObjectId())
+    doctor = {'_id': ObjectId(), 'role': 'doctor'}
+    granted, other, own = (record(patient_id, author_id), record(patient_id, author_id),
+                           record(patient_id, str(doctor['_id'])))
+    store = CountingStore({
+        'medical_documents': [granted, other, own],
+        'access_grants': [{
+            '_id': ObjectId(), 'document_id': str(granted['_id']), 'grantee_id': str(doctor['_id']),
+            'patient_id': patient_id, 'scope': 'document', 'is_active': True,
+            'expires_at': datetime.utcnow() + timedelta(days=1)
+        }],
+        'audit_logs': []
+    })
+    for name in ('find_one', 'find_many', 'insert_many'):
+        monkeypatch.setattr(db_manager, name, getattr(store, name))
+    monkeypatch.setattr(records, 'get_current_user', lambda: doctor)
+
+    app = Flask(__name__)
+    app.config.update(RECORDS_BATCH_MAX_IDS=6, ACCESS_CACHE_TTL=300)
+    app.redis_client = fakeredis.FakeRedis()
+    ids = {name: str(document['_id']) for name, document in
+           (('granted', granted), ('other', other), ('own', own))}
+    return app, store, ids
+
+def post_batch(app, document_ids):
+    view = inspect.unwrap(records.get_records_batch)
+    with app.test_request_context(json={'document_ids': document_ids, 'metadata_only': True}):
+        response, status = view()
+    return response.get_json(), status
+
+class TestRecordsBatch:
+    """Test fetching several records in one request"""
+
+    def test_results_per_id_with_fixed_queries(self, batch):
+        """Test one document query, one grants query and one audit insert for the whole batch"""
+        app, store, ids = batch
+        missing = str(ObjectId())
+
+        body, status = post_batch(app, [ids['own'], ids['granted'], ids['other'], missing,
+                                        'not-an-id', ids['own']])
+
+        assert status == 200
+        assert [(result['id'], result['status'], result.get('error')) for result in body['results']] == [
+            (ids['own'], 'ok', None),
+            (ids['granted'], 'ok', None),
+            (ids['other'], 'error', 'FORBIDDEN'),
+            (missing, 'error', 'DOCUMENT_NOT_FOUND'),
+            ('not-an-id', 'error', 'INVALID_ID'),
+        ]
+        assert (body['succeeded'], body['failed']) == (2, 3)
+        assert 'encrypted_content' not in body['results'][0]['document']
+        # documents by $in, grants for the two non-owned ids, one bulk audit write
+        assert store.queries == 3
+        assert sorted(entry['resource_id'] for entry in store.collections['audit_logs']) == \
+            sorted([ids['own'], ids['granted']])
+
+    def test_cached_decisions_skip_the_grants_query(self, batch):
+        """Test a repeat batch is authorized from the access cache"""
+        app, store, ids = batch
+        with app.app_context():
+            post_batch(app, [ids['granted'], ids['other']])
+            store.queries = 0
+            body, _ = post_batch(app, [ids['granted'], ids['other']])
+
+        assert [result['status'] for result in body['results']] == ['ok', 'error']
+        assert store.queries == 2
+
+    def test_batch_size_is_limited(self, batch):
+        """Test more than RECORDS_BATCH_MAX_IDS ids are rejected before any query"""
+        app, store, _ = batch
+
+        body, status = post_batch(app, [str(ObjectId()) for _ in range(7)])
+
+        assert status == 400
+        assert body['error']['code'] == 'BATCH_TOO_LARGE'
+        assert store.queries == 0
@@ -0,0 +1,72 @@
+from app.utils.search_terms import (
+    normalize, tokenize, user_search_terms, search_fields, query_terms, match_score, SEARCH_PREFIX_MAX
+)
+
+PATIENT = {'first_name': 'José', 'last_name': 'Rao-Iyer', 'email': 'Jose.Rao@Example.com',
+           'medical_record_number': 'MRN-00123'}
+
+class TestNormalization:
+    """Test folding and tokenizing of searchable text"""
+
+    def test_latin_accents_are_folded(self):
+        """Test case and accents do not affect matching"""
+        assert normalize('  JOSÉ Müller ') == 'jose muller'
+
+    def test_indic_scripts_are_kept_whole(self):
+        """Test vowel signs are not stripped from Devanagari names"""
+        assert tokenize('अनिल शर्मा') == ['अनिल', 'शर्मा']
+
+    def test_punctuation_splits_tokens(self):
+        """Test hyphens, dots and regex metacharacters are separators"""
+        assert tokenize('Rao-Iyer') == ['rao', 'iyer']
+        assert tokenize('(a+)+$') == ['a']
+
+class TestSearchTerms:
+    """Test the terms stored on users and looked up by queries"""
+
+    def test_terms_cover_prefixes_and_identifiers(self):
+        """Test name prefixes, the exact email and the MRN are all stored"""
+        terms = user_search_terms(PATIENT)
+        assert {'jo', 'jos', 'jose', 'ra', 'iyer', 'jose.rao@example.com',
+                'mrn-00123', 'mrn00', 'mrn00123'} <= set(terms)
+        # The email domain is shared by too many users to be useful
+        assert 'example' not in terms
+
+    def test_exact_terms_hold_no_prefixes(self):
+        """Test exact_terms keep whole name tokens and identifiers only"""
+        assert search_fields(PATIENT)['exact_terms'] == [
+            'iyer', 'jose', 'jose.rao@example.com', 'mrn-00123', 'mrn00123', 'rao']
+
+    def test_long_tokens_store_bounded_prefixes(self):
+        """Test prefix terms stop at SEARCH_PREFIX_MAX plus the whole token"""
+        terms = user_search_terms({'first_name': 'Venkatalakshmamma', 'last_name': 'K', 'email': 'v@x.in'})
+        assert max(len(term) for term in terms if term.startswith('venk')) == len('venkatalakshmamma')
+        assert 'venkatalaksh' in terms and 'venkatalakshm' not in terms
+
+    def test_query_lookup_terms_are_stored_terms(self):
+        """Test every lookup term of a matching query is among the stored terms"""
+        tokens, lookup, exact = query_terms('Jose Rao-Iyer')
+        assert set(lookup) <= set(user_search_terms(PATIENT))
+        tokens, lookup, exact = query_terms('Venkatalakshmamma')
+        assert lookup == ['venkatalakshmamma'[:SEARCH_PREFIX_MAX]]
+
+class TestRanking:
+    """Test in-memory scoring of candidates"""
+
+    def test_exact_identifiers_rank_first(self):
+        """Test a whole email or MRN beats name matches"""
+        tokens, lookup, exact = query_terms('MRN-00123')
+        by_mrn = match_score(PATIENT, tokens, exact)
+        tokens, lookup, exact = query_terms('jose rao')
+        assert by_mrn > match_score(PATIENT, tokens, exact) > 0
+
+    def test_name_tokens_beat_prefixes(self):
+        """Test a whole name token scores above a prefix of one"""
+        other = {'first_name': 'Raoul', 'last_name': 'Sen', 'email': 'raoul@example.com'}
+        tokens, lookup, exact = query_terms('rao')
+        assert match_score(PATIENT, tokens, exact) > match_score(other, tokens, exact) > 0
+
+    def test_unmatched_token_rejects_candidate(self):
+        """Test candidates must match every token, including ones too short to look up"""
+        tokens, lookup, exact = query_terms('jose k')
+        assert match_score(PATIENT, tokens, exact) == 0
@@ -0,0 +1,56 @@
+import io
+import os
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from app.utils.segmented_encryption import (
+    encrypt_stream, decrypt_stream, decrypt_range, ciphertext_length,
+    SegmentedFormatError, HEADER_LENGTH
+)
+
+SEGMENT_SIZE = 1024
+
+def encrypt(aead, plaintext, chunk_size=700):
+    chunks = (plaintext[i:i + chunk_size] for i in range(0, len(plaintext), chunk_size))
+    return b''.join(encrypt_stream(aead, chunks, SEGMENT_SIZE))
+
+@pytest.fixture
+def aead():
+    return AESGCM(os.urandom(32))
+
+class TestSegmentedEncryption:
+    """Test the segmented AES-GCM content format"""
+    
+    @pytest.mark.parametrize('size', [0, 1, SEGMENT_SIZE, SEGMENT_SIZE * 3, SEGMENT_SIZE * 3 + 17])
+    def test_stream_round_trip(self, aead, size):
+        """Test streaming encryption round-trips and stores raw bytes"""
+        plaintext = os.urandom(size)
+        ciphertext = encrypt(aead, plaintext)
+        
+        assert len(ciphertext) == ciphertext_length(size, SEGMENT_SIZE)
+        assert b''.join(decrypt_stream(aead, io.BytesIO(ciphertext))) == plaintext
+    
+    @pytest.mark.parametrize('start,end', [(0, 0), (10, 2000), (1023, 1024), (3000, 3088)])
+    def test_range_decryption(self, aead, start, end):
+        """Test byte ranges are decrypted from the covering segments only"""
+        plaintext = os.urandom(SEGMENT_SIZE * 3 + 17)
+        ciphertext = encrypt(aead, plaintext)
+        
+        chunks = decrypt_range(aead, io.BytesIO(ciphertext), len(ciphertext), start, end)
+        
+        assert b''.join(chunks) == plaintext[start:end + 1]
+    
+    def test_tampered_segment_is_rejected(self, aead):
+        """Test modified ciphertext fails authentication"""
+        ciphertext = bytearray(encrypt(aead, os.urandom(SEGMENT_SIZE * 2)))
+        ciphertext[HEADER_LENGTH + 5] ^= 0x01
+        
+        with pytest.raises(SegmentedFormatError):
+            b''.join(decrypt_stream(aead, io.BytesIO(bytes(ciphertext))))
+    
+    def test_truncated_stream_is_rejected(self, aead):
+        """Test dropping trailing segments is detected"""
+        ciphertext = encrypt(aead, os.urandom(SEGMENT_SIZE * 3))
+        truncated = ciphertext[:HEADER_LENGTH + 2 * (SEGMENT_SIZE + 16)]
+        
+        with pytest.raises(SegmentedFormatError):
+            b''.join(decrypt_stream(aead, io.BytesIO(truncated)))
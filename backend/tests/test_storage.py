@@ -0,0 +1,80 @@
+import base64
+import inspect
+import os
+from bson import ObjectId
+import pytest
+from flask import Flask
+from gridfs import GridFSBucket
+from app.models.database import db_manager
+from app.utils.segmented_encryption import SegmentedFormatError, HEADER_LENGTH
+from app.utils.storage import DocumentStorage
+import app.blueprints.records as records
+
+mongomock = pytest.importorskip('mongomock')
+import mongomock.gridfs  # noqa: E402
+
+@pytest.fixture
+def app(monkeypatch):
+    mongomock.gridfs.enable_gridfs_integration()
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    monkeypatch.setattr(db_manager, 'fs', GridFSBucket(database, bucket_name='document_content'))
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY='test', MASTER_ENCRYPTION_KEY=None, CONTENT_SEGMENT_SIZE=1024)
+    with app.app_context():
+        yield app
+
+def stored_document(content: bytes) -> dict:
+    fields = DocumentStorage.store([content], 'application/octet-stream', 'patient-1')
+    return {'_id': ObjectId(), **fields}
+
+def corrupt_first_segment(document: dict):
+    """Flip one bit of the first segment in the stored GridFS chunk"""
+    chunks = db_manager.db['document_content.chunks']
+    chunk = chunks.find_one({'files_id': document['content_id'], 'n': 0})
+    data = bytearray(chunk['data'])
+    data[HEADER_LENGTH + 3] ^= 0x01
+    chunks.update_one({'_id': chunk['_id']}, {'$set': {'data': bytes(data)}})
+
+class TestDocumentStorage:
+    """Test content streams fail before a response starts"""
+
+    def test_open_content_round_trip(self, app):
+        """Test an opened stream yields the stored plaintext"""
+        content = os.urandom(5000)
+        document = stored_document(content)
+
+        assert b''.join(DocumentStorage.open_content(document)) == content
+        assert b''.join(DocumentStorage.open_range(document, 100, 2999)) == content[100:3000]
+
+    def test_corrupt_content_raises_when_opened(self, app):
+        """Test authentication failures raise from open_*, not mid-iteration"""
+        document = stored_document(os.urandom(5000))
+        corrupt_first_segment(document)
+
+        with pytest.raises(SegmentedFormatError):
+            DocumentStorage.open_content(document)
+        with pytest.raises(SegmentedFormatError):
+            DocumentStorage.open_range(document, 0, 10)
+
+class TestUploadRecord:
+    """Test content written before a failed insert is removed"""
+
+    def test_failed_insert_deletes_content(self, app, monkeypatch):
+        """Test the GridFS file is deleted when the medical_documents insert fails"""
+        doctor = {'_id': ObjectId(), 'role': 'doctor'}
+
+        def failing_insert(collection, document):
+            raise RuntimeError('insert failed')
+
+        monkeypatch.setattr(db_manager, 'insert_one', failing_insert)
+        view = inspect.unwrap(records.upload_record)
+
+        with app.test_request_context(json={
+                'patient_id': str(ObjectId()), 'document_type': 'lab_result', 'title': 'CBC',
+                'file_content': base64.b64encode(b'result' * 100).decode()}):
+            response, status = view(doctor)
+
+        assert status == 500
+        assert response.get_json()['error']['code'] == 'UPLOAD_ERROR'
+        assert db_manager.db['document_content.files'].count_documents({}) == 0
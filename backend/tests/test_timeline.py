@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+import pytest
+from flask import Flask
+from app.models.database import db_manager
+from app.utils.timeline import TimelineManager
+
+@pytest.fixture
+def timelines(monkeypatch, mongomock_bulk_sort):
+    mongomock = pytest.importorskip('mongomock')
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(db_manager, 'db', database)
+    database.patient_timelines.create_index('patient_id', unique=True)
+    app = Flask(__name__)
+    app.config['TIMELINE_LATEST_SIZE'] = 2
+    with app.app_context():
+        yield database
+
+def record(database, days_ago: int, document_type: str = 'lab_result', doctor_id: str = 'd1') -> dict:
+    document = {'_id': ObjectId(), 'patient_id': 'p1', 'doctor_id': doctor_id, 'document_type': document_type,
+                'title': f'record {days_ago}', 'is_deleted': False,
+                'created_at': datetime(2024, 6, 30, 12, 0) - timedelta(days=days_ago)}
+    database.medical_documents.insert_one(document)
+    return document
+
+def latest_ids(summary: dict) -> list:
+    return [entry['id'] for entry in summary['latest']]
+
+class TestTimelineFormat:
+    """Test formatting of materialized patient timelines"""
+    
+    def test_zero_counts_and_self_uploads_are_hidden(self):
+        """Test counts decremented to zero and the patient's own uploads are dropped"""
+        now = datetime(2024, 5, 1, 12, 0)
+        summary = {
+            'patient_id': 'p1',
+            'total_records': 3,
+            'by_type': {'lab_result': 2, 'imaging': 0, 'diagnosis': 1},
+            'by_month': {'2024-05': 2, '2024-03': 1, '2023-12': 0},
+            'doctors': {'p1': 1, 'd1': 1, 'd2': 2, 'd3': 0},
+            'latest': [{'id': 'r1', 'document_type': 'lab_result', 'title': 'CBC',
+                        'doctor_id': 'd1', 'created_at': now}],
+            'first_record_at': now,
+            'last_record_at': now,
+            'updated_at': now
+        }
+        
+        timeline = TimelineManager.format(summary)
+        
+        assert timeline['by_type'] == {'lab_result': 2, 'diagnosis': 1}
+        assert timeline['by_month'] == [
+            {'month': '2024-03', 'count': 1},
+            {'month': '2024-05', 'count': 2}
+        ]
+        assert timeline['doctors'] == [
+            {'doctor_id': 'd2', 'record_count': 2},
+            {'doctor_id': 'd1', 'record_count': 1}
+        ]
+        assert timeline['latest'][0]['created_at'] == now.isoformat()
+    
+    def test_empty_summary(self):
+        """Test a patient without records formats cleanly"""
+        timeline = TimelineManager.format({
+            'patient_id': 'p1',
+            'total_records': 0,
+            'by_type': {},
+            'by_month': {},
+            'doctors': {},
+            'latest': [],
+            'first_record_at': None,
+            'last_record_at': None,
+            'updated_at': datetime.utcnow()
+        })
+        assert timeline['total_records'] == 0
+        assert timeline['first_record_at'] is None
+
+class TestTimelineUpdates:
+    """Test the incremental updates and the lazy rebuild of stored timelines"""
+    
+    def test_first_read_builds_the_summary(self, timelines):
+        """Test a patient without a stored summary gets one counted from their records"""
+        old, newer, newest = record(timelines, 40, 'imaging'), record(timelines, 10), record(timelines, 1)
+        
+        summary = TimelineManager.get('p1')
+        
+        assert summary['total_records'] == 3
+        assert summary['by_type'] == {'imaging': 1, 'lab_result': 2}
+        assert summary['by_month'] == {'2024-05': 1, '2024-06': 2}
+        assert latest_ids(summary) == [str(newest['_id']), str(newer['_id'])]
+        assert summary['first_record_at'] == old['created_at']
+        stored = timelines.patient_timelines.find_one({'patient_id': 'p1'})
+        assert stored['total_records'] == 3
+        assert not stored.get('pending')
+    
+    def test_uploads_increment_the_stored_summary(self, timelines):
+        """Test single and bulk uploads adjust counts and the latest list without a recount"""
+        record(timelines, 10)
+        TimelineManager.get('p1')
+        
+        TimelineManager.record_added(record(timelines, 5, 'imaging', 'd2'))
+        newest = [record(timelines, 2), record(timelines, 1)]
+        TimelineManager.records_added(newest)
+        
+        summary = TimelineManager.get('p1')
+        assert summary['total_records'] == 4
+        assert summary['by_type'] == {'imaging': 1, 'lab_result': 3}
+        assert summary['doctors'] == {'d1': 3, 'd2': 1}
+        assert latest_ids(summary) == [str(newest[1]['_id']), str(newest[0]['_id'])]
+        assert summary['version'] == 4
+    
+    def test_delete_refills_the_latest_list(self, timelines):
+        """Test removing a listed record decrements its counts and pulls in the next newest"""
+        oldest, middle, newest = record(timelines, 30), record(timelines, 20), record(timelines, 1)
+        TimelineManager.get('p1')
+        
+        timelines.medical_documents.update_one({'_id': newest['_id']}, {'$set': {'is_deleted': True}})
+        TimelineManager.record_removed(newest)
+        
+        summary = TimelineManager.get('p1')
+        assert summary['total_records'] == 2
+        assert summary['by_month'] == {'2024-05': 1, '2024-06': 1}
+        assert latest_ids(summary) == [str(middle['_id']), str(oldest['_id'])]
+    
+    def test_rebuild_recounts_when_an_upload_lands_mid_count(self, timelines, monkeypatch):
+        """Test an upload counted into the pending row is not overwritten by a stale recount"""
+        record(timelines, 10)
+        recount = TimelineManager._recount
+        uploads = [lambda: TimelineManager.record_added(record(timelines, 1))]
+        
+        def racing_recount(patient_id):
+            counted = recount(patient_id)
+            if uploads:
+                uploads.pop()()
+            return counted
+        
+        monkeypatch.setattr(TimelineManager, '_recount', staticmethod(racing_recount))
+        summary = TimelineManager.get('p1')
+        
+        assert summary['total_records'] == 2
+        assert timelines.patient_timelines.find_one({'patient_id': 'p1'})['total_records'] == 2
+    
+    def test_pending_row_is_rebuilt_on_read(self, timelines):
+        """Test a placeholder left by an interrupted rebuild is never served"""
+        record(timelines, 10)
+        record(timelines, 1)
+        timelines.patient_timelines.insert_one({'patient_id': 'p1', 'pending': True,
+                                                'total_records': 1, 'version': 1})
+        
+        assert TimelineManager.get('p1')['total_records'] == 2
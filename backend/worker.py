@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Medical Records Management System - Background Job Worker
+
+Runs jobs that request handlers queue in Redis (deferred audit writes,
+thumbnail and preview rendering, cleanup and other post-request work) and
+enqueues periodic jobs.
+Start as many workers as needed; jobs left unacknowledged by a crashed
+worker are redelivered once their visibility timeout passes.
+"""
+
+import os
+import sys
+import signal
+import logging
+from pathlib import Path
+
+# Add the backend directory to Python path for proper imports
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from app import create_app
+from app.models.database import db_manager
+from app.utils.jobs import Worker, JobQueue, JOB_HANDLERS
+from app.utils.encryption import KeyManager
+import app.utils.audit  # noqa: F401  registers job handlers
+import app.utils.archive  # noqa: F401
+import app.utils.grant_expiry  # noqa: F401
+import app.utils.care_team  # noqa: F401
+import app.utils.derivatives  # noqa: F401
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """Job worker entry point"""
+    config_name = os.getenv('FLASK_ENV', 'development')
+    app = create_app(config_name)
+    KeyManager.check_master_key(app.config)
+    db_manager.init_app(app)
+    
+    queue = JobQueue(
+        app.redis_client,
+        name=os.getenv('JOB_QUEUE', 'default'),
+        visibility_timeout=app.config['JOB_VISIBILITY_TIMEOUT'],
+        max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+        retry_backoff=app.config['JOB_RETRY_BACKOFF']
+    )
+    worker = Worker(app, queue)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    
+    logger.info(f"Starting job worker on queue '{queue.name}' with handlers: {sorted(JOB_HANDLERS)}")
+    try:
+        worker.run(poll_interval=app.config['JOB_POLL_INTERVAL'])
+    except KeyboardInterrupt:
+        pass
+    logger.info("Job worker stopped")
+
+if __name__ == '__main__':
+    main()